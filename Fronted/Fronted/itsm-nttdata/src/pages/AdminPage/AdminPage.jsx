@@ -10,7 +10,7 @@ import TicketFilters from '../../components/TicketFilters/TicketFilters'
 import TicketDetail from '../../components/TicketDetail/TicketDetail'
 import AssignForm from '../../components/AssignForm/AssignForm'
 import Modal from '../../components/Modal/Modal'
-import { getTickets, updateTicket } from '../../utils/storage'
+import { syncTickets, subscribeTicketEvents, updateTicket } from '../../utils/storage'
 import styles from './AdminPage.module.css'
 
 export default function AdminPage() {
@@ -24,7 +24,18 @@ export default function AdminPage() {
   const ITEMS_PER_PAGE = 5
 
   useEffect(() => {
-    getTickets().then(setTickets)
+    syncTickets().then(setTickets)
+
+    // Cambios en vivo: una ráfaga de eventos se agrupa en un solo delta sync
+    let timer = null
+    const source = subscribeTicketEvents(() => {
+      clearTimeout(timer)
+      timer = setTimeout(() => syncTickets().then(setTickets), 300)
+    })
+    return () => {
+      clearTimeout(timer)
+      source.close()
+    }
   }, [])
 
   // Reset page when filters change
@@ -82,7 +93,7 @@ export default function AdminPage() {
   const handleAssign = async (ticketId, assignedTo) => {
     try {
       await updateTicket(ticketId, { assignedTo: assignedTo }) // Asignación
-      const updated = await getTickets()
+      const updated = await syncTickets()
       setTickets(updated)
       setAssignModal({ open: false, ticketId: null })
       toast.success(`Ticket ${ticketId} asignado a ${assignedTo.name}`)
@@ -94,7 +105,7 @@ export default function AdminPage() {
   const handleResolve = async (ticketId) => {
     try {
       await updateTicket(ticketId, { status: 'resolved' })
-      const updated = await getTickets()
+      const updated = await syncTickets()
       setTickets(updated)
       toast.success(`Ticket ${ticketId} marcado como resuelto`)
     } catch(e) {
@@ -8,50 +8,48 @@ import {
   PieChart, Pie, Cell, Legend
 } from 'recharts'
 import StatCard from '../../components/StatCard/StatCard'
-import { getTickets } from '../../utils/storage'
+import { getStats } from '../../utils/storage'
 import styles from './StatsPage.module.css'
 
 export default function StatsPage() {
-  const [tickets, setTickets] = useState([])
+  const [summary, setSummary] = useState(null)
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
-    getTickets().then((data) => {
-      setTickets(data)
+    getStats().then((data) => {
+      setSummary(data)
       setLoading(false)
     })
   }, [])
 
   // Stats
   const stats = useMemo(() => ({
-    total: tickets.length,
-    open: tickets.filter((t) => t.status === 'open').length,
-    inProgress: tickets.filter((t) => t.status === 'in-progress').length,
-    resolved: tickets.filter((t) => t.status === 'resolved').length,
-    critical: tickets.filter((t) => t.priority === 'critical' && t.status !== 'closed' && t.status !== 'resolved').length,
-  }), [tickets])
+    total: summary?.total ?? 0,
+    open: summary?.by_status.open ?? 0,
+    inProgress: summary?.by_status['in-progress'] ?? 0,
+    resolved: summary?.by_status.resolved ?? 0,
+    critical: summary?.critical_active ?? 0,
+  }), [summary])
 
   // Chart Data Preparation
   const priorityData = useMemo(() => {
-    const counts = { critical: 0, high: 0, medium: 0, low: 0 }
-    tickets.forEach((t) => { if (counts[t.priority] !== undefined) counts[t.priority]++ })
+    const counts = { critical: 0, high: 0, medium: 0, low: 0, ...summary?.by_priority }
     return [
       { name: 'Crítico', value: counts.critical, color: '#DC2626' },
       { name: 'Alta', value: counts.high, color: '#F59E0B' },
       { name: 'Media', value: counts.medium, color: '#3B82F6' },
       { name: 'Baja', value: counts.low, color: '#10B981' },
     ].filter(d => d.value > 0)
-  }, [tickets])
+  }, [summary])
 
   const typeData = useMemo(() => {
-    const counts = { incident: 0, request: 0, problem: 0 }
-    tickets.forEach((t) => { if (counts[t.type] !== undefined) counts[t.type]++ })
+    const counts = { incident: 0, request: 0, problem: 0, ...summary?.by_type }
     return [
       { name: 'Incidentes', value: counts.incident, fill: '#EF4444' },
       { name: 'Solicitudes', value: counts.request, fill: '#3B82F6' },
       { name: 'Problemas', value: counts.problem, fill: '#8B5CF6' },
     ].filter(d => d.value > 0)
-  }, [tickets])
+  }, [summary])
 
   if (loading) {
     return (
@@ -113,7 +111,7 @@ export default function StatsPage() {
             Distribución por Tipo
           </h3>
           <div className={styles.chartWrapper}>
-            {tickets.length > 0 ? (
+            {stats.total > 0 ? (
               <ResponsiveContainer width="100%" height={300}>
                 <PieChart>
                   <Pie
@@ -145,7 +143,7 @@ export default function StatsPage() {
             Tickets por Prioridad
           </h3>
           <div className={styles.chartWrapper}>
-            {tickets.length > 0 ? (
+            {stats.total > 0 ? (
               <ResponsiveContainer width="100%" height={300}>
                 <BarChart data={priorityData} margin={{ top: 20, right: 30, left: 0, bottom: 5 }}>
                   <CartesianGrid strokeDasharray="3 3" vertical={false} />
@@ -7,17 +7,89 @@ const API_URL = 'http://localhost:8000/api'
 
 // ==================== TICKETS ====================
 
-export async function getTickets() {
+// Una página de tickets. params admite: limit, cursor, status, priority, type, assignee, fields
+export async function getTicketsPage(params = {}) {
+  const query = new URLSearchParams(
+    Object.entries(params).filter(([, v]) => v !== undefined && v !== null && v !== '')
+  )
+  const res = await fetch(`${API_URL}/tickets?${query}`)
+  if (!res.ok) throw new Error('Error fetching tickets')
+  return {
+    tickets: await res.json(),
+    nextCursor: res.headers.get('X-Next-Cursor'),
+    syncToken: res.headers.get('X-Sync-Token'),
+  }
+}
+
+// Todas las páginas (mismos filtros). Preferir getTicketsPage en vistas paginadas.
+export async function getTickets(params = {}) {
   try {
-    const res = await fetch(`${API_URL}/tickets`)
-    if (!res.ok) throw new Error('Error fetching tickets')
-    return await res.json()
+    const tickets = []
+    let cursor = null
+    do {
+      const page = await getTicketsPage({ ...params, limit: 1000, cursor })
+      tickets.push(...page.tickets)
+      cursor = page.nextCursor
+    } while (cursor)
+    return tickets
   } catch (err) {
     console.error(err)
     return []
   }
 }
 
+// Copia local de todos los tickets que syncTickets mantiene al día por deltas
+let ticketSnapshot = null // { byId: Map, sync: string }
+
+async function fetchTicketDelta(since) {
+  const changed = []
+  const deleted = []
+  let sync = null
+  let cursor = null
+  do {
+    const query = new URLSearchParams({ updated_since: since, limit: 1000 })
+    if (cursor) query.set('cursor', cursor)
+    const res = await fetch(`${API_URL}/tickets?${query}`)
+    if (!res.ok) throw new Error('Error syncing tickets')
+    const delta = await res.json()
+    changed.push(...delta.tickets)
+    deleted.push(...delta.deleted)
+    sync = sync ?? delta.sync // El de la primera página: nunca salta cambios concurrentes
+    cursor = res.headers.get('X-Next-Cursor')
+  } while (cursor)
+  return { changed, deleted, sync }
+}
+
+// Igual que getTickets() pero tras la primera carga solo descarga lo que cambió
+// (GET /api/tickets?updated_since=...) y lo fusiona por id con la copia local.
+export async function syncTickets() {
+  try {
+    if (!ticketSnapshot) {
+      const byId = new Map()
+      let sync = null
+      let cursor = null
+      do {
+        const page = await getTicketsPage({ limit: 1000, cursor })
+        page.tickets.forEach((t) => byId.set(t.id, t))
+        sync = sync ?? page.syncToken
+        cursor = page.nextCursor
+      } while (cursor)
+      ticketSnapshot = { byId, sync }
+    } else if (ticketSnapshot.sync) {
+      const { changed, deleted, sync } = await fetchTicketDelta(ticketSnapshot.sync)
+      changed.forEach((t) => ticketSnapshot.byId.set(t.id, t))
+      deleted.forEach((d) => ticketSnapshot.byId.delete(d.id))
+      ticketSnapshot.sync = sync
+    }
+    return [...ticketSnapshot.byId.values()].sort((a, b) =>
+      b.createdAt.localeCompare(a.createdAt) || b.id.localeCompare(a.id)
+    )
+  } catch (err) {
+    console.error(err)
+    return ticketSnapshot ? [...ticketSnapshot.byId.values()] : []
+  }
+}
+
 export async function addTicket(ticketPayload) {
   // ticketPayload must have: user_id, title, description
   const res = await fetch(`${API_URL}/tickets`, {
@@ -51,6 +123,33 @@ export async function getTicketById(ticketId) {
   return await res.json()
 }
 
+// Feed en vivo de cambios (GET /api/events, Server-Sent Events). onEvent recibe
+// { kind, ticket }; kind 'resync' significa que hay que recargar. Retorna el EventSource
+// (llamar a .close() al desmontar). El navegador reconecta solo y reenvía Last-Event-ID.
+const TICKET_EVENT_KINDS = ['created', 'enriched', 'assigned', 'status', 'updated', 'deleted', 'resync']
+
+export function subscribeTicketEvents(onEvent) {
+  const source = new EventSource(`${API_URL}/events`)
+  TICKET_EVENT_KINDS.forEach((kind) => {
+    source.addEventListener(kind, (e) => onEvent(JSON.parse(e.data)))
+  })
+  return source
+}
+
+// ==================== STATS ====================
+
+// Contadores agregados del backend (no requiere descargar la lista de tickets)
+export async function getStats() {
+  try {
+    const res = await fetch(`${API_URL}/stats`)
+    if (!res.ok) throw new Error('Error fetching stats')
+    return await res.json()
+  } catch (err) {
+    console.error(err)
+    return null
+  }
+}
+
 // ==================== USERS (staff) ====================
 
 export async function getStaffUsers() {
@@ -0,0 +1,342 @@
+"""
+Suite de benchmarks offline: todo el sistema con un LLM simulado, sin red ni API key.
+
+Usa src/core/fake_llm.py (ITSM_LLM_PROVIDER=fake) con latencia, jitter y tasa de error
+configurables, así que los números miden nuestro código (grafo, registro, SQLite, API) y se
+pueden repetir con la misma semilla. Mide:
+- pipeline: latencia por nodo y de extremo a extremo del grafo de LangGraph.
+- process_all: throughput de process_all_tickets.py con distinto número de workers, y que
+  todas las corridas dejen la BD igual que la secuencial (huella de tickets e historial de IA).
+- endpoints: p50/p95/p99 de cada endpoint de FastAPI (TestClient, en proceso) sobre BDs
+  sembradas de distintos tamaños.
+
+Cada medición corre en un subproceso con su propia ITSM_DB_PATH (el pool y las rutas se fijan
+al importar). Las BDs sembradas se guardan en --work-dir y se reutilizan entre corridas; cada
+medición trabaja sobre una copia. El resultado completo se escribe en JSON.
+
+Uso (desde Reto-1/):
+    python -m benchmarks.offline --sizes 1k,100k --out benchmarks/.data/offline.json
+    python -m benchmarks.offline --sizes 1k,100k,1M --latency-ms 80 --jitter-ms 40 --error-rate 0.02
+    python -m benchmarks.offline --skip pipeline,process_all --sizes 1M --requests 500
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+SECTIONS = ("pipeline", "process_all", "endpoints")
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+# ==== Utilidades ====
+
+def parse_size(label: str) -> int:
+    label = label.strip().lower()
+    if label[-1:] in SIZE_SUFFIXES:
+        return int(float(label[:-1]) * SIZE_SUFFIXES[label[-1]])
+    return int(label)
+
+def percentiles(samples: list) -> dict:
+    """Resumen de latencias en ms (percentiles por rango más cercano)."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def rank(p):
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3),
+        "p50_ms": round(rank(50), 3),
+        "p95_ms": round(rank(95), 3),
+        "p99_ms": round(rank(99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+def remove_db(path: str):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+# ==== Siembra ====
+
+def seeded_copy(work_dir: str, name: str, tickets: int, seed: int, pending_ratio: float) -> str:
+    """
+    Copia de trabajo de una BD sembrada con generate_tickets.py (se siembra la primera vez y
+    se reutiliza después).
+    """
+    from generate_tickets import generate
+
+    base = os.path.join(work_dir, f"seed-{tickets}-{seed}-{pending_ratio}.db")
+    if not os.path.exists(base):
+        print(f"Sembrando {tickets} tickets en {base}...")
+        summary = generate(
+            base, tickets, users=min(5000, max(50, tickets // 200)), seed=seed, days=365,
+            pending_ratio=pending_ratio, burst_ratio=0.02, verbose=False,
+        )
+        print(f"  listo en {summary['elapsed_s']:.1f}s")
+    run = os.path.join(work_dir, f"run-{name}.db")
+    remove_db(run)
+    shutil.copyfile(base, run)
+    return run
+
+# ==== Mediciones (se ejecutan en el subproceso) ====
+
+def llm_calls() -> int:
+    from src.core.llm import get_llm
+    # Clientes que usan los agentes: triaje estructurado (0.0) y soporte (0.3)
+    return sum(getattr(get_llm(temperature=t), "calls", 0) for t in (0.0, 0.3))
+
+def task_pipeline(args) -> dict:
+    from src.core import repository
+    from src.core.orchestrator import PIPELINE_MODE, build_graph, build_initial_state
+
+    with repository.connection() as conn:
+        tickets = [dict(r) for r in conn.execute(
+            "SELECT id, user_id, title, description FROM tickets ORDER BY created_at DESC LIMIT ?", (args.tickets + 1,)
+        )]
+    graph = build_graph(args.mode, checkpoint=False)
+    try:
+        graph.invoke(build_initial_state(tickets.pop())) # calentamiento, no cuenta
+    except Exception:
+        pass # con --error-rate el calentamiento también puede fallar
+
+    calls_before = llm_calls()
+    nodes, end_to_end, errors = {}, [], 0
+    for ticket in tickets:
+        start = last = time.perf_counter()
+        try:
+            # En un grafo secuencial cada actualización llega al terminar su nodo
+            for update in graph.stream(build_initial_state(ticket), stream_mode="updates"):
+                now = time.perf_counter()
+                for node in update:
+                    nodes.setdefault(node, []).append((now - last) * 1000)
+                last = now
+            end_to_end.append((time.perf_counter() - start) * 1000)
+        except Exception:
+            errors += 1
+    return {
+        "mode": args.mode or PIPELINE_MODE,
+        "tickets": len(tickets),
+        "errors": errors,
+        "llm_calls": llm_calls() - calls_before,
+        "end_to_end": percentiles(end_to_end),
+        "nodes": {node: percentiles(samples) for node, samples in nodes.items()},
+    }
+
+def results_fingerprint(conn) -> str:
+    """
+    Huella de lo que escribe la IA: tipo, prioridad, estado y respuesta de cada ticket más las
+    entradas de historial del Sistema IA (incluidos los "Vinculado como duplicado").
+    """
+    digest = hashlib.sha256()
+    for row in conn.execute("SELECT id, type, priority, status, ai_response FROM tickets ORDER BY id"):
+        digest.update(repr(tuple(row)).encode())
+    for row in conn.execute("SELECT ticket_id, action FROM ticket_history WHERE user_id = 1 ORDER BY ticket_id, action"):
+        digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+def task_process_all(args) -> dict:
+    from process_all_tickets import process_all
+    from src.core import repository
+
+    with repository.connection() as conn:
+        pending = len(repository.pending_ai_tickets(conn))
+    workers = int(args.workers)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # una línea por ticket: no interesa aquí
+        process_all(workers=workers, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - start
+    with repository.connection() as conn:
+        remaining = len(repository.pending_ai_tickets(conn))
+        fingerprint = results_fingerprint(conn)
+    return {
+        "workers": workers,
+        "tickets": pending,
+        "processed": pending - remaining,
+        "failed": remaining,
+        "llm_calls": llm_calls(),
+        "elapsed_s": round(elapsed, 3),
+        "tickets_per_s": round((pending - remaining) / elapsed, 2) if elapsed > 0 else 0.0,
+        "fingerprint": fingerprint,
+    }
+
+def task_endpoints(args) -> dict:
+    from fastapi.testclient import TestClient
+    from src.api.main import app
+
+    rng = random.Random(args.seed)
+    with TestClient(app) as client:
+        ids = [t["id"] for t in client.get("/api/tickets", params={"limit": 1000, "fields": "id"}).json()]
+        first = client.get("/api/tickets")
+        cursor = first.headers.get("X-Next-Cursor")
+        etag = client.get("/api/tickets", params={"limit": 1}).headers["ETag"]
+        since = (datetime.now(timezone.utc) - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+        new_ticket = {"user_id": 22, "title": "No funciona la VPN", "description": "La VPN se desconecta cada pocos minutos."}
+        created_jobs = []
+
+        def create():
+            response = client.post("/api/tickets", json=new_ticket)
+            created_jobs.append(response.json()["job"]["id"])
+            return response
+
+        # (nombre, petición, estados esperados, fracción de --requests)
+        cases = [
+            ("GET /api/users", lambda: client.get("/api/users"), (200,), 1),
+            ("GET /api/users/staff", lambda: client.get("/api/users/staff"), (200,), 1),
+            ("GET /api/tickets", lambda: client.get("/api/tickets"), (200,), 1),
+            ("GET /api/tickets (cursor)", lambda: client.get("/api/tickets", params={"cursor": cursor}), (200,), 1),
+            ("GET /api/tickets (filtros)", lambda: client.get("/api/tickets", params={"status": "open,in-progress", "priority": "high"}), (200,), 1),
+            ("GET /api/tickets (fields)", lambda: client.get("/api/tickets", params={"fields": "id,title,status,priority", "limit": 1000}), (200,), 1),
+            ("GET /api/tickets (If-None-Match)", lambda: client.get("/api/tickets", params={"limit": 1}, headers={"If-None-Match": etag}), (304,), 1),
+            ("GET /api/tickets (updated_since)", lambda: client.get("/api/tickets", params={"updated_since": since}), (200,), 1),
+            ("GET /api/tickets/{id}", lambda: client.get(f"/api/tickets/{rng.choice(ids)}"), (200,), 1),
+            ("GET /api/stats", lambda: client.get("/api/stats"), (200,), 1),
+            ("GET /api/cache/stats", lambda: client.get("/api/cache/stats"), (200,), 1),
+            ("PUT /api/tickets/{id}", lambda: client.put(f"/api/tickets/{rng.choice(ids)}", json={"status": rng.choice(("in-progress", "resolved"))}), (200,), 1),
+            ("POST /api/tickets", create, (202,), 1),
+            ("GET /api/jobs/{id}", lambda: client.get(f"/api/jobs/{rng.choice(created_jobs)}"), (200,), 1),
+            # Respuesta SSE completa: incluye el pipeline entero con el LLM simulado
+            ("POST /api/tickets/stream", lambda: client.post("/api/tickets/stream", json=new_ticket), (200,), 0.1),
+        ]
+        results = {}
+        for name, request, expected, fraction in cases:
+            iterations = max(5, int(args.requests * fraction))
+            for _ in range(min(3, iterations)): # calentamiento
+                request()
+            samples, errors = [], 0
+            for _ in range(iterations):
+                start = time.perf_counter()
+                response = request()
+                samples.append((time.perf_counter() - start) * 1000)
+                if response.status_code not in expected:
+                    errors += 1
+            results[name] = {**percentiles(samples), "errors": errors}
+    # GET /api/events es un stream de larga duración: su latencia no tiene percentiles útiles
+    return {"endpoints": results, "skipped": ["GET /api/events"]}
+
+TASKS = {"pipeline": task_pipeline, "process_all": task_process_all, "endpoints": task_endpoints}
+
+def run_task(task: str, db_path: str, args, **options) -> dict:
+    """Ejecuta una medición en un subproceso apuntando a `db_path` y retorna su JSON."""
+    result_path = os.path.join(args.work_dir, f"result-{task}.json")
+    env = {
+        **os.environ,
+        "ITSM_DB_PATH": db_path,
+        "ITSM_LLM_PROVIDER": "fake",
+        "ITSM_FAKE_LLM_LATENCY_MS": str(args.latency_ms),
+        "ITSM_FAKE_LLM_JITTER_MS": str(args.jitter_ms),
+        "ITSM_FAKE_LLM_ERROR_RATE": str(args.error_rate),
+        "ITSM_FAKE_LLM_RPM": str(args.provider_rpm),
+        "ITSM_FAKE_LLM_SEED": str(args.seed),
+        "ITSM_LLM_CACHE": "1" if args.cache else "0",
+        "ITSM_LLM_CACHE_DB": os.path.join(args.work_dir, "llm_cache.db"),
+        "ITSM_DEDUP": "1" if args.dedup else "0",
+        "ITSM_CHECKPOINT_DB": os.path.join(args.work_dir, "checkpoints.db"),
+    }
+    command = [sys.executable, "-m", "benchmarks.offline", "--task", task, "--result", result_path, "--seed", str(args.seed)]
+    for key, value in options.items():
+        command += [f"--{key.replace('_', '-')}", str(value)]
+    remove_db(os.path.join(args.work_dir, "llm_cache.db"))
+    remove_db(os.path.join(args.work_dir, "checkpoints.db"))
+    subprocess.run(command, cwd=ROOT, env=env, check=True)
+    with open(result_path) as f:
+        return json.load(f)
+
+def print_summary(results: dict):
+    pipeline = results.get("pipeline")
+    if pipeline:
+        print(f"\nPipeline ({pipeline['mode']}, {pipeline['tickets']} tickets, {pipeline['errors']} con error, {pipeline['llm_calls']} llamadas LLM):")
+        for node, r in [("extremo a extremo", pipeline["end_to_end"]), *pipeline["nodes"].items()]:
+            print(f"  {node:<22} p50 {r['p50_ms']:>9.2f}ms  p95 {r['p95_ms']:>9.2f}ms  p99 {r['p99_ms']:>9.2f}ms")
+    runs = results.get("process_all", [])
+    for run in runs:
+        print(f"process_all workers={run['workers']:<3} {run['processed']}/{run['tickets']} en {run['elapsed_s']:.1f}s -> {run['tickets_per_s']:.2f} tickets/s")
+    if len(runs) > 1:
+        # Con --error-rate qué tickets fallan depende del orden: solo es comparable sin errores
+        same = len({run["fingerprint"] for run in runs}) == 1
+        print(f"process_all: resultado {'idéntico' if same else 'DISTINTO'} entre workers={', '.join(str(r['workers']) for r in runs)}")
+    for size, data in results.get("endpoints", {}).items():
+        print(f"\nEndpoints con {size} tickets:")
+        for name, r in data["endpoints"].items():
+            flag = f"  ({r['errors']} errores)" if r["errors"] else ""
+            print(f"  {name:<36} p50 {r['p50_ms']:>8.2f}ms  p95 {r['p95_ms']:>8.2f}ms  p99 {r['p99_ms']:>8.2f}ms{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline con LLM simulado.")
+    parser.add_argument("--sizes", default="1k,100k", help="Tamaños de BD para los endpoints (p. ej. 1k,100k,1M)")
+    parser.add_argument("--skip", default="", help=f"Secciones a omitir ({', '.join(SECTIONS)})")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latencia media del LLM simulado")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Variación +/- de la latencia")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de 429 simulado por llamada")
+    parser.add_argument("--provider-rpm", type=float, default=0.0,
+                        help="Límite de peticiones por minuto del proveedor simulado (con ITSM_LLM_RPM se prueba el gobernador)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", default=None, help="Modo del pipeline (split / fused); por defecto ITSM_PIPELINE_MODE")
+    parser.add_argument("--pipeline-tickets", type=int, default=100)
+    parser.add_argument("--throughput-tickets", type=int, default=200, help="Backlog que procesa process_all")
+    parser.add_argument("--workers", default="1,8", help="Workers de process_all a comparar")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por endpoint")
+    parser.add_argument("--cache", action="store_true", help="Activar la caché de resultados del LLM")
+    parser.add_argument("--dedup", action="store_true", help="Activar la detección de duplicados")
+    parser.add_argument("--work-dir", default=os.path.join(ROOT, "benchmarks", ".data"))
+    parser.add_argument("--out", default=None, help="Fichero JSON de resultados (por defecto en --work-dir)")
+    # Uso interno: una medición dentro del subproceso
+    parser.add_argument("--task", choices=list(TASKS), help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--tickets", type=int, default=100, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.task:
+        result = TASKS[args.task](args)
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    skip = {s.strip() for s in args.skip.split(",") if s.strip()}
+    results = {
+        "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "config": {
+            "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate, "provider_rpm": args.provider_rpm,
+            "seed": args.seed, "cache": args.cache, "dedup": args.dedup,
+        },
+    }
+    mode = {"mode": args.mode} if args.mode else {}
+
+    if "pipeline" not in skip:
+        db = seeded_copy(args.work_dir, "pipeline", 1000, args.seed, 0.3)
+        results["pipeline"] = run_task("pipeline", db, args, tickets=args.pipeline_tickets, **mode)
+
+    if "process_all" not in skip:
+        results["process_all"] = []
+        for workers in (int(w) for w in args.workers.split(",")):
+            # Backlog completo: todos los tickets pendientes de IA; copia nueva por corrida
+            db = seeded_copy(args.work_dir, "process_all", args.throughput_tickets, args.seed, 1.0)
+            results["process_all"].append(run_task("process_all", db, args, workers=workers, batch_size=args.batch_size))
+
+    if "endpoints" not in skip:
+        results["endpoints"] = {}
+        for label in args.sizes.split(","):
+            db = seeded_copy(args.work_dir, f"endpoints-{label}", parse_size(label), args.seed, 0.3)
+            results["endpoints"][label] = {"tickets": parse_size(label), **run_task("endpoints", db, args, requests=args.requests)}
+
+    out = args.out or os.path.join(args.work_dir, "offline.json")
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print_summary(results)
+    print(f"\nResultados en {out}")
+
+if __name__ == '__main__':
+    main()
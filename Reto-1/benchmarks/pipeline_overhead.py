@@ -0,0 +1,74 @@
+"""
+Benchmark del coste fijo por ticket del pipeline de IA (sin llamadas de red).
+
+Compara el comportamiento anterior (recompilar el StateGraph y reconstruir prompt,
+ChatGroq y with_structured_output en cada ticket) contra el registro de proceso
+(`src/core/registry.py`), que compila y construye todo una sola vez.
+El ahorro real en producción es mayor: aquí no se cuenta el handshake TLS que el
+cliente HTTP reutilizado también se ahorra en cada salto al LLM.
+
+Uso (desde Reto-1/):
+    python -m benchmarks.pipeline_overhead --iterations 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# ChatGroq exige una API key para construirse aunque no llamemos a la red
+os.environ.setdefault("GROQ_API_KEY", "benchmark-dummy-key")
+
+from src.core import registry
+from src.core.llm import reset_llm_pool
+from src.core.orchestrator import build_graph
+
+AGENTS = ["clasificador", "priorizador", "soporte"]
+
+def legacy_setup():
+    """Lo que pagaba cada ticket antes: grafo nuevo + cadenas y clientes nuevos por nodo."""
+    reset_llm_pool()
+    registry.reset()
+    build_graph()
+    for name in AGENTS:
+        registry.get_chain(name)
+
+def registry_setup():
+    """Lo que paga cada ticket ahora: búsquedas en el registro ya precalentado."""
+    registry.get_graph()
+    for name in AGENTS:
+        registry.get_chain(name)
+
+def measure(fn, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": statistics.mean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[int(len(samples) * 0.95) - 1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    legacy = measure(legacy_setup, args.iterations)
+    registry.reset()
+    reset_llm_pool()
+    registry.warmup(strict=True)
+    pooled = measure(registry_setup, args.iterations)
+
+    print(f"{'modo':<10} {'media':>10} {'p50':>10} {'p95':>10}")
+    for label, r in (("legacy", legacy), ("registro", pooled)):
+        print(f"{label:<10} {r['mean_ms']:>8.3f}ms {r['p50_ms']:>8.3f}ms {r['p95_ms']:>8.3f}ms")
+    print(f"Overhead ahorrado por ticket: {legacy['mean_ms'] - pooled['mean_ms']:.3f} ms")
+
+if __name__ == '__main__':
+    main()
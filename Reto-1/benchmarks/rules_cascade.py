@@ -0,0 +1,64 @@
+"""
+Evalúa la cascada reglas locales -> LLM sobre tickets ya etiquetados por el LLM.
+
+Para cada umbral de confianza informa qué parte de los tickets se habría resuelto sin
+llamar al LLM (tipo, prioridad y ambos) y la exactitud de esas etiquetas locales frente a
+las que puso el LLM. Sirve para elegir ITSM_RULES_THRESHOLD. No hace llamadas de red.
+
+Uso (desde Reto-1/):
+    python -m benchmarks.rules_cascade --thresholds 0.5 0.8 1.0
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.rules import classify_ticket
+
+def load_labeled(db_path: str) -> list:
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT title, description, type, priority FROM tickets WHERE ai_response IS NOT NULL"
+    ).fetchall()
+    conn.close()
+    return rows
+
+def ratio(part: int, total: int) -> str:
+    return f"{part / total:6.1%}" if total else "   n/a"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default="data/tickets.db")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.8, 1.0])
+    args = parser.parse_args()
+
+    rows = load_labeled(args.db)
+    if not rows:
+        print("No hay tickets etiquetados por el LLM (ai_response IS NULL en todos).")
+        return
+
+    start = time.perf_counter()
+    predictions = [classify_ticket(description) for _, description, _, _ in rows]
+    per_ticket_us = (time.perf_counter() - start) / len(rows) * 1e6
+    print(f"{len(rows)} tickets etiquetados | reglas locales: {per_ticket_us:.1f} µs/ticket")
+
+    print(f"{'umbral':>6} | {'tipo saltado':>12} {'exactitud':>9} | {'prio saltada':>12} {'exactitud':>9} | {'ambos':>6}")
+    for threshold in args.thresholds:
+        type_skipped = type_ok = priority_skipped = priority_ok = both = 0
+        for (_, _, llm_type, llm_priority), p in zip(rows, predictions):
+            skip_type = p["type_confidence"] >= threshold
+            skip_priority = p["priority_confidence"] >= threshold
+            type_skipped += skip_type
+            priority_skipped += skip_priority
+            type_ok += skip_type and p["ticket_type"] == llm_type
+            priority_ok += skip_priority and p["priority"] == llm_priority
+            both += skip_type and skip_priority
+        n = len(rows)
+        print(f"{threshold:>6.2f} | {ratio(type_skipped, n):>12} {ratio(type_ok, type_skipped):>9} | "
+              f"{ratio(priority_skipped, n):>12} {ratio(priority_ok, priority_skipped):>9} | {ratio(both, n):>6}")
+
+if __name__ == '__main__':
+    main()
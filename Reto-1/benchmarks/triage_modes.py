@@ -0,0 +1,89 @@
+"""
+Compara el triaje en dos nodos ("split") contra el triaje fusionado ("fused").
+
+Pasa los mismos tickets por ambos grafos y mide la latencia hasta tener tipo y prioridad
+(fin del triaje), la latencia total del pipeline y el acuerdo de etiquetas entre modos.
+Llama al LLM real configurado, por lo que requiere GROQ_API_KEY.
+
+Uso (desde Reto-1/):
+    python -m benchmarks.triage_modes --limit 20
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.orchestrator import build_graph, build_initial_state
+
+TRIAGE_DONE = {"split": "priorizador", "fused": "triaje"}
+
+def load_tickets(db_path: str, limit: int) -> list:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute("SELECT id, user_id, title, description FROM tickets ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+def run_mode(mode: str, tickets: list) -> list:
+    """
+    Ejecuta cada ticket en streaming de actualizaciones para saber cuándo acaba el triaje.
+    Sin caché, duplicados ni reglas locales: queremos medir las llamadas reales al LLM en ambos modos.
+    """
+    graph = build_graph(mode, cache=False, dedup=False, rules=False, checkpoint=False)
+    results = []
+    for ticket in tickets:
+        state = {}
+        triage_ms = None
+        start = time.perf_counter()
+        for update in graph.stream(build_initial_state(ticket), stream_mode="updates"):
+            for node, values in update.items():
+                state.update(values or {})
+                if node == TRIAGE_DONE[mode]:
+                    triage_ms = (time.perf_counter() - start) * 1000
+        total_ms = (time.perf_counter() - start) * 1000
+        results.append({
+            "id": ticket["id"],
+            "ticket_type": state.get("ticket_type"),
+            "priority": state.get("priority"),
+            "triage_ms": triage_ms,
+            "total_ms": total_ms,
+        })
+    return results
+
+def summarize(label: str, results: list):
+    triage = [r["triage_ms"] for r in results]
+    total = [r["total_ms"] for r in results]
+    print(f"{label:<6} triaje media {statistics.mean(triage):8.1f}ms  p50 {statistics.median(triage):8.1f}ms | "
+          f"total media {statistics.mean(total):8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default="data/tickets.db")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    tickets = load_tickets(args.db, args.limit)
+    if not tickets:
+        print("No hay tickets en la base de datos.")
+        return
+
+    split = run_mode("split", tickets)
+    fused = run_mode("fused", tickets)
+
+    summarize("split", split)
+    summarize("fused", fused)
+
+    n = len(tickets)
+    same_type = sum(a["ticket_type"] == b["ticket_type"] for a, b in zip(split, fused))
+    same_priority = sum(a["priority"] == b["priority"] for a, b in zip(split, fused))
+    print(f"Acuerdo tipo: {same_type}/{n} ({same_type / n:.0%}) | Acuerdo prioridad: {same_priority}/{n} ({same_priority / n:.0%})")
+    for a, b in zip(split, fused):
+        if (a["ticket_type"], a["priority"]) != (b["ticket_type"], b["priority"]):
+            print(f"  {a['id']}: split={a['ticket_type']}/{a['priority']} fused={b['ticket_type']}/{b['priority']}")
+
+if __name__ == '__main__':
+    main()
@@ -1,139 +1,338 @@
-import sqlite3
+"""
+Genera la base de datos de tickets: la demo de siempre (7 usuarios y 20 tickets abiertos que
+esperan a la IA) o un volumen sintético reproducible para pruebas de carga, con millones de
+tickets, miles de usuarios, historial completo y ráfagas de reportes por caídas de servicio.
+
+La carga masiva escribe con executemany en transacciones de `--batch-size` tickets y relaja
+los pragmas mientras dura (synchronous=OFF, caché grande). En una BD nueva además se quitan
+índices y triggers de tickets / ticket_history antes de cargar y se recrean al final (más los
+contadores de estadísticas en un solo recálculo), que es mucho más rápido que mantenerlos
+fila a fila. Con --append se conserva todo y los triggers se disparan como en producción.
+
+Uso (desde Reto-1/):
+    python generate_tickets.py                                     # demo
+    python generate_tickets.py --tickets 1000000 --users 5000 --days 180 --pending-ratio 0.05
+    python generate_tickets.py --append --tickets 50000 --seed 7   # añadir a la BD existente
+"""
+import argparse
 import random
-from datetime import datetime, timedelta
-
-def create_db():
-    conn = sqlite3.connect('data/tickets.db')
-    cursor = conn.cursor()
-    
-    # Limpiamos todo
-    cursor.execute('DROP TABLE IF EXISTS ticket_history')
-    cursor.execute('DROP TABLE IF EXISTS tickets')
-    cursor.execute('DROP TABLE IF EXISTS users')
-    
-    # 1. TABLA: USERS
-    cursor.execute('''
-    CREATE TABLE users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT NOT NULL UNIQUE,
-        password TEXT NOT NULL,
-        puesto TEXT NOT NULL,
-        area TEXT NOT NULL,
-        role TEXT NOT NULL DEFAULT 'user', -- 'user', 'staff', 'admin'
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # 2. TABLA: TICKETS
-    cursor.execute('''
-    CREATE TABLE tickets (
-        id TEXT PRIMARY KEY, -- ej: INC-000001
-        user_id INTEGER NOT NULL,
-        title TEXT NOT NULL,
-        description TEXT NOT NULL,
-        type TEXT NOT NULL, -- 'incident', 'request', 'problem'
-        priority TEXT NOT NULL, -- 'critical', 'high', 'medium', 'low'
-        status TEXT NOT NULL DEFAULT 'open', -- 'open', 'in-progress', 'resolved', 'closed'
-        assigned_to_id INTEGER,
-        ai_response TEXT,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (user_id) REFERENCES users(id),
-        FOREIGN KEY (assigned_to_id) REFERENCES users(id)
-    )
-    ''')
-    
-    # 3. TABLA: TICKET_HISTORY
-    cursor.execute('''
-    CREATE TABLE ticket_history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ticket_id TEXT NOT NULL,
-        action TEXT NOT NULL,
-        user_id INTEGER NOT NULL,
-        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (ticket_id) REFERENCES tickets(id),
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    ''')
-    
-    # ==== INSERTAR DATOS OFICIALES ====
-    users_data = [
-        ('Admin Sistema', 'admin@nttdata.com', 'pwd_hash', 'Administrador de Sistemas', 'Tecnología', 'admin'),
-        ('Juan Pérez', 'juan@nttdata.com', 'pwd_hash', 'Soporte TI', 'Soporte', 'staff'),
-        ('María González', 'maria@nttdata.com', 'pwd_hash', 'Analista Senior', 'Finanzas', 'user'),
-        ('Carlos Rodríguez', 'carlos@nttdata.com', 'pwd_hash', 'Desarrollador', 'Tecnología', 'user'),
-        ('Ana Martínez', 'ana@nttdata.com', 'pwd_hash', 'Líder de Proyecto', 'Operaciones', 'staff'),
-        ('Luis Torres', 'luis@nttdata.com', 'pwd_hash', 'Analista Junior', 'Marketing', 'user'),
-        ('Sofia Vargas', 'sofia@nttdata.com', 'pwd_hash', 'Gerente', 'Recursos Humanos', 'user')
-    ]
-    cursor.executemany('''
+import sys
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
+from src.core import repository, stats, search
+from src.core.migrations import apply_pragmas, migrate
+
+# ==== DATOS OFICIALES ====
+OFFICIAL_USERS = [
+    ('Admin Sistema', 'admin@nttdata.com', 'pwd_hash', 'Administrador de Sistemas', 'Tecnología', 'admin'),
+    ('Juan Pérez', 'juan@nttdata.com', 'pwd_hash', 'Soporte TI', 'Soporte', 'staff'),
+    ('María González', 'maria@nttdata.com', 'pwd_hash', 'Analista Senior', 'Finanzas', 'user'),
+    ('Carlos Rodríguez', 'carlos@nttdata.com', 'pwd_hash', 'Desarrollador', 'Tecnología', 'user'),
+    ('Ana Martínez', 'ana@nttdata.com', 'pwd_hash', 'Líder de Proyecto', 'Operaciones', 'staff'),
+    ('Luis Torres', 'luis@nttdata.com', 'pwd_hash', 'Analista Junior', 'Marketing', 'user'),
+    ('Sofia Vargas', 'sofia@nttdata.com', 'pwd_hash', 'Gerente', 'Recursos Humanos', 'user')
+]
+
+REPORTS = [
+    ("No funciona la VPN", "Desde la actualización de Windows ayer, mi laptop no conecta a la VPN. Tengo reunión de gerencia en 15 min."),
+    ("Correo caído", "Hola, no me da el correo, ayuda es urgente mi jefe me matará, necesito enviar un excel ya mismo."),
+    ("Acceso a Finanzas", "Solicito acceso a la carpeta compartida de Finanzas \\\\server\\finanzas_2024"),
+    ("Impresora dañada", "La impresora del piso 3 hace un ruido raro y mancha las hojas de toner."),
+    ("Contraseña SAP", "He olvidado mi contraseña de SAP y se bloqueó mi cuenta tras 3 intentos."),
+    ("Sistema Facturación lento", "El sistema de facturación web está cargando súper lento desde esta mañana y me saca error 50x a veces."),
+    ("Pantallazo Azul", "Pantallazo azul en mi equipo de escritorio, dice un error de KERNEL_DATA_INPAGE_ERROR."),
+    ("Instalar Photoshop", "Necesito instalar Photoshop en mi equipo nuevo para el área de Mkt."),
+    ("Monitor parpadea", "Mi monitor secundario parpadea cuando abro aplicaciones pesadas."),
+    ("Enlace Teams Roto", "El enlace de Teams de la sala de juntas no funciona, dice que la sala está ocupada pero no hay nadie."),
+    ("Outlook límites", "No puedo adjuntar archivos de más de 10MB en el Outlook cliente nuevo."),
+    ("Robo equipo móvil", "Me robaron el celular corporativo en el transporte, por favor bloqueen el acceso."),
+    ("Teclado dañado", "El teclado de mi laptop tiene la tecla 'E' atascada."),
+    ("Instalar IDE Python", "Necesito que me instalen Python y Visual Studio Code para un proyecto nuevo de datos."),
+    ("Permisos Jira", "Mi cuenta de Jira no me permite crear épicas, dice que no tengo permisos en el proyecto B2B."),
+    ("Falla en cable red", "No recibe internet mi equipo si lo conecto por cable, por WiFi sí funciona."),
+    ("Acrobat colapsa", "Cada vez que intento imprimir PDF doble cara la aplicación Adobe Acrobat colapsa."),
+    ("Mouse Ergonómico", "Necesito un mouse ergonómico por recomendaciones de salud ocupacional."),
+    ("Servidor de desarrollo", "El servidor de desarrollo parece estar caído, intento un ping y no responde."),
+    ("Posible Pishing", "He recibido un correo muy extraño pidiéndome cambiar mi clave de inmediato con un link acortado, creo que es pishing.")
+]
+
+# ==== DATOS SINTÉTICOS ====
+# Reportes de caída de un servicio compartido: los que llegan en ráfaga (muchos usuarios a la vez)
+OUTAGE_REPORTS = [
+    ("Correo caído", "No me carga el correo, sale error de conexión con el servidor."),
+    ("No funciona la VPN", "La VPN no conecta desde hace unos minutos, da timeout."),
+    ("Sistema Facturación lento", "El sistema de facturación no responde, se queda cargando."),
+    ("Servidor de desarrollo", "El servidor de desarrollo no responde, no puedo desplegar."),
+    ("Enlace Teams Roto", "Teams se desconecta en todas las reuniones, no hay audio."),
+    ("Caída de SAP", "SAP muestra error al iniciar sesión, no puedo registrar pedidos."),
+]
+DETAILS = [
+    "", "", "", "", "Es la segunda vez esta semana.", "Me pasa desde el lunes.",
+    "Trabajo en remoto hoy.", "Afecta a todo mi equipo.", "Adjunto captura del error.", "Es urgente, por favor.",
+]
+FIRST_NAMES = ["Lucía", "Mateo", "Valentina", "Diego", "Camila", "Javier", "Daniela", "Andrés", "Paula", "Jorge",
+               "Elena", "Miguel", "Carmen", "Pablo", "Isabel", "Raúl", "Laura", "Hugo", "Marta", "Sergio"]
+LAST_NAMES = ["García", "López", "Sánchez", "Ramírez", "Flores", "Castro", "Morales", "Ortiz", "Ruiz", "Herrera",
+              "Medina", "Rojas", "Vega", "Navarro", "Silva", "Romero", "Mendoza", "Reyes", "Cruz", "Díaz"]
+AREAS = ["Tecnología", "Soporte", "Finanzas", "Operaciones", "Marketing", "Recursos Humanos", "Ventas", "Legal", "Compras", "Logística"]
+PUESTOS = ["Analista Junior", "Analista Senior", "Desarrollador", "Gerente", "Líder de Proyecto", "Asistente", "Coordinador"]
+STAFF_RATIO = 0.05
+BURST_SIZE = (5, 150) # tickets por ráfaga
+BURST_MINUTES = 45 # duración máxima de una ráfaga
+AI_RESPONSE = (
+    "**Diagnóstico sugerido**\n\n"
+    "El reporte se ha tipificado según su impacto y urgencia.\n\n"
+    "1. Verificar el estado del servicio afectado.\n"
+    "2. Reintentar tras reiniciar la aplicación.\n"
+    "3. Escalar a nivel 2 si persiste."
+)
+
+# Pragmas solo durante la carga: un corte de luz a mitad puede dejar la BD inservible, que
+# para datos sintéticos da igual. apply_pragmas() los devuelve a los del proyecto al terminar.
+BULK_PRAGMAS = [
+    "PRAGMA synchronous = OFF",
+    "PRAGMA cache_size = -262144", # 256 MB
+    "PRAGMA temp_store = MEMORY",
+]
+
+def _fmt(moment: datetime) -> str:
+    # Mismo formato que CURRENT_TIMESTAMP; isoformat es varias veces más rápido que strftime
+    return moment.isoformat(sep=' ', timespec='seconds')
+
+def reset_db(conn):
+    """Borra todas las tablas (también las auxiliares de migraciones posteriores) y migra desde cero."""
+    # Las tablas virtuales (FTS5) primero: al borrarlas se llevan sus tablas internas
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY sql LIKE 'CREATE VIRTUAL%' DESC"
+    )]
+    for table in tables:
+        conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+    # Esquema versionado (tablas, índices y tablas auxiliares) desde src/core/migrations.py
+    migrate(conn)
+
+def suspend_indexes_and_triggers(conn) -> list:
+    """
+    Quita los índices secundarios y triggers de tickets / ticket_history. Retorna su SQL para
+    recrearlos con restore_schema_objects() tras la carga.
+    """
+    objects = conn.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND tbl_name IN ('tickets', 'ticket_history') AND sql IS NOT NULL
+    ''').fetchall()
+    for kind, name, _ in objects:
+        conn.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+    conn.commit()
+    return [sql for _, _, sql in objects]
+
+def restore_schema_objects(conn, statements: list):
+    for sql in statements:
+        conn.execute(sql)
+    # Lo que los triggers habrían ido manteniendo, calculado de una vez
+    stats.rebuild(conn)
+    search.rebuild(conn)
+    conn.commit()
+
+def generate_users(conn, count: int, rng: random.Random) -> int:
+    """Inserta `count` usuarios sintéticos (un STAFF_RATIO de ellos técnicos). Retorna cuántos."""
+    start = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0] + 1
+    rows = []
+    for n in range(start, start + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        if rng.random() < STAFF_RATIO:
+            rows.append((f"{first} {last}", f"soporte{n}@nttdata.com", 'pwd_hash', 'Soporte TI', 'Soporte', 'staff'))
+        else:
+            rows.append((f"{first} {last}", f"usuario{n}@nttdata.com", 'pwd_hash', rng.choice(PUESTOS), rng.choice(AREAS), 'user'))
+    conn.executemany('''
         INSERT INTO users (name, email, password, puesto, area, role)
         VALUES (?, ?, ?, ?, ?, ?)
-    ''', users_data)
-    
-    # Obtener IDs de usuarios tipo "user" para generar tickets falsos
-    cursor.execute("SELECT id FROM users WHERE role = 'user'")
-    normal_users = [row[0] for row in cursor.fetchall()]
-
-    dummy_reports = [
-        ("No funciona la VPN", "Desde la actualización de Windows ayer, mi laptop no conecta a la VPN. Tengo reunión de gerencia en 15 min."),
-        ("Correo caído", "Hola, no me da el correo, ayuda es urgente mi jefe me matará, necesito enviar un excel ya mismo."),
-        ("Acceso a Finanzas", "Solicito acceso a la carpeta compartida de Finanzas \\\\server\\finanzas_2024"),
-        ("Impresora dañada", "La impresora del piso 3 hace un ruido raro y mancha las hojas de toner."),
-        ("Contraseña SAP", "He olvidado mi contraseña de SAP y se bloqueó mi cuenta tras 3 intentos."),
-        ("Sistema Facturación lento", "El sistema de facturación web está cargando súper lento desde esta mañana y me saca error 50x a veces."),
-        ("Pantallazo Azul", "Pantallazo azul en mi equipo de escritorio, dice un error de KERNEL_DATA_INPAGE_ERROR."),
-        ("Instalar Photoshop", "Necesito instalar Photoshop en mi equipo nuevo para el área de Mkt."),
-        ("Monitor parpadea", "Mi monitor secundario parpadea cuando abro aplicaciones pesadas."),
-        ("Enlace Teams Roto", "El enlace de Teams de la sala de juntas no funciona, dice que la sala está ocupada pero no hay nadie."),
-        ("Outlook límites", "No puedo adjuntar archivos de más de 10MB en el Outlook cliente nuevo."),
-        ("Robo equipo móvil", "Me robaron el celular corporativo en el transporte, por favor bloqueen el acceso."),
-        ("Teclado dañado", "El teclado de mi laptop tiene la tecla 'E' atascada."),
-        ("Instalar IDE Python", "Necesito que me instalen Python y Visual Studio Code para un proyecto nuevo de datos."),
-        ("Permisos Jira", "Mi cuenta de Jira no me permite crear épicas, dice que no tengo permisos en el proyecto B2B."),
-        ("Falla en cable red", "No recibe internet mi equipo si lo conecto por cable, por WiFi sí funciona."),
-        ("Acrobat colapsa", "Cada vez que intento imprimir PDF doble cara la aplicación Adobe Acrobat colapsa."),
-        ("Mouse Ergonómico", "Necesito un mouse ergonómico por recomendaciones de salud ocupacional."),
-        ("Servidor de desarrollo", "El servidor de desarrollo parece estar caído, intento un ping y no responde."),
-        ("Posible Pishing", "He recibido un correo muy extraño pidiéndome cambiar mi clave de inmediato con un link acortado, creo que es pishing.")
-    ]
-    
-    tickets_data = []
-    history_data = []
-    now = datetime.now()
-    
-    for i in range(20):
-        # Fechas simuladas de los últimos 3 días
-        random_days = random.uniform(0, 3)
-        created_time = now - timedelta(days=random_days)
-        str_time = created_time.strftime("%Y-%m-%d %H:%M:%S")
-        
-        ticket_id = f"INC-{str(i+1).zfill(6)}"
-        user_id = random.choice(normal_users)
-        title, description = dummy_reports[i]
-        
-        # Insertamos como 'open'. Aún no tienen tipo ni prioridad definida (esto lo hará la IA)
-        tickets_data.append((ticket_id, user_id, title, description, 'incident', 'low', 'open', str_time, str_time))
-        
-        # Historial de creación
-        history_data.append((ticket_id, "Ticket reportado y creado por el usuario en el Portal.", user_id, str_time))
-    
-    cursor.executemany('''
-        INSERT INTO tickets (id, user_id, title, description, type, priority, status, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', tickets_data)
-    
-    cursor.executemany('''
-        INSERT INTO ticket_history (ticket_id, action, user_id, timestamp)
-        VALUES (?, ?, ?, ?)
-    ''', history_data)
-    
+    ''', rows)
+    return len(rows)
+
+def plan_tickets(rng: random.Random, count: int, days: float, burst_ratio: float, now: datetime) -> list:
+    """
+    Fecha de creación y plantilla de cada ticket, ordenados por fecha (los IDs crecen con el
+    tiempo como en producción). Una fracción `burst_ratio` llega en ráfagas: muchos usuarios
+    reportando la misma caída en pocos minutos. Retorna [(creado, título, descripción, ráfaga)].
+    """
+    span = days * 24 * 3600
+    plan = []
+    burst_total = int(count * burst_ratio) if count * burst_ratio >= BURST_SIZE[0] else 0
+    burst_id = 0
+    while burst_total - len(plan) >= BURST_SIZE[0]:
+        size = min(rng.randint(*BURST_SIZE), burst_total - len(plan))
+        started = now - timedelta(seconds=rng.uniform(0, span))
+        title, description = rng.choice(OUTAGE_REPORTS)
+        burst_id += 1
+        for _ in range(size):
+            created = min(now, started + timedelta(seconds=rng.uniform(0, BURST_MINUTES * 60)))
+            plan.append((created, title, f"{description} {rng.choice(DETAILS)}".strip(), burst_id))
+
+    # El resto recorre las plantillas en orden aleatorio, todas antes de repetir ninguna
+    templates = []
+    for _ in range(count - len(plan)):
+        if not templates:
+            templates = rng.sample(REPORTS, len(REPORTS))
+        title, description = templates.pop()
+        created = now - timedelta(seconds=rng.uniform(0, span))
+        plan.append((created, title, f"{description} {rng.choice(DETAILS)}".strip() if count > len(REPORTS) else description, 0))
+    plan.sort(key=lambda p: p[0])
+    return plan
+
+def ticket_trail(rng: random.Random, created: datetime, burst: int, now: datetime, staff: list):
+    """
+    Estado final y historial de un ticket ya enriquecido: IA -> asignación -> resolución ->
+    cierre, cada paso algo después del anterior. Los más antiguos suelen estar cerrados.
+    Retorna (tipo, prioridad, estado, asignado, [(acción, user_id, instante)]).
+    """
+    age_days = (now - created).total_seconds() / 86400
+    if age_days < 2:
+        weights = (4, 4, 2, 0)
+    elif age_days < 14:
+        weights = (1, 3, 4, 2)
+    else:
+        weights = (0.2, 0.8, 3, 6)
+    status = rng.choices(('open', 'in-progress', 'resolved', 'closed'), weights=weights)[0]
+    if burst:
+        ticket_type, priority = 'incident', rng.choice(('critical', 'high'))
+    else:
+        ticket_type = rng.choices(('incident', 'request', 'problem'), weights=(6, 3, 1))[0]
+        priority = rng.choices(('critical', 'high', 'medium', 'low'), weights=(1, 3, 4, 2))[0]
+
+    moment = min(now, created + timedelta(seconds=rng.uniform(5, 120)))
+    trail = [(f"IA Clasifica: {ticket_type.upper()} - {priority.upper()}.", 1, moment)]
+    assigned = None
+    if status != 'open':
+        assigned = rng.choice(staff)
+        moment = min(now, moment + timedelta(minutes=rng.uniform(5, 240)))
+        trail.append((f"Asignado a {assigned[1]}", 1, moment))
+    if status in ('resolved', 'closed'):
+        moment = min(now, moment + timedelta(hours=rng.uniform(0.5, 48)))
+        trail.append(("Estado cambiado a resolved", assigned[0], moment))
+    if status == 'closed':
+        moment = min(now, moment + timedelta(hours=rng.uniform(1, 72)))
+        trail.append(("Estado cambiado a closed", 1, moment))
+    return ticket_type, priority, status, assigned and assigned[0], trail
+
+def generate(path: str = None, tickets: int = 20, users: int = None, seed: int = None, days: float = 3,
+             pending_ratio: float = 1.0, burst_ratio: float = 0.0, append: bool = False,
+             batch_size: int = 50_000, verbose: bool = True) -> dict:
+    """
+    Crea (o amplía con `append`) la BD con `tickets` tickets creados en los últimos `days` días.
+    Una fracción `pending_ratio` queda abierta y sin IA, como los reportes recién llegados; el
+    resto trae tipo, prioridad, respuesta de IA, técnico y su historial. `users` son usuarios
+    sintéticos extra además de los oficiales. Misma semilla, mismos datos.
+    """
+    rng = random.Random(seed)
+    path = path or repository.DB_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = repository.connect(path)
+    started = time.perf_counter()
+
+    suspended = []
+    if append:
+        migrate(conn)
+    else:
+        # Limpiamos todo
+        reset_db(conn)
+        conn.executemany('''
+            INSERT INTO users (name, email, password, puesto, area, role)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', OFFICIAL_USERS)
+        if tickets > batch_size:
+            suspended = suspend_indexes_and_triggers(conn)
+    conn.commit()
+    for pragma in BULK_PRAGMAS:
+        conn.execute(pragma)
+
+    created_users = generate_users(conn, users or 0, rng)
+    reporters = [row[0] for row in conn.execute("SELECT id FROM users WHERE role = 'user' ORDER BY id")]
+    staff = [tuple(row) for row in conn.execute("SELECT id, name FROM users WHERE role IN ('staff', 'admin') ORDER BY id")]
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    plan = plan_tickets(rng, tickets, days, burst_ratio, now)
+    # Rango de IDs reservado de una vez en la secuencia; se confirma con el primer lote
+    ticket_numbers = repository.reserve_ids(conn, tickets)
+
+    history_count = 0
+    for start in range(0, tickets, batch_size):
+        tickets_data, history_data = [], []
+        for i in range(start, min(start + batch_size, tickets)):
+            created, title, description, burst = plan[i]
+            ticket_id = repository.format_ticket_id(ticket_numbers[i])
+            user_id = rng.choice(reporters)
+            created_at = _fmt(created)
+            # Historial de creación
+            history_data.append((ticket_id, "Ticket reportado vía Portal", user_id, created_at))
+            if rng.random() < pending_ratio:
+                # Como 'open' y sin tipo ni prioridad definida (esto lo hará la IA)
+                tickets_data.append((ticket_id, user_id, title, description, 'incident', 'low', 'open', None, None, created_at, created_at))
+                continue
+            ticket_type, priority, status, assigned_id, trail = ticket_trail(rng, created, burst, now, staff)
+            history_data.extend((ticket_id, action, actor, _fmt(moment)) for action, actor, moment in trail)
+            tickets_data.append((
+                ticket_id, user_id, title, description, ticket_type, priority, status,
+                assigned_id, AI_RESPONSE, created_at, _fmt(trail[-1][2]),
+            ))
+        conn.executemany('''
+            INSERT INTO tickets (id, user_id, title, description, type, priority, status, assigned_to_id,
+                                 ai_response, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', tickets_data)
+        conn.executemany('''
+            INSERT INTO ticket_history (ticket_id, action, user_id, timestamp)
+            VALUES (?, ?, ?, ?)
+        ''', history_data)
+        conn.commit()
+        history_count += len(history_data)
+        if verbose and tickets > batch_size:
+            print(f"  {min(start + batch_size, tickets)}/{tickets} tickets...")
+
+    if suspended:
+        if verbose:
+            print("  Recreando índices, triggers y contadores...")
+        restore_schema_objects(conn, suspended)
+    # Estadísticas para el planificador (sqlite_stat1). analysis_limit acota las filas que
+    # ANALYZE mira por índice: con millones de tickets basta una muestra
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("ANALYZE")
     conn.commit()
+    apply_pragmas(conn)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
     conn.close()
-    
-    print(f"Base de datos migrada al standard de NTT Data. {len(tickets_data)} tickets encolados para su análisis.")
+
+    return {
+        "tickets": tickets,
+        "history": history_count,
+        "users": created_users,
+        "bursts": len({p[3] for p in plan if p[3]}),
+        "elapsed_s": time.perf_counter() - started,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera la BD de tickets (demo o datos sintéticos de carga).")
+    parser.add_argument("--tickets", type=int, default=20)
+    parser.add_argument("--users", type=int, default=0, help="Usuarios sintéticos además de los oficiales")
+    parser.add_argument("--days", type=float, default=3, help="Ventana de fechas de creación hacia atrás")
+    parser.add_argument("--pending-ratio", type=float, default=1.0, help="Fracción de tickets abiertos sin IA")
+    parser.add_argument("--burst-ratio", type=float, default=0.0, help="Fracción de tickets en ráfagas de caídas")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para datos reproducibles")
+    parser.add_argument("--append", action="store_true", help="Añadir a la BD existente en lugar de recrearla")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Tickets por transacción")
+    parser.add_argument("--db", default=repository.DB_PATH)
+    args = parser.parse_args()
+
+    summary = generate(
+        args.db, args.tickets, args.users, args.seed, args.days, args.pending_ratio,
+        args.burst_ratio, args.append, args.batch_size,
+    )
+    action = "añadidos" if args.append else "generados"
+    print(f"{summary['tickets']} tickets ({summary['bursts']} ráfagas), {summary['history']} entradas de historial "
+          f"y {summary['users']} usuarios {action} en {summary['elapsed_s']:.1f}s -> {args.db}")
 
 if __name__ == '__main__':
-    create_db()
+    main()
@@ -1,66 +1,315 @@
-import sqlite3
+import argparse
+import asyncio
 import sys
 import os
+import socket
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
-from src.core.orchestrator import process_ticket
+from src.core.orchestrator import process_ticket, aprocess_ticket
+from src.core.enrichment import save_ai_results
+from src.core.cache import CACHE_ENABLED, get_cache
+from src.core.dedup import DEDUP_ENABLED, get_index, rebuild_index
+from src.core import repository, metrics, checkpoints, retrieval
+from src.core.governor import CircuitOpenError
+from src.core.scheduler import urgency_order
 
-def process_all():
+# Varios process_all (en uno o varios hosts, sobre la misma BD) se reparten el backlog: cada
+# ticket se reclama con un lease antes de llamar a la IA. Si el proceso muere, al vencer el
+# lease otro lo retoma (desde su último checkpoint). El lease se renueva antes de cada intento
+# contra la IA y al guardar; si otro proceso lo reclamó entretanto, el resultado se descarta.
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+LEASE_SECONDS = int(os.getenv("ITSM_TICKET_LEASE_SECONDS", "600"))
+
+class LeaseLostError(RuntimeError):
+    """Otro proceso reclamó el ticket (venció el lease) mientras este esperaba para reintentar."""
+
+def claim(ticket_id: str) -> bool:
+    """Lease del ticket para este proceso (conexión propia: el escritor usa la de la corrida)."""
+    with repository.transaction() as conn:
+        return repository.claim_ticket(conn, ticket_id, OWNER, LEASE_SECONDS)
+
+def renew(ticket_id: str) -> bool:
+    """Extiende el lease antes de otro intento; False si ya lo tiene otro proceso."""
+    with repository.transaction() as conn:
+        return bool(repository.renew_leases(conn, [ticket_id], OWNER, LEASE_SECONDS))
+
+def save_results(conn, results, failures=()):
     """
-    Procesa todos los tickets de la base de datos que tienen estado 'open'.
+    Escribe en una sola transacción el resultado de la IA de uno o varios tickets.
+    `results` es una lista de tuplas (ticket_id, state) y `failures` de (ticket_id, error),
+    que suman un intento al ticket (dead-letter al agotarlos). Es el único punto que escribe,
+    tanto en modo secuencial como concurrente, así ambos dejan la BD exactamente igual.
+    Descarta los tickets cuyo lease ya es de otro proceso (este se quedó sin él a mitad de
+    camino) y retorna sus IDs. Si algo falla, deshace la transacción entera y relanza: la
+    conexión queda limpia para registrar el fallo.
     """
-    conn = sqlite3.connect('data/tickets.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM tickets WHERE status = 'open' AND ai_response IS NULL")
-    rows = cursor.fetchall()
-    
-    if not rows:
-        print("No hay tickets pendientes de procesar.")
-        conn.close()
-        return
-        
-    print(f"Iniciando el procesamiento de {len(rows)} tickets ficticios con la IA LangGraph...")
-    
-    system_user_id = 1 # Admin reservado para operaciones del sistema
-    
-    for row in rows:
-        ticket_data = dict(row)
+    try:
+        # Primera escritura de la transacción: toma el cerrojo, nadie puede reclamarlos hasta el commit
+        owned = repository.renew_leases(conn, [ticket_id for ticket_id, _ in [*results, *failures]], OWNER, LEASE_SECONDS)
+        lost = {ticket_id for ticket_id, _ in [*results, *failures] if ticket_id not in owned}
+        results = [(ticket_id, state) for ticket_id, state in results if ticket_id in owned]
+        failures = [(ticket_id, error) for ticket_id, error in failures if ticket_id in owned]
+        if results:
+            save_ai_results(conn, results, action_label="IA Clasifica")
+        dead_letter = []
+        for ticket_id, error in failures:
+            attempts, dead = repository.record_ai_failure(conn, ticket_id, str(error))
+            if dead:
+                dead_letter.append((ticket_id, attempts))
+        repository.release_tickets(conn, [ticket_id for ticket_id, _ in [*results, *failures]], OWNER)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    for ticket_id in sorted(lost):
+        print(f"Aviso: el lease de #{ticket_id} lo tiene otro proceso; se descarta este resultado")
+    for ticket_id, attempts in dead_letter:
+        print(f" -> Ticket #{ticket_id} pasa a dead-letter tras {attempts} intentos fallidos")
+    # Resultado ya guardado: el trabajo a medias de sus checkpoints sobra
+    checkpoints.clear(ticket_id for ticket_id, _ in results)
+    return lost
+
+def triage_seconds(state: dict):
+    """Desde que el ticket entró en cola hasta que tuvo tipo y prioridad (antes del agente de soporte)."""
+    done = [e["finished_at"] for e in state.get("ai_metrics") or [] if e["node"] not in ("soporte", "guardar_cache")]
+    return max(done) - state["queued_at"] if done and state.get("queued_at") else None
+
+def record_triage(triage_times: dict, state: dict):
+    seconds = triage_seconds(state)
+    if seconds is not None:
+        triage_times.setdefault(state.get("priority"), []).append(seconds)
+
+def retrieval_note(state: dict) -> str:
+    """Lo que ahorró el agente de soporte con tickets resueltos parecidos (vacío si generó sin ayuda)."""
+    info = state.get("retrieval")
+    if not info:
+        return ""
+    entry = next((e for e in state.get("ai_metrics") or [] if e["node"] == "soporte"), None)
+    used = entry["prompt_tokens"] + entry["completion_tokens"] if entry else 0
+    action = "respuesta de" if info["mode"] == "reuse" else "ejemplos desde"
+    return f" | Soporte: {action} #{info['source']} (sim. {info['similarity']:.2f}, ~{info['baseline_tokens'] - used} tokens ahorrados)"
+
+def print_summary(processed: int, failed: int, elapsed: float, nodes: list = (), triage_times: dict = None, support_modes: list = ()):
+    throughput = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Resumen: {processed} procesados, {failed} con error en {elapsed:.1f}s -> {throughput:.2f} tickets/s")
+    if triage_times:
+        # Lo que mide el planificador por urgencia: cuánto esperan los críticos a tener triaje
+        parts = []
+        for priority in ("critical", "high", "medium", "low"):
+            samples = sorted(triage_times.get(priority, []))
+            if samples:
+                parts.append(f"{priority} p50 {samples[len(samples) // 2]:.1f}s / máx {samples[-1]:.1f}s (n={len(samples)})")
+        print("Tiempo hasta triaje: " + " | ".join(parts))
+    if nodes:
+        # Desglose por agente de esta corrida, desde ticket_ai_metrics
+        print(f"{'nodo':<14} {'ejec.':>6} {'media':>9} {'cola':>9} {'llamadas':>9} {'tokens in/out':>15} {'reint.':>7} {'coste':>10}")
+        for n in nodes:
+            print(f"{n['node']:<14} {n['runs']:>6} {n['avg_wall_ms']:>7.1f}ms {n['avg_queue_wait_ms']:>7.0f}ms {n['llm_calls']:>9} "
+                  f"{n['prompt_tokens']:>7}/{n['completion_tokens']:<7} {n['retries']:>7} {n['cost_usd']:>9.5f}$")
+    if support_modes:
+        # Respuestas de soporte con tickets resueltos parecidos frente a las generadas sin ayuda
+        modes = {m['mode']: m for m in support_modes}
+        generation = modes.get('generation')
+        parts = [f"generación {generation['runs']} ({generation['avg_wall_ms']:.0f}ms, {generation['avg_tokens']:.0f} tokens)"] if generation else []
+        for mode, label in (("reuse", "reutilizadas"), ("few_shot", "con ejemplos")):
+            m = modes.get(mode)
+            if m:
+                latency = f", {generation['avg_wall_ms'] - m['avg_wall_ms']:.0f}ms menos por ticket" if generation else ""
+                parts.append(f"{label} {m['runs']} ({m['avg_wall_ms']:.0f}ms, sim. {m['avg_similarity']:.2f}, "
+                             f"~{m['avg_saved_tokens']:.0f} tokens ahorrados por ticket{latency})")
+        print("Soporte: " + " | ".join(parts))
+    if CACHE_ENABLED:
+        stats = get_cache().stats()
+        print(f"Caché LLM: {stats['hits']} aciertos / {stats['hits'] + stats['misses']} consultas ({stats['hit_rate']:.0%}), {stats['entries']} entradas")
+
+def process_sequential(conn, queue, triage_times: dict):
+    processed = failed = skipped = 0
+    while queue:
+        ticket_data = queue.pop()
+        if not claim(ticket_data['id']):
+            skipped += 1 # Lo tiene otro proceso (o ya no está pendiente)
+            continue
         print(f"Procesando Ticket #{ticket_data['id']}: {ticket_data['title'][:40]}...")
-        
+
         try:
             start_time = time.time()
-            state = process_ticket(ticket_data)
+            while True:
+                try:
+                    state = process_ticket(ticket_data)
+                    break
+                except CircuitOpenError as e:
+                    # Proveedor caído: esperar a que el breaker admita una prueba en vez de perder el ticket
+                    print(f" -> {e}")
+                    time.sleep(e.retry_in)
+                    if not renew(ticket_data['id']):
+                        raise LeaseLostError()
             processing_time = time.time() - start_time
-            
-            # Actualizar Ticket Principal
-            cursor.execute('''
-                UPDATE tickets 
-                SET type = ?, priority = ?, ai_response = ?, status = 'in-progress', updated_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (
-                state.get("ticket_type"),
-                state.get("priority"), 
-                state.get("ai_response"), 
-                ticket_data['id']
-            ))
-            
-            # Escribir en Historial
-            action_desc = f"IA Clasifica: {state.get('ticket_type').upper()} - {state.get('priority').upper()}."
-            cursor.execute('''
-                INSERT INTO ticket_history (ticket_id, action, user_id)
-                VALUES (?, ?, ?)
-            ''', (ticket_data['id'], action_desc, system_user_id))
-            
-            conn.commit()
-            print(f" -> Éxito ({processing_time:.1f}s). Prioridad: {state.get('priority')} | Tipo: {state.get('ticket_type')}")
+
+            if save_results(conn, [(ticket_data['id'], state)]):
+                skipped += 1
+                continue
+            processed += 1
+            record_triage(triage_times, state)
+            print(f" -> Éxito ({processing_time:.1f}s). Prioridad: {state.get('priority')} | Tipo: {state.get('ticket_type')}{retrieval_note(state)}")
+        except LeaseLostError:
+            skipped += 1
+            print(f" -> El ticket #{ticket_data['id']} lo reclamó otro proceso mientras esperaba")
         except Exception as e:
+            failed += 1
             print(f" -> Error con el ticket #{ticket_data['id']}: {e}")
-        
-    conn.close()
+            try:
+                save_results(conn, [], [(ticket_data['id'], e)])
+            except Exception as again:
+                print(f"Aviso: no se pudo registrar el fallo de #{ticket_data['id']}: {again}")
+    return processed, failed, skipped
+
+async def process_concurrent(conn, queue, workers: int, batch_size: int, triage_times: dict):
+    """
+    `workers` corrutinas toman tickets de la cola por urgencia y los lanzan contra el grafo
+    compilado (ainvoke); todas las escrituras las hace una única corrutina escritora que
+    agrupa `batch_size` resultados por transacción (SQLite admite un solo escritor).
+    """
+    loop = asyncio.get_running_loop()
+    # Los nodos son síncronos: LangGraph los ejecuta en el executor por defecto del loop,
+    # que hay que dimensionar para que no limite la concurrencia pedida.
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers))
+
+    results_queue = asyncio.Queue()
+    counters = {"processed": 0, "failed": 0, "skipped": 0}
+
+    async def worker():
+        # Un solo hilo de event loop: pop() no necesita cerrojo
+        while queue:
+            ticket_data = queue.pop()
+            if not await asyncio.to_thread(claim, ticket_data['id']):
+                counters["skipped"] += 1
+                continue
+            start_time = time.time()
+            try:
+                while True:
+                    try:
+                        state = await aprocess_ticket(ticket_data)
+                        break
+                    except CircuitOpenError as e:
+                        await asyncio.sleep(e.retry_in)
+                        if not await asyncio.to_thread(renew, ticket_data['id']):
+                            raise LeaseLostError()
+                print(f" -> #{ticket_data['id']} OK ({time.time() - start_time:.1f}s). Prioridad: {state.get('priority')} | Tipo: {state.get('ticket_type')}{retrieval_note(state)}")
+                record_triage(triage_times, state)
+                await results_queue.put((ticket_data['id'], state))
+            except LeaseLostError:
+                counters["skipped"] += 1
+                print(f" -> El ticket #{ticket_data['id']} lo reclamó otro proceso mientras esperaba")
+            except Exception as e:
+                counters["failed"] += 1
+                print(f" -> Error con el ticket #{ticket_data['id']}: {e}")
+                await results_queue.put((ticket_data['id'], e))
+
+    async def writer():
+        pending = []
+        while True:
+            item = await results_queue.get()
+            if item is not None:
+                pending.append(item)
+            if pending and (item is None or len(pending) >= batch_size):
+                results = [(ticket_id, value) for ticket_id, value in pending if not isinstance(value, Exception)]
+                failures = [(ticket_id, value) for ticket_id, value in pending if isinstance(value, Exception)]
+                try:
+                    lost = await asyncio.to_thread(save_results, conn, results, failures)
+                except Exception as e:
+                    # save_results ya deshizo el lote: cada ticket cuenta como un intento fallido
+                    # y el escritor sigue con los demás resultados en vez de morir
+                    print(f" -> Error al guardar un lote de {len(pending)} tickets: {e}")
+                    counters["failed"] += len(results)
+                    results, lost = [], set()
+                    try:
+                        await asyncio.to_thread(save_results, conn, [], [(ticket_id, e) for ticket_id, _ in pending])
+                    except Exception as again:
+                        print(f"Aviso: no se pudieron registrar los fallos del lote: {again}")
+                counters["processed"] += sum(ticket_id not in lost for ticket_id, _ in results)
+                counters["skipped"] += sum(ticket_id in lost for ticket_id, _ in results)
+                pending = []
+            if item is None:
+                return
+
+    writer_task = asyncio.create_task(writer())
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    await results_queue.put(None)
+    await writer_task
+    return counters["processed"], counters["failed"], counters["skipped"]
+
+def print_dead_letter():
+    repository.init_db()
+    with repository.connection() as conn:
+        tickets = repository.dead_letter_tickets(conn)
+    if not tickets:
+        print("No hay tickets en dead-letter.")
+    for t in tickets:
+        print(f"#{t['ticket_id']} ({t['attempts']} intentos, último {t['updated_at']}): {t['title'][:40]} -> {t['last_error']}")
+
+def process_all(workers: int = 1, batch_size: int = 20, requeue_dead_letter: bool = False):
+    """
+    Procesa todos los tickets de la base de datos que tienen estado 'open'.
+    Con workers > 1 los tickets se procesan de forma concurrente, y se pueden lanzar varias
+    copias del script (en uno o varios hosts) contra la misma BD. Los que fallan continúan
+    desde su último nodo completado en la siguiente corrida; tras ITSM_AI_MAX_ATTEMPTS
+    fallos pasan a dead-letter hasta que se reencolen con `requeue_dead_letter`.
+    """
+    repository.init_db()
+    # Una sola conexión del pool para toda la corrida; en modo concurrente la usa solo el escritor
+    with repository.connection() as conn:
+        if requeue_dead_letter:
+            requeued = repository.requeue_dead_letter(conn)
+            conn.commit()
+            print(f"{requeued} tickets sacados de dead-letter.")
+        rows = repository.pending_ai_tickets(conn)
+
+        if not rows:
+            print("No hay tickets pendientes de procesar.")
+            return
+
+        if DEDUP_ENABLED:
+            # Padres: solo lo enriquecido antes de empezar, igual en modo secuencial y concurrente
+            rebuild_index()
+            get_index().freeze()
+        if retrieval.RETRIEVAL_ENABLED:
+            # Respuestas de tickets resueltos que el agente de soporte puede reutilizar o tomar de ejemplo
+            retrieval.rebuild_index()
+
+        print(f"Iniciando el procesamiento de {len(rows)} tickets ficticios con la IA LangGraph ({workers} workers)...")
+
+        since = conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+        start_time = time.time()
+        # Todos los tickets quedan en cola desde ya: la espera del primer nodo lo refleja.
+        # Se atienden por urgencia estimada (src/core/scheduler.py), no en el orden del SELECT.
+        queue = urgency_order(({**dict(row), "queued_at": start_time} for row in rows), repository.user_areas(conn))
+        triage_times = {}
+        if workers > 1:
+            processed, failed, skipped = asyncio.run(process_concurrent(conn, queue, workers, batch_size, triage_times))
+        else:
+            processed, failed, skipped = process_sequential(conn, queue, triage_times)
+        elapsed = time.time() - start_time
+        nodes = metrics.summarize(conn, since)
+        support_modes = retrieval.summarize(conn, since) if retrieval.RETRIEVAL_ENABLED else []
+        dead_letter = len(repository.dead_letter_tickets(conn))
+
+    print_summary(processed, failed, elapsed, nodes, triage_times, support_modes)
+    if skipped:
+        print(f"{skipped} tickets los tomó otro proceso o ya no estaban pendientes.")
+    if dead_letter:
+        print(f"{dead_letter} tickets en dead-letter: no se reintentan (ver --dead-letter / --requeue-dead-letter)")
     print("¡Procesamiento masivo completado! El dashboard de Streamlit ahora leerá SQL nativo.")
 
 if __name__ == '__main__':
-    process_all()
+    parser = argparse.ArgumentParser(description="Enriquece con IA los tickets abiertos pendientes.")
+    parser.add_argument("--workers", type=int, default=1, help="Tickets procesados en paralelo (1 = secuencial)")
+    parser.add_argument("--batch-size", type=int, default=20, help="Resultados agrupados por transacción en modo concurrente")
+    parser.add_argument("--dead-letter", action="store_true", help="Lista los tickets en dead-letter y termina")
+    parser.add_argument("--requeue-dead-letter", action="store_true", help="Vuelve a intentar los tickets en dead-letter")
+    args = parser.parse_args()
+    if args.dead_letter:
+        print_dead_letter()
+    else:
+        process_all(workers=max(1, args.workers), batch_size=max(1, args.batch_size), requeue_dead_letter=args.requeue_dead_letter)
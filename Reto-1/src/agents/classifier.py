@@ -3,6 +3,9 @@ from typing import Literal
 from langchain_core.prompts import ChatPromptTemplate
 from src.core.state import TicketState
 from src.core.llm import get_llm
+from src.core.registry import register_chain, get_chain
+from src.core import governor
+from src.core.rules import confident_type
 
 class ClassificationOutput(BaseModel):
     ticket_type: Literal["incident", "request", "problem"] = Field(
@@ -14,9 +17,9 @@ class ClassificationOutput(BaseModel):
         )
     )
 
-def classifier_node(state: TicketState) -> dict:
+def build_classifier_chain():
     """
-    Analiza el texto del ticket y determina su tipo exacto para la base de datos SQL.
+    Construye la cadena prompt | llm estructurado del clasificador (se cachea en el registro).
     """
     prompt = ChatPromptTemplate.from_messages([
         ("system", 
@@ -28,9 +31,24 @@ def classifier_node(state: TicketState) -> dict:
     ])
     
     llm = get_llm(temperature=0).with_structured_output(ClassificationOutput)
-    chain = prompt | llm
+    return prompt | llm
+
+register_chain("clasificador", build_classifier_chain)
+
+def classifier_node(state: TicketState) -> dict:
+    """
+    Analiza el texto del ticket y determina su tipo exacto para la base de datos SQL.
+    """
+    # Cascada: si el pre-clasificador local es concluyente no hace falta llamar al LLM
+    rule_label = confident_type(state)
+    if rule_label:
+        return {
+            "ticket_type": rule_label
+        }
+    
+    chain = get_chain("clasificador")
     
-    result: ClassificationOutput = chain.invoke({
+    result: ClassificationOutput = governor.invoke(chain, {
         "title": state.get("title", ""),
         "description": state["description"]
     })
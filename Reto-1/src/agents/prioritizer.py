@@ -3,15 +3,18 @@ from typing import Literal
 from langchain_core.prompts import ChatPromptTemplate
 from src.core.state import TicketState
 from src.core.llm import get_llm
+from src.core.registry import register_chain, get_chain
+from src.core import governor
+from src.core.rules import confident_priority
 
 class PrioritizationOutput(BaseModel):
     priority: Literal["low", "medium", "high", "critical"] = Field(
         description="Prioridad del caso basada en impacto y urgencia (EN INGLÉS ESTRICTO: low, medium, high, critical)."
     )
 
-def prioritizer_node(state: TicketState) -> dict:
+def build_prioritizer_chain():
     """
-    Evalúa impacto, urgencia y contexto para asignar prioridad en inglés.
+    Construye la cadena prompt | llm estructurado del priorizador (se cachea en el registro).
     """
     prompt = ChatPromptTemplate.from_messages([
         ("system", 
@@ -28,9 +31,24 @@ def prioritizer_node(state: TicketState) -> dict:
     ])
     
     llm = get_llm(temperature=0).with_structured_output(PrioritizationOutput)
-    chain = prompt | llm
+    return prompt | llm
+
+register_chain("priorizador", build_prioritizer_chain)
+
+def prioritizer_node(state: TicketState) -> dict:
+    """
+    Evalúa impacto, urgencia y contexto para asignar prioridad en inglés.
+    """
+    # Cascada: si el pre-clasificador local es concluyente no hace falta llamar al LLM
+    rule_label = confident_priority(state)
+    if rule_label:
+        return {
+            "priority": rule_label
+        }
+    
+    chain = get_chain("priorizador")
     
-    result: PrioritizationOutput = chain.invoke({
+    result: PrioritizationOutput = governor.invoke(chain, {
         "title": state.get("title", ""),
         "description": state["description"],
         "ticket_type": state.get("ticket_type", "N/A")
@@ -2,41 +2,82 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from src.core.state import TicketState
 from src.core.llm import get_llm
+from src.core.registry import register_chain, get_chain
+from src.core import governor, retrieval
 
-def support_node(state: TicketState) -> dict:
+SYSTEM_PROMPT = (
+    "Eres la Inteligencia Artificial del sistema ITSM. "
+    "Tu trabajo es leer la clasificación y prioridad de un ticket y generar un 'AI Response' amigable y MUY BIEN estructurado.\n"
+    "Instrucciones:\n"
+    "- Justifica brevemente por qué se dio esa prioridad/tipo basado en el reporte.\n"
+    "- Sugiere de 1 a 3 pasos técnicos concretos de resolución. ES OBLIGATORIO usar formato Markdown con dobles saltos de línea reales entre párrafos y listas numeradas o viñetas para no amontonar el texto.\n"
+    "- Si es prioridad 'critical' o 'high', menciónalo explícitamente y usa emojis de alerta 🚨/🔴.\n"
+    "- Sé directo, empático y profesional."
+)
+TICKET_PROMPT = (
+    "**Título:** {title}\n"
+    "**Ticket crudo:** {description}\n"
+    "**Tipo:** {ticket_type}\n"
+    "**Prioridad asignada:** {priority}\n\n"
+    "Redacta tu respuesta en Markdown bien espaciado:"
+)
+
+SUPPORT_PROMPT = ChatPromptTemplate.from_messages([("system", SYSTEM_PROMPT), ("human", TICKET_PROMPT)])
+
+# Con casos resueltos parecidos (src/core/retrieval.py): adaptar en vez de redactar desde cero
+SUPPORT_EXAMPLES_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     SYSTEM_PROMPT + "\n"
+     "- Tienes respuestas ya validadas de tickets resueltos parecidos: si la solución aplica, adáptala "
+     "en lugar de redactar desde cero y sé breve (máximo unas 120 palabras)."
+    ),
+    ("human", "**Casos resueltos parecidos:**\n\n{examples}\n\n---\n\n" + TICKET_PROMPT)
+])
+
+def build_support_chain():
     """
-    Genera respuestas sugeridas para los usuarios finales o instrucciones para el técnico.
+    Construye la cadena prompt | llm | parser del agente de soporte (se cachea en el registro).
     """
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", 
-         "Eres la Inteligencia Artificial del sistema ITSM. "
-         "Tu trabajo es leer la clasificación y prioridad de un ticket y generar un 'AI Response' amigable y MUY BIEN estructurado.\n"
-         "Instrucciones:\n"
-         "- Justifica brevemente por qué se dio esa prioridad/tipo basado en el reporte.\n"
-         "- Sugiere de 1 a 3 pasos técnicos concretos de resolución. ES OBLIGATORIO usar formato Markdown con dobles saltos de línea reales entre párrafos y listas numeradas o viñetas para no amontonar el texto.\n"
-         "- Si es prioridad 'critical' o 'high', menciónalo explícitamente y usa emojis de alerta 🚨/🔴.\n"
-         "- Sé directo, empático y profesional."
-        ),
-        ("human", 
-         "**Título:** {title}\n"
-         "**Ticket crudo:** {description}\n"
-         "**Tipo:** {ticket_type}\n"
-         "**Prioridad asignada:** {priority}\n\n"
-         "Redacta tu respuesta en Markdown bien espaciado:"
-        )
-    ])
-    
     # En lugar de with_structured_output generamos texto crudo (Markdown) directamente
     llm = get_llm(temperature=0.3)
-    chain = prompt | llm | StrOutputParser()
-    
-    result = chain.invoke({
+    return SUPPORT_PROMPT | llm | StrOutputParser()
+
+def build_support_examples_chain():
+    """Variante con ejemplos de tickets resueltos parecidos en el prompt."""
+    llm = get_llm(temperature=0.3)
+    return SUPPORT_EXAMPLES_PROMPT | llm | StrOutputParser()
+
+register_chain("soporte", build_support_chain)
+register_chain("soporte_ejemplos", build_support_examples_chain)
+
+def support_node(state: TicketState) -> dict:
+    """
+    Genera respuestas sugeridas para los usuarios finales o instrucciones para el técnico.
+    Con la recuperación activa, si hay tickets resueltos parecidos los usa como ejemplos para
+    una respuesta más corta; si además se permite reutilizar y uno es casi idéntico con la
+    misma clasificación, devuelve su respuesta.
+    """
+    inputs = {
         "title": state.get("title", ""),
         "description": state["description"],
         "ticket_type": state.get("ticket_type", "N/A"),
         "priority": state.get("priority", "N/A")
-    })
+    }
+    examples = []
+    if retrieval.RETRIEVAL_ENABLED:
+        examples = retrieval.similar_resolved(state.get("ticket_id"), inputs["title"], inputs["description"])
+    if not examples:
+        return {"ai_response": governor.invoke(get_chain("soporte"), inputs), "retrieval": None}
     
-    return {
-        "ai_response": result
+    best = examples[0]
+    info = {
+        "source": best["id"],
+        "similarity": best["similarity"],
+        "baseline_tokens": retrieval.baseline_tokens(SUPPORT_PROMPT.format(**inputs), examples),
     }
+    if (retrieval.REUSE_ENABLED and best["similarity"] >= retrieval.REUSE_THRESHOLD
+            and (best["type"], best["priority"]) == (inputs["ticket_type"], inputs["priority"])):
+        return {"ai_response": best["ai_response"], "retrieval": {**info, "mode": "reuse"}}
+    
+    result = governor.invoke(get_chain("soporte_ejemplos"), {**inputs, "examples": retrieval.format_examples(examples)})
+    return {"ai_response": result, "retrieval": {**info, "mode": "few_shot"}}
@@ -0,0 +1,62 @@
+from langchain_core.prompts import ChatPromptTemplate
+from src.core.state import TicketState
+from src.core.llm import get_llm
+from src.core.registry import register_chain, get_chain
+from src.core import governor
+from src.core.rules import confident_type, confident_priority
+from src.agents.classifier import ClassificationOutput
+from src.agents.prioritizer import PrioritizationOutput
+
+class TriageOutput(ClassificationOutput, PrioritizationOutput):
+    """
+    Salida fusionada: tipo ITSM y prioridad en una sola respuesta estructurada.
+    """
+
+def build_triage_chain():
+    """
+    Construye la cadena prompt | llm estructurado del triaje fusionado (se cachea en el registro).
+    """
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", 
+         "Eres un analista experto de ServiceNow de nivel 1 y coordinador de Service Desk. "
+         "Tu objetivo es tipificar los reportes de los usuarios (incluso si están incompletos) "
+         "y evaluar su prioridad según su urgencia (el tiempo es crítico) y su impacto "
+         "(cuántas personas o qué procesos clave afecta). "
+         "El tipo debe ser UNICAMENTE ('incident', 'request', 'problem') y la prioridad "
+         "UNICAMENTE ('low', 'medium', 'high', 'critical')."
+        ),
+        ("human", 
+         "**Título:** {title}\n"
+         "**Descripción:** {description}\n\n"
+         "Determina el tipo y la prioridad oficial."
+        )
+    ])
+    
+    llm = get_llm(temperature=0).with_structured_output(TriageOutput)
+    return prompt | llm
+
+register_chain("triaje", build_triage_chain)
+
+def triage_node(state: TicketState) -> dict:
+    """
+    Sustituye a clasificador + priorizador con una única llamada estructurada al LLM.
+    """
+    # Cascada: solo si las reglas locales resuelven ambos campos nos ahorramos la llamada
+    rule_type, rule_priority = confident_type(state), confident_priority(state)
+    if rule_type and rule_priority:
+        return {
+            "ticket_type": rule_type,
+            "priority": rule_priority
+        }
+    
+    chain = get_chain("triaje")
+    
+    result: TriageOutput = governor.invoke(chain, {
+        "title": state.get("title", ""),
+        "description": state["description"]
+    })
+    
+    return {
+        "ticket_type": result.ticket_type,
+        "priority": result.priority
+    }
@@ -1,14 +1,50 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import sqlite3
+import asyncio
+import base64
+import hashlib
+import json
 import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-from src.core.orchestrator import process_ticket
+from src.core.orchestrator import build_initial_state, run_config
+from src.core import registry, jobs, repository, stats, events, metrics, checkpoints, search
+from src.core.enrichment import save_ai_results
+from src.core.cache import get_cache
+from src.core.dedup import DEDUP_ENABLED, get_index, rebuild_index
+from src.core import retrieval
 
-app = FastAPI(title="ITSM GenIA API")
+job_workers = jobs.JobWorkerPool()
+event_hub = events.EventHub()
+EVENTS_HEARTBEAT = 15.0
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Llevar data/tickets.db a la última versión del esquema (índices incluidos)
+    repository.init_db()
+    # Compilar el grafo y abrir los clientes LLM antes de atender la primera petición
+    registry.warmup()
+    if DEDUP_ENABLED:
+        # Índice de duplicados desde SQLite, sin bloquear el arranque
+        rebuild_index(background=True)
+    if retrieval.RETRIEVAL_ENABLED:
+        # Tickets resueltos para el agente de soporte (respuestas reutilizables / ejemplos)
+        retrieval.rebuild_index(background=True)
+    # Workers que vacían la cola de enriquecimiento IA (retoman jobs interrumpidos)
+    job_workers.start()
+    # Feed en vivo de cambios de tickets (GET /api/events)
+    await event_hub.start()
+    yield
+    await event_hub.stop()
+    job_workers.stop()
+    repository.close_pool()
+
+app = FastAPI(title="ITSM GenIA API", lifespan=lifespan)
 
 # Habilitar CORS para que React (localhost:5173) pueda conectarse a FastAPI (localhost:8000)
 app.add_middleware(
@@ -17,13 +53,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "ETag", "X-Sync-Token"], # Paginación y sincronización de GET /api/tickets
 )
 
-def get_db():
-    conn = sqlite3.connect('data/tickets.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
 # ==== SCHEMAS ====
 class TicketCreate(BaseModel):
     user_id: int
@@ -38,97 +70,186 @@ class TicketUpdate(BaseModel):
 
 @app.get("/api/users")
 def get_users():
-    conn = get_db()
-    users = conn.execute("SELECT id, name, email, puesto, area, role FROM users").fetchall()
-    conn.close()
-    return [dict(u) for u in users]
+    with repository.connection() as conn:
+        return repository.list_users(conn)
 
 @app.get("/api/users/staff")
 def get_staff():
-    conn = get_db()
-    staff = conn.execute("SELECT id, name, email, puesto, area, role FROM users WHERE role IN ('staff', 'admin')").fetchall()
-    conn.close()
-    return [dict(s) for s in staff]
+    with repository.connection() as conn:
+        return repository.list_users(conn, roles=('staff', 'admin'))
+
+# Campos de GET /api/tickets -> expresión json_object de SQLite. El JSON se arma en la propia
+# consulta: Python solo concatena filas ya serializadas, sin dicts intermedios ni encoder.
+TICKET_LIST_FIELDS = {
+    "id": "t.id",
+    "title": "t.title",
+    "description": "t.description",
+    "type": "t.type",
+    "priority": "t.priority",
+    "status": "t.status",
+    "aiResponse": "t.ai_response",
+    "createdAt": "t.created_at",
+    "updatedAt": "t.updated_at",
+    "user": "json_object('name', u.name, 'email', u.email, 'area', u.area, 'puesto', u.puesto)",
+    "assignedTo": "CASE WHEN a.name IS NULL THEN NULL ELSE json_object('name', a.name, 'email', a.email, 'puesto', a.puesto) END",
+    "history": "json_array()", # El historial lo traemos solo si piden ticket por ID por performance
+}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(created_at: str, ticket_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, ticket_id]).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return created_at, ticket_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def split_values(value: str) -> list:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+def list_etag(token: tuple, query: str) -> str:
+    """
+    ETag de un listado: huella de la tabla (repository.change_token) más los parámetros de la
+    consulta. Mientras ningún ticket cambie, el mismo listado produce el mismo ETag.
+    """
+    digest = hashlib.sha1(f"{token}|{query}".encode()).hexdigest()
+    return f'W/"{digest}"'
 
 @app.get("/api/tickets")
-def get_tickets():
-    conn = get_db()
-    # Query que emula la vista completa con nombre del usuario y asignado
-    query = """
-    SELECT 
-        t.id, t.title, t.description, t.type, t.priority, t.status, 
-        t.ai_response, t.created_at as createdAt, t.updated_at as updatedAt,
-        u.name as user_name, u.email as user_email, u.area as user_area, u.puesto as user_puesto,
-        a.name as assigned_name, a.email as assigned_email, a.puesto as assigned_puesto
-    FROM tickets t
-    JOIN users u ON t.user_id = u.id
-    LEFT JOIN users a ON t.assigned_to_id = a.id
-    ORDER BY t.created_at DESC
-    """
-    tickets_rows = conn.execute(query).fetchall()
+def get_tickets(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    status: str = None,
+    priority: str = None,
+    type: str = None,
+    assignee: str = None,
+    fields: str = None,
+    updated_since: str = None,
+):
+    """
+    Lista de tickets paginada por cursor (keyset sobre created_at DESC, id DESC).
+    - status / priority / type: uno o varios valores separados por coma.
+    - assignee: id del técnico asignado, o `none` para los no asignados.
+    - fields: proyección (p. ej. `id,title,status,priority`) para no traer los textos largos.
+    - updated_since: modo delta. Solo los tickets con updated_at >= ese instante (en orden de
+      updated_at) y los IDs borrados desde entonces: `{"tickets": [...], "deleted": [...],
+      "sync": ...}`. El cliente fusiona por id y en la próxima llamada envía `sync`.
+      Con filtros, solo llegan los tickets que hoy cumplen el filtro.
+    El cursor de la página siguiente llega en la cabecera `X-Next-Cursor` (y en `Link`).
+    Responde con `ETag` y `X-Sync-Token`; con `If-None-Match` vigente retorna 304 sin cuerpo.
+    """
+    selected = split_values(fields) if fields else list(TICKET_LIST_FIELDS)
+    unknown = [f for f in selected if f not in TICKET_LIST_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(unknown)}")
+    
+    where, params = [], []
+    for column, value in (("t.status", status), ("t.priority", priority), ("t.type", type)):
+        if value:
+            values = split_values(value)
+            where.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += values
+    if assignee:
+        if assignee == "none":
+            where.append("t.assigned_to_id IS NULL")
+        elif assignee.isdigit():
+            where.append("t.assigned_to_id = ?")
+            params.append(int(assignee))
+        else:
+            raise HTTPException(status_code=400, detail="assignee debe ser un id numérico o 'none'")
+    if updated_since:
+        # >=: updated_at tiene resolución de segundos; repetir alguna fila es inocuo al fusionar por id
+        where.append("t.updated_at >= ?")
+        params.append(updated_since)
+        keyset, order = ("t.updated_at", "t.id"), "t.updated_at ASC, t.id ASC"
+    else:
+        keyset, order = ("t.created_at", "t.id"), "t.created_at DESC, t.id DESC"
+    if cursor:
+        where.append(f"({keyset[0]}, {keyset[1]}) {'>' if updated_since else '<'} (?, ?)")
+        params += decode_cursor(cursor)
+    
+    # Solo unimos users cuando se piden los datos del solicitante / asignado
+    joins = ""
+    if "user" in selected:
+        joins += " JOIN users u ON t.user_id = u.id"
+    if "assignedTo" in selected:
+        joins += " LEFT JOIN users a ON t.assigned_to_id = a.id"
+    
+    json_fields = ", ".join(f"'{name}', {TICKET_LIST_FIELDS[name]}" for name in selected)
+    query = f"""
+    SELECT json_object({json_fields}) AS ticket, {keyset[0]} AS sort_key, t.id
+    FROM tickets t{joins}
+    {"WHERE " + " AND ".join(where) if where else ""}
+    ORDER BY {order}
+    LIMIT ?
+    """
     
-    # Formatear al JSON que espera el frontend
-    tickets = []
-    for row in tickets_rows:
-        t = dict(row)
-        formatted_ticket = {
-            "id": t['id'],
-            "title": t['title'],
-            "description": t['description'],
-            "type": t['type'],
-            "priority": t['priority'],
-            "status": t['status'],
-            "aiResponse": t['ai_response'],
-            "createdAt": t['createdAt'],
-            "updatedAt": t['updatedAt'],
-            "user": {
-                "name": t['user_name'],
-                "email": t['user_email'],
-                "area": t['user_area'],
-                "puesto": t['user_puesto']
-            },
-            "assignedTo": None if not t['assigned_name'] else {
-                "name": t['assigned_name'],
-                "email": t['assigned_email'],
-                "puesto": t['assigned_puesto']
-            },
-            "history": [] # El historial lo traemos solo si piden ticket por ID por performance
-        }
-        tickets.append(formatted_ticket)
+    with repository.connection() as conn:
+        with metrics.db_timer("change_token"):
+            token = repository.change_token(conn)
+        etag = list_etag(token, str(request.url.query))
+        headers = {"ETag": etag, "X-Sync-Token": token[0] or "", "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        with metrics.db_timer("list_tickets_delta" if updated_since else "list_tickets"):
+            rows = conn.execute(query, params + [limit]).fetchall()
+            deleted = repository.deleted_since(conn, updated_since) if updated_since and not cursor else []
     
-    conn.close()
-    return tickets
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1]['sort_key'], rows[-1]['id'])
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{next_url.path}?{next_url.query}>; rel="next"'
+    
+    tickets = "[" + ",".join(row['ticket'] for row in rows) + "]"
+    if updated_since:
+        body = f'{{"tickets": {tickets}, "deleted": {json.dumps(deleted)}, "sync": {json.dumps(token[0] or updated_since)}}}'
+    else:
+        body = tickets
+    return Response(content=body, media_type="application/json", headers=headers)
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+MAX_SEARCH_OFFSET = 1000
+
+# Antes de /api/tickets/{ticket_id}: si no, "search" se tomaría por un ID de ticket
+@app.get("/api/tickets/search")
+def search_tickets(
+    q: str = Query(..., min_length=1),
+    status: str = None,
+    priority: str = None,
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+):
+    """
+    Búsqueda de texto completo en título, descripción y respuesta de la IA (índice FTS5).
+    - q: palabras a buscar (todas deben aparecer; la última vale como prefijo).
+    - status / priority: uno o varios valores separados por coma.
+    Resultados por relevancia con `highlights` (HTML escapado, coincidencias en <mark>).
+    Paginación por `offset`; `nextOffset` es null en la última página.
+    """
+    if not search.fts_query(q):
+        raise HTTPException(status_code=400, detail="La búsqueda no contiene palabras")
+    statuses = split_values(status) if status else None
+    priorities = split_values(priority) if priority else None
+    with repository.connection() as conn, metrics.db_timer("search"):
+        # Una fila de más para saber si hay página siguiente
+        results = search.search(conn, q, statuses, priorities, limit + 1, offset)
+    next_offset = offset + limit if len(results) > limit else None
+    return {"query": q, "results": results[:limit], "nextOffset": next_offset}
 
 @app.get("/api/tickets/{ticket_id}")
 def get_ticket(ticket_id: str):
-    conn = get_db()
-    query = """
-    SELECT 
-        t.id, t.title, t.description, t.type, t.priority, t.status, 
-        t.ai_response, t.created_at as createdAt, t.updated_at as updatedAt,
-        u.name as user_name, u.email as user_email, u.area as user_area, u.puesto as user_puesto,
-        a.name as assigned_name, a.email as assigned_email, a.puesto as assigned_puesto
-    FROM tickets t
-    JOIN users u ON t.user_id = u.id
-    LEFT JOIN users a ON t.assigned_to_id = a.id
-    WHERE t.id = ?
-    """
-    t_row = conn.execute(query, (ticket_id,)).fetchone()
-    
-    if not t_row:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Ticket not found")
-        
-    t = dict(t_row)
-    
-    # Obtener historial
-    hist_rows = conn.execute("""
-        SELECT h.timestamp, h.action, u.name as user 
-        FROM ticket_history h 
-        JOIN users u ON h.user_id = u.id 
-        WHERE h.ticket_id = ? 
-        ORDER BY h.timestamp ASC
-    """, (ticket_id,)).fetchall()
+    with repository.connection() as conn, metrics.db_timer("ticket_detail"):
+        t = repository.get_ticket(conn, ticket_id)
+        if not t:
+            raise HTTPException(status_code=404, detail="Ticket not found")
+        # Obtener historial
+        history = repository.get_history(conn, ticket_id)
     
     formatted_ticket = {
         "id": t['id'],
@@ -151,90 +272,204 @@ def get_ticket(ticket_id: str):
             "email": t['assigned_email'],
             "puesto": t['assigned_puesto']
         },
-        "history": [{"timestamp": h['timestamp'], "action": h['action'], "user": h['user']} for h in hist_rows]
+        "history": history
     }
     
-    conn.close()
     return formatted_ticket
 
-@app.post("/api/tickets")
-def create_ticket(ticket: TicketCreate):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # 1. Generar nuevo ID
-    cursor.execute("SELECT COUNT(*) as count FROM tickets")
-    count = cursor.fetchone()['count'] + 1
-    new_id = f"INC-{str(count).zfill(6)}"
+def insert_new_ticket(ticket: TicketCreate, enqueue: bool = False):
+    """
+    Inserta el ticket base (aún sin IA) y su primer registro de historial.
+    Con `enqueue` crea además, en la misma transacción, el job de enriquecimiento IA.
+    Retorna (nuevo_id, job_id).
+    """
+    with repository.transaction() as conn:
+        new_id = repository.insert_ticket(conn, ticket.user_id, ticket.title, ticket.description)
+        # Encolar IA (la procesan los workers en segundo plano)
+        job_id = jobs.enqueue(conn, new_id) if enqueue else None
     
-    # 2. Insertar Base
-    cursor.execute(
-        "INSERT INTO tickets (id, user_id, title, description, type, priority, status) VALUES (?, ?, ?, ?, 'incident', 'low', 'open')",
-        (new_id, ticket.user_id, ticket.title, ticket.description)
-    )
-    cursor.execute(
-        "INSERT INTO ticket_history (ticket_id, action, user_id) VALUES (?, 'Ticket reportado vía Portal', ?)",
-        (new_id, ticket.user_id)
-    )
-    conn.commit()
+    if DEDUP_ENABLED:
+        get_index().add(new_id, ticket.title, ticket.description)
+    event_hub.notify()
+    return new_id, job_id
+
+def save_ai_result(ticket_id: str, state: dict):
+    """
+    Persiste el resultado del grafo de IA sobre el ticket y deja constancia en el historial.
+    """
+    with repository.transaction() as conn:
+        save_ai_results(conn, [(ticket_id, state)])
+    checkpoints.clear([ticket_id])
+    event_hub.notify()
+
+def save_ai_failure(ticket_id: str, error: Exception):
+    """Cuenta el fallo para el dead-letter; process_all retomará el ticket desde su checkpoint."""
+    with repository.transaction() as conn:
+        repository.record_ai_failure(conn, ticket_id, str(error))
+
+@app.post("/api/tickets", status_code=202)
+def create_ticket(ticket: TicketCreate, response: Response):
+    """
+    Registra el ticket y responde de inmediato (202). La clasificación, prioridad y respuesta
+    de IA se completan en segundo plano: consultar GET /api/jobs/{job_id} o el propio ticket.
+    """
+    new_id, job_id = insert_new_ticket(ticket, enqueue=True)
+    job_workers.notify()
     
-    # 3. Procesar IA (LangGraph)
+    response.headers["Location"] = f"/api/jobs/{job_id}"
+    # Retornar el ticket recién creado (aún sin IA) junto con su job
+    created = get_ticket(new_id)
+    created["job"] = {"id": job_id, "status": "queued", "url": f"/api/jobs/{job_id}"}
+    return created
+
+@app.get("/api/stats")
+def get_stats():
+    """
+    Totales por estado / prioridad / tipo, por área y carga del staff. Se leen de los
+    contadores que mantienen los triggers: tiempo constante sin importar cuántos tickets haya.
+    """
+    with repository.connection() as conn, metrics.db_timer("stats"):
+        return stats.get_stats(conn)
+
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    """
+    Aciertos, fallos, tasa de acierto y tamaño de la caché de resultados del LLM (por proceso).
+    """
+    return get_cache().stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Métricas del proceso en formato Prometheus: tiempo, espera en cola, tokens, llamadas,
+    reintentos, aciertos de caché y coste de cada nodo del pipeline de IA (los que ejecutan
+    los workers y el streaming de esta API) y la duración de las consultas de los endpoints
+    calientes. El histórico completo por ticket queda en la tabla ticket_ai_metrics.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: int):
+    with repository.connection() as conn:
+        job = jobs.get_job(conn, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/tickets/stream")
+async def create_ticket_stream(ticket: TicketCreate):
+    """
+    Igual que POST /api/tickets pero responde con Server-Sent Events:
+    - `ticket`: ID asignado, en cuanto se inserta el ticket base.
+    - `classification`: tipo y/o prioridad en cuanto los produce cada agente de triaje.
+    - `token`: fragmentos de la respuesta del agente de soporte según los genera el LLM.
+    - `done`: el ticket completo, ya persistido con la respuesta final (o `error`).
+    """
+    new_id, _ = await run_in_threadpool(insert_new_ticket, ticket)
     ticket_data = {"id": new_id, "user_id": ticket.user_id, "title": ticket.title, "description": ticket.description}
-    try:
-        state = process_ticket(ticket_data)
-        
-        # 4. Actualizar estado
-        cursor.execute('''
-            UPDATE tickets 
-            SET type = ?, priority = ?, ai_response = ?, status = 'in-progress', updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (
-            state.get("ticket_type"),
-            state.get("priority"), 
-            state.get("ai_response"), 
-            new_id
-        ))
-        
-        # 5. Historial de IA
-        action_desc = f"IA Clasifica Automáticamente: {str(state.get('ticket_type')).upper()} - {str(state.get('priority')).upper()}."
-        cursor.execute("INSERT INTO ticket_history (ticket_id, action, user_id) VALUES (?, ?, ?)", (new_id, action_desc, 1)) # 1 = Sistema IA
-        conn.commit()
-        
-    except Exception as e:
-        conn.close()
-        raise HTTPException(status_code=500, detail=f"Error procesando IA: {str(e)}")
+    
+    async def event_stream():
+        yield sse_event("ticket", {"id": new_id})
         
-    conn.close()
+        state = build_initial_state(ticket_data)
+        streamed_tokens = False
+        try:
+            async for mode, chunk in registry.get_graph().astream(state, run_config(new_id), stream_mode=["updates", "messages"]):
+                if mode == "updates":
+                    for values in chunk.values():
+                        # ai_metrics se acumula nodo a nodo (en el grafo lo hace su reductor)
+                        collected = state.get("ai_metrics", []) + (values or {}).get("ai_metrics", [])
+                        state.update(values or {})
+                        state["ai_metrics"] = collected
+                        triage = {k: values[k] for k in ("ticket_type", "priority") if values and k in values}
+                        if triage:
+                            yield sse_event("classification", triage)
+                        # Acierto de caché: la respuesta llega completa, sin tokens del LLM
+                        if values and values.get("ai_response") and not streamed_tokens:
+                            yield sse_event("token", {"text": values["ai_response"]})
+                else:
+                    # Solo los tokens del agente de soporte: los de triaje son llamadas estructuradas
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") == "soporte" and message.content:
+                        streamed_tokens = True
+                        yield sse_event("token", {"text": message.content})
+            
+            await run_in_threadpool(save_ai_result, new_id, state)
+            yield sse_event("done", await run_in_threadpool(get_ticket, new_id))
+        except Exception as e:
+            await run_in_threadpool(save_ai_failure, new_id, e)
+            yield sse_event("error", {"id": new_id, "detail": f"Error procesando IA: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/events")
+async def ticket_events(request: Request):
+    """
+    Feed en vivo (Server-Sent Events) de los cambios de tickets: `created`, `enriched`,
+    `assigned`, `status`, `updated`, `deleted`. Cada evento trae el ticket resumido (sin
+    descripción ni respuesta de IA). Al reconectar, el navegador envía `Last-Event-ID` y se
+    reenvía lo perdido. Un evento `resync` indica que el cliente debe recargar su listado
+    (GET /api/tickets?updated_since=...).
+    """
+    subscription = event_hub.subscribe()
+    last_event_id = request.headers.get("last-event-id")
+    up_to = event_hub.last_id
     
-    # Retornar el ticket recién creado llamando al endpoint by_id
-    return get_ticket(new_id)
+    async def event_stream():
+        sent = up_to
+        try:
+            if last_event_id and last_event_id.isdigit() and int(last_event_id) < up_to:
+                for event in await run_in_threadpool(events.replay, int(last_event_id), up_to):
+                    yield events.format_sse(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["id"] <= sent and event["kind"] != "resync":
+                    continue # Ya enviado en el replay
+                sent = event["id"]
+                yield events.format_sse(event)
+        finally:
+            event_hub.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.put("/api/tickets/{ticket_id}")
 def update_ticket(ticket_id: str, updates: TicketUpdate):
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Check exists
-    t = cursor.execute("SELECT id FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
-    if not t:
-        raise HTTPException(status_code=404, detail="Ticket no encontrado")
+    with metrics.db_timer("update_ticket"), repository.transaction() as conn:
+        # Check exists
+        if not repository.ticket_exists(conn, ticket_id):
+            raise HTTPException(status_code=404, detail="Ticket no encontrado")
+            
+        admin_id = 1 # Emulamos la acción hecha por admin
         
-    admin_id = 1 # Emulamos la acción hecha por admin
-    
-    if updates.status:
-        cursor.execute("UPDATE tickets SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (updates.status, ticket_id))
-        cursor.execute("INSERT INTO ticket_history (ticket_id, action, user_id) VALUES (?, ?, ?)", 
-                      (ticket_id, f"Estado cambiado a {updates.status}", admin_id))
-                      
-    if updates.assigned_to_id:
-        cursor.execute("UPDATE tickets SET assigned_to_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (updates.assigned_to_id, ticket_id))
-        # Asumimos que el trigger de BD cambiará su status a in-progress también o ya se maneja manual
-        user = cursor.execute("SELECT name FROM users WHERE id = ?", (updates.assigned_to_id,)).fetchone()
-        name = user['name'] if user else 'Personal'
-        cursor.execute("INSERT INTO ticket_history (ticket_id, action, user_id) VALUES (?, ?, ?)", 
-                      (ticket_id, f"Asignado a {name}", admin_id))
-                      
-    conn.commit()
-    conn.close()
+        if updates.status:
+            repository.update_status(conn, ticket_id, updates.status)
+            repository.add_history(conn, ticket_id, f"Estado cambiado a {updates.status}", admin_id)
+            if retrieval.RETRIEVAL_ENABLED and updates.status in retrieval.RESOLVED_STATUSES:
+                # Su respuesta de IA queda validada: sirve de referencia para tickets parecidos
+                retrieval.mark_resolved(conn, ticket_id)
+                          
+        if updates.assigned_to_id:
+            repository.update_assignee(conn, ticket_id, updates.assigned_to_id)
+            # Asumimos que el trigger de BD cambiará su status a in-progress también o ya se maneja manual
+            name = repository.get_user_name(conn, updates.assigned_to_id) or 'Personal'
+            repository.add_history(conn, ticket_id, f"Asignado a {name}", admin_id)
     
+    event_hub.notify()
     return get_ticket(ticket_id)
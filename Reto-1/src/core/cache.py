@@ -0,0 +1,195 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from src.core.llm import DEFAULT_MODEL
+from src.core.repository import BASE_DIR
+from src.core.rules import cache_tag as rules_cache_tag
+
+# Incrementar cuando cambien los prompts o los esquemas de salida de los agentes:
+# forma parte de la clave, así las respuestas antiguas dejan de coincidir solas.
+PROMPT_VERSION = "1"
+
+CACHE_ENABLED = os.getenv("ITSM_LLM_CACHE", "1") == "1"
+CACHE_DB_PATH = os.getenv("ITSM_LLM_CACHE_DB", os.path.join(BASE_DIR, "data", "llm_cache.db"))
+MAX_ENTRIES = int(os.getenv("ITSM_LLM_CACHE_MAX_ENTRIES", "10000"))
+TTL_SECONDS = int(os.getenv("ITSM_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# Cada N escrituras se vuelve a contar la tabla (otros procesos también escriben) y se podan
+# las caducadas; entre medias basta con la cuenta que lleva el proceso
+EVICT_EVERY = 100
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    ticket_type TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    ai_response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access);
+'''
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza el texto para que reportes casi idénticos ("Correo caído!!" / "correo  caído")
+    compartan clave: Unicode NFKC, minúsculas, sin signos de puntuación ni espacios repetidos.
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+def cache_key(title: str, description: str, mode: str, rules: bool = False) -> str:
+    """
+    Clave por contenido. Incluye todo lo que cambia el resultado para un mismo texto: versión
+    de prompts, modelo, modo del grafo y, con el pre-clasificador activo, su versión y umbral.
+    """
+    payload = "\x1f".join([
+        normalize_text(title), normalize_text(description), PROMPT_VERSION, DEFAULT_MODEL, mode,
+        rules_cache_tag(rules),
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMResultCache:
+    """
+    Caché persistente (SQLite) del resultado completo del pipeline de IA, direccionada por
+    contenido. Acotada en tamaño con expulsión LRU y con caducidad por TTL.
+    """
+    def __init__(self, path: str = CACHE_DB_PATH, max_entries: int = MAX_ENTRIES, ttl: int = TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        self._entries = 0 # Filas en la tabla (a lo sumo; se recuenta al abrir y cada EVICT_EVERY escrituras)
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0}
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.executescript(SCHEMA)
+            # Al abrir, no al llegar a EVICT_EVERY escrituras: un proceso que guarda pocas
+            # entradas (un process_all corto, un worker que se reinicia) también debe podar
+            self._entries = self._count(self._conn)
+            self._evict(self._conn, time.time())
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _count(conn) -> int:
+        return conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT ticket_type, priority, ai_response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            if now - row[3] > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                self._entries -= 1
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            conn.execute("UPDATE llm_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            conn.commit()
+            self._stats["hits"] += 1
+        return {"ticket_type": row[0], "priority": row[1], "ai_response": row[2]}
+
+    def put(self, key: str, ticket_type: str, priority: str, ai_response: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_cache (key, ticket_type, priority, ai_response, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, ticket_type, priority, ai_response, now, now))
+            self._stats["stores"] += 1
+            self._writes += 1
+            self._entries += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._entries = self._count(conn)
+                self._evict(conn, now)
+            elif self._entries > self.max_entries:
+                self._evict(conn, now, expire=False)
+            conn.commit()
+
+    def _evict(self, conn, now: float, expire: bool = True):
+        """Poda las caducadas y, si la tabla pasa de max_entries, las de acceso más antiguo."""
+        if expire:
+            expired = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+            self._entries -= expired
+            self._stats["expired"] += expired
+        if self._entries <= self.max_entries:
+            return
+        evicted = conn.execute('''
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,)).rowcount
+        # Si no sobraba ninguna, la cuenta estaba inflada por algún REPLACE: se corrige
+        self._entries = self.max_entries if evicted else self._count(conn)
+        self._stats["evicted"] += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = self._connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["entries"] = entries
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+            self._entries = 0
+            self._stats = {k: 0 for k in self._stats}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> LLMResultCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResultCache()
+    return _cache
+
+def make_cache_nodes(mode: str, rules: bool = False):
+    """
+    Devuelve los nodos (lookup, store) que envuelven el pipeline de IA para el modo dado y
+    con o sin el pre-clasificador de reglas.
+    """
+    def cache_lookup_node(state) -> dict:
+        key = cache_key(state.get("title", ""), state.get("description", ""), mode, rules)
+        cached = get_cache().get(key)
+        if cached is None:
+            return {"cache_hit": False}
+        return {**cached, "cache_hit": True}
+
+    def cache_store_node(state) -> dict:
+        if state.get("ticket_type") and state.get("priority") and state.get("ai_response"):
+            key = cache_key(state.get("title", ""), state.get("description", ""), mode, rules)
+            get_cache().put(key, state["ticket_type"], state["priority"], state["ai_response"])
+        return {}
+
+    return cache_lookup_node, cache_store_node
@@ -0,0 +1,95 @@
+"""
+Checkpoints persistentes del grafo de IA (LangGraph + SQLite), un hilo por ticket.
+
+Tras cada nodo el estado queda guardado con thread_id = ticket_id. Si soporte falla después
+de que clasificador y priorizador terminaran, la siguiente ejecución del mismo ticket
+(process_all, un job o el streaming de la API) continúa en soporte sin repetir las dos
+llamadas anteriores. Cuando el resultado ya está guardado en tickets se borra el hilo:
+la BD de checkpoints solo contiene trabajo a medias (o tickets en dead-letter).
+
+Los checkpoints van en su propia BD (.langgraph_checkpoints/, fuera del control de versiones),
+no en tickets.db: escriben un blob por nodo y no deben competir con el escritor principal.
+
+Configuración:
+    ITSM_CHECKPOINTS       1 / 0
+    ITSM_CHECKPOINT_DB     ruta de la BD (.langgraph_checkpoints/checkpoints.db)
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from src.core.repository import BASE_DIR
+
+CHECKPOINTS_ENABLED = os.getenv("ITSM_CHECKPOINTS", "1") == "1"
+CHECKPOINT_DB_PATH = os.getenv("ITSM_CHECKPOINT_DB", os.path.join(BASE_DIR, ".langgraph_checkpoints", "checkpoints.db"))
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver con las variantes async que usan ainvoke/astream (process_all concurrente y la
+    API). Delegan en las síncronas desde un hilo: son escrituras cortas bajo el lock del saver
+    y así el mismo checkpointer sirve a los workers síncronos y al event loop.
+    """
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+_saver = None
+_saver_lock = threading.Lock()
+
+def get_checkpointer(path: str = None) -> ThreadedSqliteSaver:
+    """Checkpointer compartido por el proceso (una conexión; el saver serializa con su lock)."""
+    global _saver
+    if _saver is None:
+        with _saver_lock:
+            if _saver is None:
+                path = path or CHECKPOINT_DB_PATH
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                conn = sqlite3.connect(path, check_same_thread=False)
+                # Perder el último checkpoint en un corte de luz solo cuesta repetir un nodo
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                _saver = ThreadedSqliteSaver(conn)
+                _saver.setup()
+    return _saver
+
+def thread_config(ticket_id: str) -> dict:
+    return {"configurable": {"thread_id": str(ticket_id)}}
+
+def resume_input(snapshot, initial_state: dict):
+    """
+    Entrada para invocar el grafo sobre el hilo cuyo último checkpoint es `snapshot`
+    (StateSnapshot): None continúa desde el último nodo completado, o devuelve el resultado
+    sin ejecutar nada si el grafo ya terminó pero no llegó a guardarse. Sin checkpoint, o si
+    es de otro contenido con el mismo ID (p. ej. de otra BD de tickets), se arranca de cero.
+    """
+    values = snapshot.values if snapshot else None
+    if not values:
+        return initial_state
+    if (values.get("title"), values.get("description")) == (initial_state["title"], initial_state["description"]):
+        return None
+    # El hilo viejo se descarta: si no, los reductores (ai_metrics) arrastrarían su estado
+    get_checkpointer().delete_thread(str(initial_state["ticket_id"]))
+    return initial_state
+
+def clear(ticket_ids):
+    """Borra los hilos de tickets cuyo resultado ya está guardado (llamar tras el commit)."""
+    if not CHECKPOINTS_ENABLED:
+        return
+    saver = get_checkpointer()
+    for ticket_id in ticket_ids:
+        saver.delete_thread(str(ticket_id))
@@ -0,0 +1,292 @@
+import os
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict, Counter
+
+import numpy as np
+
+from src.core.cache import normalize_text
+from src.core import repository
+
+DEDUP_ENABLED = os.getenv("ITSM_DEDUP", "1") == "1"
+# Similitud de Jaccard estimada (sobre shingles de caracteres) a partir de la cual un ticket
+# se considera el mismo reporte que otro ya enriquecido
+THRESHOLD = float(os.getenv("ITSM_DEDUP_THRESHOLD", "0.7"))
+# Solo se reutiliza la clasificación de tickets enriquecidos en esta ventana (caídas en curso)
+WINDOW_SECONDS = int(os.getenv("ITSM_DEDUP_WINDOW", str(48 * 3600)))
+MAX_RECENT = 200_000
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS # 16 bandas x 4 filas: umbral de candidatos LSH ~ (1/16)^(1/4) ~ 0.5
+# Tamaño del buffer de inserciones antes de fusionarlo con los arrays ordenados
+MERGE_EVERY = 50_000
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240229) # Semilla fija: firmas estables entre procesos
+_PERM_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 1 << 63, size=ROWS, dtype=np.uint64) | np.uint64(1)
+_BAND_SALT = _rng.integers(0, 1 << 63, size=BANDS, dtype=np.uint64)
+
+def minhash_signature(title: str, description: str) -> np.ndarray:
+    """
+    Firma MinHash (NUM_PERM valores uint32) de los shingles de caracteres del ticket.
+    Se ignoran las tildes: "caído" y "caido" son el mismo reporte.
+    """
+    text = unicodedata.normalize("NFKD", normalize_text(f"{title} {description}"))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) % _PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+def band_keys(signature: np.ndarray) -> np.ndarray:
+    """
+    Una clave uint64 por banda. Cada banda lleva su propia sal, así todas caben en un único
+    array ordenado sin colisionar entre bandas.
+    """
+    rows = signature.reshape(BANDS, ROWS).astype(np.uint64)
+    return (rows * _BAND_MIX[None, :]).sum(axis=1) ^ _BAND_SALT
+
+class DuplicateIndex:
+    """
+    Índice MinHash/LSH en memoria sobre título + descripción de los tickets.
+
+    Las claves de banda viven en un array ordenado (búsqueda binaria vectorizada con numpy)
+    más un buffer de inserciones recientes que se fusiona cada MERGE_EVERY claves, así una
+    consulta cuesta lo mismo con mil que con un millón de tickets indexados. Las firmas
+    completas solo se guardan para los tickets enriquecidos recientemente, que son los
+    únicos que pueden actuar como "padre" de un duplicado.
+    """
+    def __init__(self, threshold: float = THRESHOLD, window: int = WINDOW_SECONDS):
+        self.threshold = threshold
+        self.window = window
+        self._lock = threading.RLock()
+        self._ids = []
+        self._positions = {}
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._owners = np.empty(0, dtype=np.int32)
+        self._pending = {}
+        self._pending_count = 0
+        self._recent = OrderedDict() # ticket_id -> (firma, enriched_at)
+        # Altas recibidas mientras se reconstruye desde la BD; se reaplican al terminar
+        self._journal = None
+        # Con freeze(): instante de la foto de padres (ver freeze)
+        self._frozen_at = None
+        self.ready = False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, ticket_id: str, title: str, description: str, signature: np.ndarray = None):
+        """
+        Indexa un ticket recién insertado (idempotente). Retorna su firma.
+        """
+        if signature is None:
+            signature = minhash_signature(title, description)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((ticket_id, title, description, None))
+            if ticket_id in self._positions:
+                return signature
+            position = len(self._ids)
+            self._ids.append(ticket_id)
+            self._positions[ticket_id] = position
+            for key in band_keys(signature).tolist():
+                self._pending.setdefault(key, []).append(position)
+            self._pending_count += BANDS
+            if self._pending_count >= MERGE_EVERY:
+                self._merge()
+        return signature
+
+    def mark_enriched(self, ticket_id: str, title: str, description: str, enriched_at: float = None):
+        """
+        Registra que el ticket ya tiene clasificación de IA y puede servir de padre.
+        """
+        signature = self.add(ticket_id, title, description)
+        enriched_at = enriched_at or time.time()
+        with self._lock:
+            if self._frozen_at is not None:
+                return
+            if self._journal is not None:
+                self._journal.append((ticket_id, title, description, enriched_at))
+            self._recent[ticket_id] = (signature, enriched_at)
+            self._recent.move_to_end(ticket_id)
+            self._expire(time.time())
+
+    def find_parent(self, ticket_id: str, title: str, description: str):
+        """
+        Busca un ticket enriquecido recientemente que sea casi idéntico. Retorna
+        (parent_id, similitud) o None.
+        """
+        signature = minhash_signature(title, description)
+        keys = band_keys(signature)
+        with self._lock:
+            candidates = Counter()
+            left = np.searchsorted(self._keys, keys, side="left")
+            right = np.searchsorted(self._keys, keys, side="right")
+            for lo, hi in zip(left.tolist(), right.tolist()):
+                if hi > lo:
+                    candidates.update(self._owners[lo:hi].tolist())
+            for key in keys.tolist():
+                candidates.update(self._pending.get(key, ()))
+
+            cutoff = (self._frozen_at or time.time()) - self.window
+            best = None
+            for position, _ in candidates.most_common():
+                candidate_id = self._ids[position]
+                recent = self._recent.get(candidate_id)
+                if candidate_id == ticket_id or recent is None or recent[1] < cutoff:
+                    continue
+                similarity = float(np.mean(recent[0] == signature))
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (candidate_id, similarity)
+        return best
+
+    def freeze(self):
+        """
+        Fija los padres posibles a los tickets enriquecidos hasta ahora (y la ventana a este
+        instante). Para lotes como process_all: si los tickets del lote pasaran a ser padres al
+        guardarse, qué queda como duplicado dependería del orden y de los tiempos, y el modo
+        concurrente no daría el mismo resultado que el secuencial.
+        """
+        with self._lock:
+            self._frozen_at = time.time()
+
+    def rebuild_from_db(self, conn):
+        """
+        Reconstruye el índice completo desde SQLite (p. ej. al arrancar la API).
+        """
+        with self._lock:
+            self._journal = []
+        cutoff = time.time() - self.window
+        ids, keys, owners, recent = [], [], [], OrderedDict()
+        unreadable = 0
+        try:
+            rows = conn.execute('''
+                SELECT id, title, description, ai_response IS NOT NULL AS enriched, updated_at
+                FROM tickets ORDER BY created_at
+            ''')
+            for position, (ticket_id, title, description, enriched, updated_at) in enumerate(rows):
+                signature = minhash_signature(title, description)
+                ids.append(ticket_id)
+                keys.append(band_keys(signature))
+                owners.append(position)
+                enriched_at = repository.to_epoch(updated_at) if updated_at else 0.0
+                if enriched_at is None:
+                    unreadable += 1 # Se indexa, pero sin fecha fiable no puede ser padre
+                elif enriched and enriched_at >= cutoff:
+                    recent[ticket_id] = (signature, enriched_at)
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        if unreadable:
+            print(f"Aviso: {unreadable} tickets con updated_at ilegible no se usarán como padre de duplicados")
+
+        all_keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.uint64)
+        all_owners = np.repeat(np.asarray(owners, dtype=np.int32), BANDS)
+        order = np.argsort(all_keys, kind="stable")
+        with self._lock:
+            self._ids = ids
+            self._positions = {ticket_id: i for i, ticket_id in enumerate(ids)}
+            self._keys = all_keys[order]
+            self._owners = all_owners[order]
+            self._pending = {}
+            self._pending_count = 0
+            self._recent = OrderedDict(sorted(recent.items(), key=lambda item: item[1][1]))
+            self._expire(time.time())
+            journal, self._journal = self._journal, None
+            for ticket_id, title, description, enriched_at in journal:
+                if enriched_at is None:
+                    self.add(ticket_id, title, description)
+                else:
+                    self.mark_enriched(ticket_id, title, description, enriched_at)
+            self.ready = True
+
+    def _merge(self):
+        pending_keys = np.fromiter(
+            (key for key, owners in self._pending.items() for _ in owners), dtype=np.uint64, count=self._pending_count
+        )
+        pending_owners = np.fromiter(
+            (owner for owners in self._pending.values() for owner in owners), dtype=np.int32, count=self._pending_count
+        )
+        keys = np.concatenate([self._keys, pending_keys])
+        owners = np.concatenate([self._owners, pending_owners])
+        order = np.argsort(keys, kind="stable")
+        self._keys, self._owners = keys[order], owners[order]
+        self._pending = {}
+        self._pending_count = 0
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self._recent:
+            ticket_id, (_, enriched_at) = next(iter(self._recent.items()))
+            if enriched_at >= cutoff and len(self._recent) <= MAX_RECENT:
+                break
+            self._recent.popitem(last=False)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index() -> DuplicateIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = DuplicateIndex()
+    return _index
+
+def rebuild_index(background: bool = False):
+    """
+    Carga el índice desde data/tickets.db. En segundo plano no retrasa el arranque de la API:
+    mientras tanto el índice solo conoce los tickets que se vayan insertando.
+    """
+    def _rebuild():
+        try:
+            start = time.perf_counter()
+            with repository.connection() as conn:
+                get_index().rebuild_from_db(conn)
+            print(f"Índice de duplicados listo: {len(get_index())} tickets en {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            # En segundo plano una excepción mataría el hilo sin dejar rastro
+            print(f"Aviso: no se pudo construir el índice de duplicados: {e}")
+
+    if background:
+        threading.Thread(target=_rebuild, name="dedup-index-rebuild", daemon=True).start()
+    else:
+        _rebuild()
+
+def dedup_node(state) -> dict:
+    """
+    Si el ticket es casi idéntico a uno enriquecido recientemente, reutiliza su tipo,
+    prioridad y respuesta de IA y lo vincula como hijo, sin pasar por los agentes.
+    """
+    index = get_index()
+    ticket_id = state.get("ticket_id")
+    title, description = state.get("title", ""), state.get("description", "")
+    index.add(ticket_id, title, description)
+
+    match = index.find_parent(ticket_id, title, description)
+    if match is None:
+        return {"parent_ticket_id": None}
+
+    parent_id, _ = match
+    with repository.connection() as conn:
+        parent = repository.get_ticket_row(conn, parent_id)
+    if parent is None or parent['ai_response'] is None:
+        return {"parent_ticket_id": None}
+
+    return {
+        "parent_ticket_id": parent_id,
+        "ticket_type": parent['type'],
+        "priority": parent['priority'],
+        "ai_response": parent['ai_response'],
+    }
@@ -0,0 +1,44 @@
+from src.core.dedup import DEDUP_ENABLED, get_index
+from src.core.repository import SQL_INSERT_HISTORY, add_ai_metrics, clear_ai_attempts
+
+SYSTEM_USER_ID = 1 # Admin reservado para operaciones del sistema (Sistema IA)
+
+def save_ai_results(conn, results, action_label: str = "IA Clasifica Automáticamente"):
+    """
+    Escribe el resultado del grafo de IA de uno o varios tickets y su entrada de historial.
+    `results` es una lista de tuplas (ticket_id, state). No hace commit: el llamador decide
+    la transacción (p. ej. junto con el cierre de un job o agrupando un lote).
+    """
+    conn.executemany('''
+        UPDATE tickets 
+        SET type = ?, priority = ?, ai_response = ?, status = 'in-progress', updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', [
+        (state.get("ticket_type"), state.get("priority"), state.get("ai_response"), ticket_id)
+        for ticket_id, state in results
+    ])
+    
+    conn.executemany(SQL_INSERT_HISTORY, [
+        (ticket_id, history_action(state, action_label), SYSTEM_USER_ID)
+        for ticket_id, state in results
+    ])
+    
+    # Enriquecidos: sus fallos anteriores (y un posible dead-letter) dejan de contar
+    clear_ai_attempts(conn, [ticket_id for ticket_id, _ in results])
+    
+    # Tiempo, tokens y coste de cada nodo del grafo (ver src/core/metrics.py)
+    for ticket_id, state in results:
+        if state.get("ai_metrics"):
+            add_ai_metrics(conn, ticket_id, state["ai_metrics"])
+    
+    if DEDUP_ENABLED:
+        # Desde ahora estos tickets pueden ser "padre" de reportes casi idénticos
+        index = get_index()
+        for ticket_id, state in results:
+            index.mark_enriched(ticket_id, state.get("title", ""), state.get("description", ""))
+
+def history_action(state: dict, action_label: str) -> str:
+    classification = f"{str(state.get('ticket_type')).upper()} - {str(state.get('priority')).upper()}"
+    if state.get("parent_ticket_id"):
+        return f"Vinculado como duplicado de {state['parent_ticket_id']}. Clasificación reutilizada: {classification}."
+    return f"{action_label}: {classification}."
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from src.core import repository
+
+# Cada cuánto lee el hub la tabla ticket_events si nadie lo despierta antes. Es una sola
+# consulta por proceso, da igual cuántos dashboards haya conectados.
+POLL_INTERVAL = float(os.getenv("ITSM_EVENTS_POLL", "0.5"))
+# Eventos pendientes por cliente. Si un cliente lento llena su cola no frena al resto: se le
+# vacía y recibe un evento 'resync' para que recargue con GET /api/tickets?updated_since=.
+CLIENT_QUEUE_SIZE = int(os.getenv("ITSM_EVENTS_QUEUE", "256"))
+FETCH_BATCH = 500
+# Máximo de eventos a reenviar a un cliente que se reconecta con Last-Event-ID
+REPLAY_LIMIT = 1000
+RETENTION_SECONDS = int(os.getenv("ITSM_EVENTS_RETENTION", str(24 * 3600)))
+PRUNE_EVERY = 600
+
+class Subscription:
+    def __init__(self, size: int):
+        self.queue = asyncio.Queue(maxsize=size)
+        self.dropped = 0
+
+    def offer(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Backpressure: el cliente no da abasto. Se descarta lo pendiente y se le pide resync.
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"id": event["id"], "kind": "resync", "ticket_id": None, "payload": "{}"})
+
+class EventHub:
+    """
+    Reparte en vivo los eventos de ticket_events (los escriben triggers de la tabla tickets,
+    así que cubren la API, Streamlit, los workers y process_all_tickets.py aunque corran en
+    otro proceso). Un único bucle por proceso lee la outbox y copia cada evento en la cola
+    de cada suscriptor; los endpoints SSE solo esperan en su cola.
+    """
+    def __init__(self, poll_interval: float = POLL_INTERVAL, queue_size: int = CLIENT_QUEUE_SIZE):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.last_id = 0
+        self._subscribers = set()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.last_id = await asyncio.to_thread(self._last_event_id)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Despierta al hub tras una escritura local (seguro desde cualquier hilo)."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    async def _run(self):
+        last_prune = 0.0
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                events = await asyncio.to_thread(self._fetch)
+                for event in events:
+                    for subscription in list(self._subscribers):
+                        subscription.offer(event)
+                if time.monotonic() - last_prune > PRUNE_EVERY:
+                    last_prune = time.monotonic()
+                    await asyncio.to_thread(prune)
+            except Exception as e:
+                print(f"Aviso: no se pudieron leer los eventos de tickets: {e}")
+
+    def _fetch(self) -> list:
+        events = []
+        with repository.connection() as conn:
+            while True:
+                batch = repository.events_after(conn, self.last_id, FETCH_BATCH)
+                events += batch
+                if batch:
+                    self.last_id = batch[-1]["id"]
+                if len(batch) < FETCH_BATCH:
+                    return events
+
+    @staticmethod
+    def _last_event_id() -> int:
+        with repository.connection() as conn:
+            return repository.last_event_id(conn)
+
+def replay(after_id: int, up_to: int) -> list:
+    """
+    Eventos con after_id < id <= up_to para un cliente que se reconecta. Si faltan demasiados
+    (o ya se purgaron) retorna un único 'resync'.
+    """
+    with repository.connection() as conn:
+        events = repository.events_after(conn, after_id, REPLAY_LIMIT + 1)
+    events = [e for e in events if e["id"] <= up_to]
+    if len(events) > REPLAY_LIMIT or (events and events[0]["id"] != after_id + 1):
+        return [{"id": up_to, "kind": "resync", "ticket_id": None, "payload": "{}"}]
+    return events
+
+def prune() -> int:
+    before = (datetime.now(timezone.utc) - timedelta(seconds=RETENTION_SECONDS)).strftime("%Y-%m-%d %H:%M:%S")
+    with repository.transaction() as conn:
+        return repository.prune_events(conn, before)
+
+def format_sse(event: dict) -> str:
+    """Evento SSE con id (para Last-Event-ID), tipo y el ticket afectado."""
+    data = json.dumps({"kind": event["kind"], "ticket": json.loads(event["payload"])}, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {data}\n\n"
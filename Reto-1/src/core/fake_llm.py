@@ -0,0 +1,178 @@
+"""
+Modelo de chat simulado para benchmarks y pruebas sin red.
+
+Se activa con ITSM_LLM_PROVIDER=fake (o llm.set_llm_factory) y sustituye a ChatGroq detrás
+de get_llm(), así que el grafo, las cadenas del registro, la caché y los workers son los de
+producción; solo cambia quién contesta. Es determinista con la misma semilla: las salidas
+dependen únicamente del texto del prompt y la latencia / los errores salen de un generador
+aleatorio con semilla fija.
+
+Configuración por entorno:
+    ITSM_FAKE_LLM_LATENCY_MS   latencia media por llamada (50)
+    ITSM_FAKE_LLM_JITTER_MS    desviación uniforme +/- sobre la latencia (0)
+    ITSM_FAKE_LLM_ERROR_RATE   probabilidad de que una llamada falle con un error simulado (0)
+    ITSM_FAKE_LLM_ERROR_STATUS código HTTP de esos errores: 429 (límite) o 5xx (proveedor caído) (429)
+    ITSM_FAKE_LLM_RPM          peticiones por minuto que admite el "proveedor"; las que se pasan
+                               reciben un 429 con Retry-After, como en Groq (0 = sin límite)
+    ITSM_FAKE_LLM_SEED         semilla del generador (0)
+    ITSM_FAKE_LLM_OUTPUTS      JSON con valores fijos para las salidas estructuradas,
+                               p. ej. {"ticket_type": "incident", "priority": "high"}
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import typing
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr
+
+DEFAULT_RESPONSE = (
+    "**Análisis del ticket**\n\n"
+    "El reporte describe una incidencia que afecta al trabajo del usuario y se ha tipificado "
+    "según su impacto y urgencia.\n\n"
+    "**Pasos sugeridos:**\n\n"
+    "1. Verificar el estado del servicio afectado.\n"
+    "2. Reiniciar el equipo o la aplicación y reintentar.\n"
+    "3. Si persiste, escalar al equipo de soporte de nivel 2."
+)
+
+class FakeLLMError(RuntimeError):
+    """Error simulado del proveedor, con la misma forma que los de la librería de Groq."""
+    def __init__(self, message: str, status_code: int = 429, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {"retry-after": f"{retry_after:.3f}"} if retry_after else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+def _prompt_text(value) -> str:
+    if hasattr(value, "to_string"):
+        return value.to_string()
+    if isinstance(value, list):
+        return "\n".join(str(getattr(m, "content", m)) for m in value)
+    return str(value)
+
+def _estimate_tokens(text: str) -> int:
+    # Aproximación habitual de ~4 caracteres por token; basta para comparar configuraciones
+    return max(1, len(text) // 4)
+
+class FakeChatModel(BaseChatModel):
+    model: str = "fake"
+    temperature: float = 0.0
+    latency_ms: float = 50.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 429
+    rpm_limit: float = 0.0
+    seed: int = 0
+    outputs: Dict[str, Any] = {}
+    response: str = DEFAULT_RESPONSE
+
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _window: deque = PrivateAttr(default_factory=deque) # instantes de las peticiones del último minuto
+    calls: int = 0
+    errors: int = 0
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "FakeChatModel":
+        config = {
+            "latency_ms": float(os.getenv("ITSM_FAKE_LLM_LATENCY_MS", "50")),
+            "jitter_ms": float(os.getenv("ITSM_FAKE_LLM_JITTER_MS", "0")),
+            "error_rate": float(os.getenv("ITSM_FAKE_LLM_ERROR_RATE", "0")),
+            "error_status": int(os.getenv("ITSM_FAKE_LLM_ERROR_STATUS", "429")),
+            "rpm_limit": float(os.getenv("ITSM_FAKE_LLM_RPM", "0")),
+            "seed": int(os.getenv("ITSM_FAKE_LLM_SEED", "0")),
+            "outputs": json.loads(os.getenv("ITSM_FAKE_LLM_OUTPUTS", "{}")),
+        }
+        config.update(kwargs)
+        return cls(**config)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _simulate_call(self, fraction: float = 1.0):
+        """Duerme la latencia sorteada y, según error_rate y rpm_limit, falla como lo haría el proveedor."""
+        with self._rng_lock:
+            self.calls += 1
+            if self.rpm_limit:
+                now = time.monotonic()
+                while self._window and now - self._window[0] >= 60:
+                    self._window.popleft()
+                if len(self._window) >= self.rpm_limit:
+                    self.errors += 1
+                    raise FakeLLMError("Rate limit reached: requests per minute (simulado)",
+                                       429, retry_after=60 - (now - self._window[0]))
+                self._window.append(now)
+            delay = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(max(0.0, delay) * fraction / 1000)
+        if failed:
+            raise FakeLLMError(f"Error {self.error_status} del proveedor (simulado)", self.error_status)
+
+    def _message(self, prompt: str) -> AIMessage:
+        return AIMessage(
+            content=self.response,
+            usage_metadata={
+                "input_tokens": _estimate_tokens(prompt),
+                "output_tokens": _estimate_tokens(self.response),
+                "total_tokens": _estimate_tokens(prompt) + _estimate_tokens(self.response),
+            },
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._simulate_call()
+        return ChatResult(generations=[ChatGeneration(message=self._message(_prompt_text(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        # La latencia se reparte entre el primer token y el resto, como en un streaming real
+        self._simulate_call(fraction=0.5)
+        words = self.response.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.latency_ms * 0.5 / len(words) / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs):
+        """
+        Devuelve una instancia de `schema` sin llamar a nadie. Los campos Literal toman el
+        valor de `outputs` si está fijado o, si no, una opción elegida por hash del prompt
+        (mismo ticket, misma etiqueta; tickets distintos se reparten entre las opciones).
+        """
+        def invoke(value):
+            prompt = _prompt_text(value)
+            self.invoke(value) # misma latencia, errores y callbacks (tokens) que una llamada normal
+            return schema(**{name: self._field_value(name, field, prompt) for name, field in schema.model_fields.items()})
+        return RunnableLambda(invoke)
+
+    def _field_value(self, name: str, field, prompt: str):
+        if name in self.outputs:
+            return self.outputs[name]
+        options = typing.get_args(field.annotation) if typing.get_origin(field.annotation) is typing.Literal else ()
+        if not options:
+            return self.response
+        digest = hashlib.blake2b(f"{self.seed}|{name}|{prompt}".encode(), digest_size=8).digest()
+        return options[int.from_bytes(digest, "big") % len(options)]
+
+def make_factory(**overrides):
+    """Fábrica para llm.set_llm_factory con parámetros fijos (el resto se toma del entorno)."""
+    def factory(model: str, temperature: float) -> FakeChatModel:
+        return FakeChatModel.from_env(model=model, temperature=temperature, **overrides)
+    return factory
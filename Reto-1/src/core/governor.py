@@ -0,0 +1,322 @@
+"""
+Gobernador de llamadas al LLM compartido por todo el proceso.
+
+Cada invocación de la cadena de un agente pasa por invoke(chain, inputs), que:
+1. Falla al instante si el circuit breaker está abierto (proveedor caído): no se gastan
+   llamadas ni se bloquea a los workers esperando timeouts.
+2. Espera un hueco de concurrencia. El límite se adapta con AIMD: sube +1/límite con cada
+   respuesta rápida y se reduce a la mitad con cada 429 (x0.9 si la latencia se dispara).
+3. Toma del token bucket una petición (RPM) y los tokens estimados (TPM), dimensionados con
+   los límites del proveedor. Tras la llamada se ajusta con los tokens reales.
+4. Reintenta 429 y errores transitorios (5xx, timeouts, conexión) con backoff exponencial y
+   jitter. Un 429 con Retry-After pausa el bucket para todos los hilos, no solo para este.
+
+Es síncrono y seguro entre hilos: los nodos del grafo corren en hilos tanto con invoke como
+con ainvoke. Los reintentos de ChatGroq se desactivan (get_llm) para que solo reintente aquí.
+
+Antes de cada intento (el primero y cada reintento) se llama al callback fijado con
+before_each_attempt() en el contexto actual: quien procesa un trabajo con lease lo renueva ahí,
+y si lanza una excepción la llamada se abandona sin intentarla.
+
+Configuración (0 = sin límite; por defecto los del plan gratuito de Groq para llama-3.1-8b-instant
+con ITSM_LLM_PROVIDER=groq, y sin límites con el proveedor simulado):
+    ITSM_LLM_GOVERNOR        1 / 0
+    ITSM_LLM_RPM / ITSM_LLM_TPM
+    ITSM_LLM_CONCURRENCY     límite inicial de llamadas simultáneas (4), entre 1 y ITSM_LLM_MAX_CONCURRENCY (16)
+    ITSM_LLM_LATENCY_TARGET  segundos por llamada a partir de los cuales se reduce la concurrencia (10)
+    ITSM_LLM_MAX_RETRIES     reintentos por llamada (4)
+    ITSM_LLM_BREAKER_FAILURES / ITSM_LLM_BREAKER_COOLDOWN   fallos seguidos para abrir (5) y segundos abierto (30)
+"""
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from src.core import metrics
+from src.core.llm import LLM_PROVIDER
+
+GOVERNOR_ENABLED = os.getenv("ITSM_LLM_GOVERNOR", "1") == "1"
+
+# Callback previo a cada intento; ContextVar para que llegue a los hilos de los nodos del grafo
+_before_attempt = ContextVar("itsm_before_llm_attempt", default=None)
+
+@contextmanager
+def before_each_attempt(callback):
+    """Dentro del bloque, `callback()` se ejecuta antes de cada intento de llamada al LLM."""
+    token = _before_attempt.set(callback)
+    try:
+        yield
+    finally:
+        _before_attempt.reset(token)
+
+def _run_before_attempt():
+    callback = _before_attempt.get()
+    if callback is not None:
+        callback()
+
+def _limit(name: str, groq_default: str) -> float:
+    return float(os.getenv(name, groq_default if LLM_PROVIDER == "groq" else "0"))
+
+RPM = _limit("ITSM_LLM_RPM", "30")
+TPM = _limit("ITSM_LLM_TPM", "6000")
+INITIAL_CONCURRENCY = float(os.getenv("ITSM_LLM_CONCURRENCY", "4"))
+MAX_CONCURRENCY = int(os.getenv("ITSM_LLM_MAX_CONCURRENCY", "16"))
+LATENCY_TARGET = float(os.getenv("ITSM_LLM_LATENCY_TARGET", "10"))
+MAX_RETRIES = int(os.getenv("ITSM_LLM_MAX_RETRIES", "4"))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+BREAKER_FAILURES = int(os.getenv("ITSM_LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("ITSM_LLM_BREAKER_COOLDOWN", "30"))
+# Reserva de tokens de respuesta por llamada (la real se descuenta al terminar)
+COMPLETION_RESERVE = 256
+# Ráfaga permitida por el bucket: 10 s de cupo, así no se gasta el minuto entero de golpe
+BURST_SECONDS = 10
+
+class CircuitOpenError(RuntimeError):
+    """El proveedor del LLM está fallando: se rechaza la llamada sin intentarla."""
+    def __init__(self, retry_in: float):
+        super().__init__(f"Proveedor LLM no disponible (circuit breaker abierto, reintento en {retry_in:.0f}s)")
+        self.retry_in = retry_in
+
+class TokenBucket:
+    """Bucket de `rate_per_minute` unidades por minuto. Con rate 0 no limita."""
+    def __init__(self, rate_per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0):
+        """Bloquea hasta poder consumir `amount` (una petición mayor que la capacidad espera al bucket lleno)."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if not self.rate:
+                    if now >= self._paused_until:
+                        return
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if now >= self._paused_until and self._tokens >= amount:
+                        self._tokens -= amount
+                        return
+                    wait = max(self._paused_until - now, (amount - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def adjust(self, amount: float):
+        """Descuenta (o devuelve, si es negativo) unidades ya usadas; el saldo puede quedar en deuda."""
+        if self.rate:
+            with self._lock:
+                self._refill(time.monotonic())
+                self._tokens = min(self.capacity, self._tokens - amount)
+
+    def pause(self, seconds: float):
+        """Nadie toma del bucket durante `seconds` (Retry-After de un 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class AIMDLimiter:
+    """Semáforo con límite variable: aumento aditivo con éxito, reducción multiplicativa con congestión."""
+    def __init__(self, initial: float = INITIAL_CONCURRENCY, minimum: float = 1.0, maximum: float = MAX_CONCURRENCY):
+        self.limit = min(maximum, max(minimum, initial))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency: float, target: float = LATENCY_TARGET):
+        with self._condition:
+            if latency > target:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def on_congestion(self):
+        with self._condition:
+            self.limit = max(self.minimum, self.limit / 2)
+
+class CircuitBreaker:
+    """
+    closed -> open tras `failures` errores transitorios seguidos; open -> half-open pasado
+    `cooldown`, donde una sola llamada de prueba decide si vuelve a closed o a open.
+    """
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                remaining = self._opened_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(remaining)
+                self.state = "half-open"
+            if self.state == "half-open":
+                if self._probing:
+                    raise CircuitOpenError(self.cooldown)
+                self._probing = True
+
+    def on_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._consecutive = 0
+            self._probing = False
+
+    def on_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._probing = False
+            if self.state == "half-open" or self._consecutive >= self.failures:
+                if self.state != "open":
+                    print(f"Aviso: circuit breaker del LLM abierto durante {self.cooldown:.0f}s tras {self._consecutive} fallos seguidos.")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def on_neutral(self):
+        """La llamada no llegó a probar nada (p. ej. 429): libera la prueba sin cambiar de estado."""
+        with self._lock:
+            self._probing = False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+def status_code(error: Exception):
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+def is_rate_limited(error: Exception) -> bool:
+    return status_code(error) == 429
+
+def is_transient(error: Exception) -> bool:
+    """5xx, timeouts y errores de conexión: merece la pena reintentar y cuentan para el breaker."""
+    code = status_code(error)
+    if code is not None:
+        return code >= 500
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+def retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(inputs: dict) -> int:
+    # ~4 caracteres por token del texto del ticket más el prompt fijo y la reserva de respuesta
+    text = sum(len(str(v)) for v in inputs.values())
+    return text // 4 + 200 + COMPLETION_RESERVE
+
+class LLMGovernor:
+    def __init__(self, rpm: float = RPM, tpm: float = TPM, max_retries: int = MAX_RETRIES):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AIMDLimiter()
+        self.breaker = CircuitBreaker()
+        self.max_retries = max_retries
+
+    def call(self, fn, estimated_tokens: int = COMPLETION_RESERVE):
+        attempt = 0
+        while True:
+            _run_before_attempt()
+            self.breaker.before_call()
+            waited = time.perf_counter()
+            self.concurrency.acquire()
+            try:
+                self.requests.acquire(1)
+                self.tokens.acquire(estimated_tokens)
+                metrics.LLM_THROTTLE_SECONDS.observe(time.perf_counter() - waited)
+                used_before = metrics.current_tokens()
+                start = time.perf_counter()
+                try:
+                    result = fn()
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+                    latency = time.perf_counter() - start
+                    used = metrics.current_tokens() - used_before
+                    self.tokens.adjust((used or estimated_tokens) - estimated_tokens)
+            finally:
+                self.concurrency.release()
+                self._publish()
+
+            if error is None:
+                self.concurrency.on_success(latency)
+                self.breaker.on_success()
+                return result
+            if is_rate_limited(error):
+                metrics.LLM_RATE_LIMITED.inc()
+                self.concurrency.on_congestion()
+                self.breaker.on_neutral()
+                delay = retry_after(error)
+                if delay:
+                    self.requests.pause(delay)
+            elif is_transient(error):
+                self.breaker.on_failure()
+                delay = None
+            else:
+                # Errores del propio pedido (validación, salida mal formada...): reintentar no ayuda
+                self.breaker.on_neutral()
+                raise error
+            if attempt >= self.max_retries:
+                raise error
+            attempt += 1
+            metrics.record_retry()
+            # Backoff exponencial con jitter completo (o lo que pida el proveedor, más jitter)
+            time.sleep((delay or 0) + random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+    def _publish(self):
+        metrics.LLM_CONCURRENCY_LIMIT.set(self.concurrency.limit)
+        metrics.LLM_IN_FLIGHT.set(self.concurrency.in_flight)
+        metrics.LLM_BREAKER_OPEN.set(1 if self.breaker.state == "open" else 0)
+
+_governor = None
+_governor_lock = threading.Lock()
+
+def get_governor() -> LLMGovernor:
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                _governor = LLMGovernor()
+    return _governor
+
+def reset_governor():
+    global _governor
+    with _governor_lock:
+        _governor = None
+
+def invoke(chain, inputs: dict):
+    """chain.invoke(inputs) a través del gobernador (o directamente si está desactivado)."""
+    if not GOVERNOR_ENABLED:
+        _run_before_attempt()
+        return chain.invoke(inputs)
+    return get_governor().call(lambda: chain.invoke(inputs), estimate_tokens(inputs))
@@ -0,0 +1,224 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from src.core.orchestrator import process_ticket
+from src.core.enrichment import save_ai_results
+from src.core import repository, checkpoints
+from src.core.governor import CircuitOpenError, before_each_attempt, get_governor
+
+MAX_ATTEMPTS = int(os.getenv("ITSM_JOB_MAX_ATTEMPTS", "3"))
+# Tiempo que un worker "posee" un job en curso. Si el proceso muere, al vencer el lease
+# cualquier otro worker (o el mismo tras reiniciar) lo vuelve a tomar. Se renueva antes de
+# cada intento contra el LLM y al guardar; si otro lo tomó entretanto, se abandona el resultado.
+LEASE_SECONDS = int(os.getenv("ITSM_JOB_LEASE_SECONDS", "300"))
+POLL_INTERVAL = 2.0
+
+class JobLeaseLostError(RuntimeError):
+    """Otro worker tomó el job (venció el lease) mientras este lo ejecutaba."""
+
+def enqueue(conn, ticket_id: str) -> int:
+    """
+    Encola el enriquecimiento IA de un ticket. No hace commit: se debe llamar dentro de la
+    misma transacción que inserta el ticket para que ticket y job sean atómicos.
+    """
+    cursor = conn.execute("INSERT INTO enrichment_jobs (ticket_id) VALUES (?)", (ticket_id,))
+    return cursor.lastrowid
+
+def get_job(conn, job_id: int):
+    row = conn.execute('''
+        SELECT id, ticket_id, status, attempts, last_error, created_at, started_at, finished_at
+        FROM enrichment_jobs WHERE id = ?
+    ''', (job_id,)).fetchone()
+    return dict(row) if row else None
+
+def claim_next(conn, owner: str):
+    """
+    Toma atómicamente el job más antiguo pendiente (o con lease vencido). Un único UPDATE
+    condicional evita que dos workers, en el mismo o en distintos procesos, tomen el mismo job.
+    """
+    rows = conn.execute('''
+        UPDATE enrichment_jobs
+        SET status = 'running', owner = ?, attempts = attempts + 1,
+            started_at = CURRENT_TIMESTAMP,
+            lease_expires_at = datetime('now', ?)
+        WHERE id = (
+            SELECT id FROM enrichment_jobs
+            WHERE status = 'queued'
+               OR (status = 'running' AND lease_expires_at < datetime('now'))
+            ORDER BY id
+            LIMIT 1
+        )
+        RETURNING id, ticket_id, attempts, created_at
+    ''', (owner, f"+{LEASE_SECONDS} seconds")).fetchall()
+    conn.commit()
+    return dict(rows[0]) if rows else None
+
+def renew_lease(conn, job: dict, owner: str) -> bool:
+    """
+    Extiende LEASE_SECONDS desde ahora el lease del job si sigue siendo de esta ejecución.
+    El owner es el del proceso (lo comparten sus hilos): `attempts`, que sube con cada
+    claim_next, distingue una toma posterior del mismo proceso. No hace commit.
+    """
+    rows = conn.execute('''
+        UPDATE enrichment_jobs SET lease_expires_at = datetime('now', ?)
+        WHERE id = ? AND owner = ? AND attempts = ? AND status = 'running'
+        RETURNING id
+    ''', (f"+{LEASE_SECONDS} seconds", job['id'], owner, job['attempts'])).fetchall()
+    return bool(rows)
+
+def recover_orphans(conn) -> int:
+    """
+    Devuelve a la cola los jobs que quedaron 'running' en este host por un proceso que ya
+    no existe (caída o reinicio). Los de otros hosts se recuperan al vencer su lease.
+    """
+    host = socket.gethostname()
+    rows = conn.execute(
+        "SELECT id, owner FROM enrichment_jobs WHERE status = 'running' AND owner LIKE ?", (f"{host}:%",)
+    ).fetchall()
+    orphans = [r['id'] for r in rows if not _pid_alive(int(r['owner'].rsplit(':', 1)[1]))]
+    conn.executemany(
+        "UPDATE enrichment_jobs SET status = 'queued', owner = NULL, lease_expires_at = NULL WHERE id = ?",
+        [(job_id,) for job_id in orphans]
+    )
+    conn.commit()
+    return len(orphans)
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return False # Somos un proceso nuevo: lo que figure con nuestro PID es de una vida anterior
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def run_job(job: dict, owner: str):
+    """
+    Ejecuta el grafo de IA para el ticket del job y persiste resultado y cierre del job en
+    una sola transacción. Si falla, el job vuelve a la cola hasta agotar MAX_ATTEMPTS (y el
+    fallo cuenta para el dead-letter del ticket); el siguiente intento continúa desde el
+    último nodo completado. Si el circuit breaker del LLM está abierto vuelve a la cola sin
+    gastar intento. Si otro worker tomó el job entretanto, no se escribe nada: el job es suyo.
+    La conexión solo se toma del pool para leer y escribir, no durante la llamada al LLM.
+    """
+    def renew():
+        with repository.transaction() as conn:
+            if not renew_lease(conn, job, owner):
+                raise JobLeaseLostError(f"El job {job['id']} lo tomó otro worker")
+
+    try:
+        with repository.connection() as conn:
+            ticket = repository.get_ticket_row(conn, job['ticket_id'])
+        if ticket is None:
+            raise LookupError(f"Ticket {job['ticket_id']} no existe")
+
+        # La espera en cola del primer nodo cuenta desde que se encoló el job
+        queued_at = datetime.strptime(job['created_at'], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+        with before_each_attempt(renew):
+            state = process_ticket({**dict(ticket), "queued_at": queued_at})
+
+        with repository.transaction() as conn:
+            # Primera escritura: toma el cerrojo, nadie puede quitarle el job hasta el commit
+            if not renew_lease(conn, job, owner):
+                raise JobLeaseLostError(f"El job {job['id']} lo tomó otro worker")
+            save_ai_results(conn, [(job['ticket_id'], state)])
+            conn.execute('''
+                UPDATE enrichment_jobs
+                SET status = 'done', finished_at = CURRENT_TIMESTAMP, lease_expires_at = NULL, last_error = NULL
+                WHERE id = ?
+            ''', (job['id'],))
+        checkpoints.clear([job['ticket_id']])
+    except JobLeaseLostError as e:
+        print(f"Job {job['id']} (ticket {job['ticket_id']}): {e}; se descarta este intento")
+    except CircuitOpenError as e:
+        with repository.transaction() as conn:
+            if not renew_lease(conn, job, owner):
+                return
+            conn.execute('''
+                UPDATE enrichment_jobs
+                SET status = 'queued', attempts = attempts - 1, last_error = ?, lease_expires_at = NULL
+                WHERE id = ?
+            ''', (str(e), job['id']))
+    except Exception as e:
+        final = job['attempts'] >= MAX_ATTEMPTS
+        with repository.transaction() as conn:
+            if not renew_lease(conn, job, owner):
+                return
+            conn.execute('''
+                UPDATE enrichment_jobs
+                SET status = ?, last_error = ?, lease_expires_at = NULL,
+                    finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE NULL END
+                WHERE id = ?
+            ''', ('failed' if final else 'queued', str(e), final, job['id']))
+            repository.record_ai_failure(conn, job['ticket_id'], str(e))
+        print(f"Job {job['id']} (ticket {job['ticket_id']}) falló en el intento {job['attempts']}: {e}")
+
+def wait_for_job(job_id: int, timeout: float, interval: float = 0.5):
+    """
+    Espera (sondeando) a que el job termine o pase `timeout`. Retorna el último estado leído.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        with repository.connection() as conn:
+            job = get_job(conn, job_id)
+        if not job or job['status'] not in ('queued', 'running') or time.monotonic() >= deadline:
+            return job
+        time.sleep(interval)
+
+class JobWorkerPool:
+    """
+    Hilos en segundo plano que vacían la cola de enrichment_jobs.
+    La API y Streamlit arrancan uno por proceso; varios procesos pueden compartir la BD.
+    """
+    def __init__(self, workers: int = None):
+        self.workers = workers or int(os.getenv("ITSM_JOB_WORKERS", "2"))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self):
+        repository.init_db()
+        with repository.connection() as conn:
+            recovered = recover_orphans(conn)
+        if recovered:
+            print(f"Recuperados {recovered} jobs de enriquecimiento interrumpidos.")
+
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"enrichment-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        """Despierta a los workers sin esperar al siguiente sondeo (llamar tras encolar)."""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with repository.connection() as conn:
+                    job = claim_next(conn, self.owner)
+            except sqlite3.OperationalError as e:
+                print(f"No se pudo tomar un job de la cola: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            run_job(job, self.owner)
+            # Con el proveedor caído no tiene sentido seguir sacando jobs de la cola
+            self._stop.wait(get_governor().breaker.retry_in())
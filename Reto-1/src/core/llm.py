@@ -1,12 +1,65 @@
 import os
+import threading
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
+from src.core.metrics import usage_callback
 
 load_dotenv()
 
-def get_llm(temperature: float = 0.0):
+DEFAULT_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+# "groq" en producción; "fake" usa el modelo simulado de src/core/fake_llm.py (benchmarks sin red)
+LLM_PROVIDERS = ("groq", "fake")
+LLM_PROVIDER = os.getenv("ITSM_LLM_PROVIDER", "groq")
+# Con el gobernador activo (src/core/governor.py) los reintentos son suyos, no del cliente
+CLIENT_MAX_RETRIES = 0 if os.getenv("ITSM_LLM_GOVERNOR", "1") == "1" else 2
+
+# Pool de clientes por (modelo, temperatura). Cada ChatGroq mantiene su propio cliente
+# HTTP keep-alive, así que reutilizarlo evita abrir una conexión TLS nueva por llamada.
+_clients = {}
+_clients_lock = threading.Lock()
+_factory = None
+
+def _build_client(model: str, temperature: float):
+    if _factory is not None:
+        return _factory(model, temperature)
+    if LLM_PROVIDER == "fake":
+        from src.core.fake_llm import FakeChatModel
+        return FakeChatModel.from_env(model=model, temperature=temperature)
+    if LLM_PROVIDER != "groq":
+        raise ValueError(f"ITSM_LLM_PROVIDER desconocido: {LLM_PROVIDER!r} (opciones: {', '.join(LLM_PROVIDERS)})")
+    return ChatGroq(model=model, temperature=temperature, max_retries=CLIENT_MAX_RETRIES)
+
+def get_llm(temperature: float = 0.0, model: str = DEFAULT_MODEL):
     """
-    Inicializa y devuelve el modelo de lenguaje configurado a través de Groq.
+    Devuelve el modelo de lenguaje configurado a través de Groq.
     Usamos llama-3.1-8b-instant porque es increíblemente rápido y gratuito.
+    La instancia se comparte en todo el proceso para la misma combinación modelo/temperatura.
+    """
+    key = (model, float(temperature))
+    with _clients_lock:
+        llm = _clients.get(key)
+        if llm is None:
+            llm = _build_client(model, temperature)
+            # Tokens y llamadas de cada respuesta, atribuidos al nodo en curso (src/core/metrics.py)
+            llm.callbacks = [*(llm.callbacks or []), usage_callback]
+            _clients[key] = llm
+    return llm
+
+def reset_llm_pool():
+    """
+    Descarta los clientes cacheados (útil en benchmarks o al cambiar credenciales).
+    """
+    with _clients_lock:
+        _clients.clear()
+
+def set_llm_factory(factory=None):
+    """
+    Sustituye el constructor de clientes: `factory(model, temperature)` devuelve un modelo de
+    chat de LangChain. Con None se vuelve al proveedor de ITSM_LLM_PROVIDER. Vacía el pool,
+    pero las cadenas ya construidas del registro conservan su cliente: llamar a
+    registry.reset() si ya se precalentó el pipeline.
     """
-    return ChatGroq(model="llama-3.1-8b-instant", temperature=temperature)
+    global _factory
+    with _clients_lock:
+        _factory = factory
+        _clients.clear()
@@ -0,0 +1,276 @@
+"""
+Instrumentación del pipeline de IA y de las consultas de la API.
+
+- instrument_node() envuelve cada nodo del grafo y mide su tiempo, la espera hasta empezar
+  (cola del ticket o fin del nodo anterior), tokens de prompt y de respuesta, llamadas al
+  LLM, reintentos y aciertos de caché. Cada medición viaja en el estado (`ai_metrics`) y
+  save_ai_results() la guarda en ticket_ai_metrics junto con el resultado.
+- Los mismos datos alimentan histogramas y contadores en memoria del proceso, que la API
+  publica en formato Prometheus (GET /metrics), junto con db_timer() para las consultas de
+  los endpoints calientes.
+
+Los tokens los cuenta UsageCallback, que llm.get_llm() engancha a cada cliente: no hace
+falta tocar las cadenas de los agentes.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Precio por millón de tokens en USD (llama-3.1-8b-instant en Groq); ajustar al cambiar de modelo
+PRICE_INPUT_PER_M = float(os.getenv("ITSM_LLM_PRICE_INPUT", "0.05"))
+PRICE_OUTPUT_PER_M = float(os.getenv("ITSM_LLM_PRICE_OUTPUT", "0.08"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000)
+
+def _labels_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels_text(self.labels, key)} {value:g}")
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._value = 0.0
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self._value:g}"]
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {} # etiquetas -> [conteo por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_labels_text(self.labels, key, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels_text(self.labels, key, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels_text(self.labels, key)} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_labels_text(self.labels, key)} {series[-1]}")
+        return lines
+
+NODE_SECONDS = Histogram("itsm_ai_node_duration_seconds", "Tiempo de cada nodo del grafo de IA.", ("node",))
+NODE_QUEUE_SECONDS = Histogram("itsm_ai_node_queue_wait_seconds", "Espera hasta que el nodo empieza a ejecutarse.", ("node",))
+NODE_TOKENS = Histogram("itsm_ai_node_tokens", "Tokens por ejecución de nodo.", ("node", "kind"), TOKEN_BUCKETS)
+LLM_CALLS = Counter("itsm_ai_llm_calls_total", "Llamadas al LLM por nodo.", ("node",))
+NODE_RETRIES = Counter("itsm_ai_node_retries_total", "Reintentos de llamadas al LLM por nodo.", ("node",))
+CACHE_HITS = Counter("itsm_ai_cache_hits_total", "Tickets resueltos por la caché de resultados.", ("node",))
+NODE_ERRORS = Counter("itsm_ai_node_errors_total", "Ejecuciones de nodo que terminaron en excepción.", ("node",))
+LLM_COST = Counter("itsm_ai_llm_cost_usd_total", "Coste estimado del LLM en USD.", ("node",))
+DB_SECONDS = Histogram("itsm_db_query_duration_seconds", "Consultas SQLite de los endpoints calientes.", ("query",), DB_BUCKETS)
+# Gobernador de llamadas al LLM (src/core/governor.py)
+LLM_CONCURRENCY_LIMIT = Gauge("itsm_llm_concurrency_limit", "Límite AIMD de llamadas simultáneas al LLM.")
+LLM_IN_FLIGHT = Gauge("itsm_llm_in_flight", "Llamadas al LLM en curso.")
+LLM_BREAKER_OPEN = Gauge("itsm_llm_circuit_open", "1 si el circuit breaker del LLM está abierto.")
+LLM_RATE_LIMITED = Counter("itsm_llm_rate_limited_total", "Respuestas 429 del proveedor del LLM.")
+LLM_THROTTLE_SECONDS = Histogram("itsm_llm_throttle_wait_seconds", "Espera por concurrencia y token bucket antes de llamar al LLM.")
+# Tickets resueltos parecidos en el agente de soporte (src/core/retrieval.py)
+RETRIEVAL_USES = Counter("itsm_ai_retrieval_total", "Respuestas de soporte basadas en tickets resueltos parecidos.", ("mode",))
+RETRIEVAL_SAVED_TOKENS = Counter("itsm_ai_retrieval_saved_tokens_total", "Tokens estimados ahorrados frente a generar sin ayuda.", ("mode",))
+
+REGISTRY = [NODE_SECONDS, NODE_QUEUE_SECONDS, NODE_TOKENS, LLM_CALLS, NODE_RETRIES, CACHE_HITS, NODE_ERRORS, LLM_COST, DB_SECONDS,
+            LLM_CONCURRENCY_LIMIT, LLM_IN_FLIGHT, LLM_BREAKER_OPEN, LLM_RATE_LIMITED, LLM_THROTTLE_SECONDS,
+            RETRIEVAL_USES, RETRIEVAL_SAVED_TOKENS]
+
+def render() -> str:
+    """Todas las métricas del proceso en el formato de texto de Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def db_timer(query: str):
+    """Mide lo que tarda el bloque (una o varias consultas) en itsm_db_query_duration_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        DB_SECONDS.observe(time.perf_counter() - start, query=query)
+
+# ==== Medición por nodo ====
+
+class NodeMeter:
+    """Lo que acumula un nodo mientras se ejecuta (lo rellenan UsageCallback y record_retry)."""
+    __slots__ = ("prompt_tokens", "completion_tokens", "llm_calls", "retries")
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.retries = 0
+
+_current = ContextVar("itsm_node_meter", default=None)
+
+def record_retry():
+    """Anota un reintento de LLM en el nodo en curso (para quien implemente los reintentos)."""
+    meter = _current.get()
+    if meter is not None:
+        meter.retries += 1
+
+def current_tokens() -> int:
+    """Tokens (prompt + respuesta) que lleva el nodo en curso; 0 fuera de un nodo."""
+    meter = _current.get()
+    return meter.prompt_tokens + meter.completion_tokens if meter is not None else 0
+
+class UsageCallback(BaseCallbackHandler):
+    """
+    Suma llamadas y tokens de cada respuesta del LLM al nodo que la pidió. Los callbacks de
+    una invocación síncrona corren en el mismo hilo (y contexto) que el nodo.
+    """
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        meter = _current.get()
+        if meter is not None:
+            meter.llm_calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.on_chat_model_start(serialized, prompts, **kwargs)
+
+    def on_llm_end(self, response, **kwargs):
+        meter = _current.get()
+        if meter is None:
+            return
+        prompt = completion = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt += usage.get("input_tokens", 0)
+                    completion += usage.get("output_tokens", 0)
+        if not prompt and not completion:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        meter.prompt_tokens += prompt
+        meter.completion_tokens += completion
+
+    def on_retry(self, retry_state, **kwargs):
+        record_retry()
+
+usage_callback = UsageCallback()
+
+def cost_usd(prompt_tokens: int, completion_tokens: int) -> float:
+    return (prompt_tokens * PRICE_INPUT_PER_M + completion_tokens * PRICE_OUTPUT_PER_M) / 1_000_000
+
+def observe(entry: dict):
+    node = entry["node"]
+    NODE_SECONDS.observe(entry["wall_ms"] / 1000, node=node)
+    NODE_QUEUE_SECONDS.observe(entry["queue_wait_ms"] / 1000, node=node)
+    if entry["llm_calls"]:
+        LLM_CALLS.inc(entry["llm_calls"], node=node)
+        NODE_TOKENS.observe(entry["prompt_tokens"], node=node, kind="prompt")
+        NODE_TOKENS.observe(entry["completion_tokens"], node=node, kind="completion")
+        LLM_COST.inc(entry["cost_usd"], node=node)
+    if entry["retries"]:
+        NODE_RETRIES.inc(entry["retries"], node=node)
+    if entry["cache_hit"]:
+        CACHE_HITS.inc(node=node)
+    if entry.get("retrieval"):
+        RETRIEVAL_USES.inc(mode=entry["retrieval"])
+        saved = entry["baseline_tokens"] - entry["prompt_tokens"] - entry["completion_tokens"]
+        RETRIEVAL_SAVED_TOKENS.inc(max(0, saved), mode=entry["retrieval"])
+
+def instrument_node(name: str, fn):
+    """
+    Envuelve un nodo del grafo: además de su salida devuelve `ai_metrics: [medición]`, que el
+    estado acumula (ver TicketState) en el orden en que se ejecutan los nodos.
+    """
+    @functools.wraps(fn)
+    def node(state) -> dict:
+        started_at = time.time()
+        previous = state.get("ai_metrics") or []
+        ready_at = previous[-1]["finished_at"] if previous else (state.get("queued_at") or started_at)
+        meter = NodeMeter()
+        token = _current.set(meter)
+        start = time.perf_counter()
+        try:
+            update = fn(state) or {}
+        except Exception:
+            NODE_ERRORS.inc(node=name)
+            raise
+        finally:
+            _current.reset(token)
+        retrieval = update.get("retrieval") or {}
+        entry = {
+            "node": name,
+            "wall_ms": (time.perf_counter() - start) * 1000,
+            "queue_wait_ms": max(0.0, started_at - ready_at) * 1000,
+            "prompt_tokens": meter.prompt_tokens,
+            "completion_tokens": meter.completion_tokens,
+            "llm_calls": meter.llm_calls,
+            "retries": meter.retries,
+            "cache_hit": bool(update.get("cache_hit")),
+            "cost_usd": cost_usd(meter.prompt_tokens, meter.completion_tokens),
+            "retrieval": retrieval.get("mode"),
+            "retrieval_similarity": retrieval.get("similarity"),
+            "baseline_tokens": retrieval.get("baseline_tokens"),
+            "finished_at": time.time(),
+        }
+        observe(entry)
+        return {**update, "ai_metrics": [entry]}
+    return node
+
+def summarize(conn, since: str) -> list:
+    """Agregado por nodo de ticket_ai_metrics desde `since` (para el resumen de process_all)."""
+    return [dict(row) for row in conn.execute('''
+        SELECT node, COUNT(*) AS runs, AVG(wall_ms) AS avg_wall_ms, AVG(queue_wait_ms) AS avg_queue_wait_ms,
+               SUM(llm_calls) AS llm_calls, SUM(prompt_tokens) AS prompt_tokens,
+               SUM(completion_tokens) AS completion_tokens, SUM(retries) AS retries,
+               SUM(cache_hit) AS cache_hits, SUM(cost_usd) AS cost_usd
+        FROM ticket_ai_metrics WHERE created_at >= ?
+        GROUP BY node ORDER BY MIN(id)
+    ''', (since,))]
@@ -0,0 +1,452 @@
+"""
+Migraciones versionadas del esquema SQLite (data/tickets.db).
+
+La versión aplicada se guarda en `PRAGMA user_version`. Cada migración es aditiva
+(CREATE ... IF NOT EXISTS, índices, columnas nuevas): nunca borra datos, así que una BD
+existente creada por generate_tickets.py se actualiza en sitio.
+
+Uso (desde Reto-1/):
+    python -m src.core.migrations            # aplica las migraciones pendientes
+    python -m src.core.migrations --check    # además verifica los planes de las consultas calientes
+"""
+import argparse
+import sqlite3
+import sys
+
+# Pragmas por conexión. journal_mode=WAL es persistente en el fichero; el resto hay que
+# fijarlo en cada conexión nueva.
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL", # Lectores no bloquean al escritor (API + Streamlit + batch)
+    "PRAGMA synchronous = NORMAL", # Seguro con WAL; evita un fsync por commit
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -65536", # 64 MB de caché de páginas
+    "PRAGMA mmap_size = 268435456", # 256 MB mapeados en memoria
+    "PRAGMA temp_store = MEMORY",
+]
+
+def _counter_deltas(row: str, delta: int) -> str:
+    """
+    Sentencias de trigger que suman `delta` a los contadores de ticket_counters de la fila
+    `row` (NEW u OLD): total, por área del solicitante, por tipo y por técnico asignado.
+    """
+    upsert = "ON CONFLICT (dimension, bucket, status, priority) DO UPDATE SET total = total + excluded.total;"
+    return f'''
+        INSERT INTO ticket_counters (dimension, bucket, status, priority, total)
+        VALUES ('all', '', {row}.status, {row}.priority, {delta}) {upsert}
+        INSERT INTO ticket_counters (dimension, bucket, status, priority, total)
+        VALUES ('type', {row}.type, {row}.status, {row}.priority, {delta}) {upsert}
+        INSERT INTO ticket_counters (dimension, bucket, status, priority, total)
+        SELECT 'area', u.area, {row}.status, {row}.priority, {delta} FROM users u WHERE u.id = {row}.user_id {upsert}
+        INSERT INTO ticket_counters (dimension, bucket, status, priority, total)
+        SELECT 'staff', CAST({row}.assigned_to_id AS TEXT), {row}.status, {row}.priority, {delta}
+        WHERE {row}.assigned_to_id IS NOT NULL {upsert}
+    '''
+
+def _event_payload(row: str) -> str:
+    """json_object con los campos de un ticket que viajan en cada evento (sin textos largos)."""
+    return (
+        f"json_object('id', {row}.id, 'title', {row}.title, 'type', {row}.type, 'priority', {row}.priority, "
+        f"'status', {row}.status, 'assignedToId', {row}.assigned_to_id, 'updatedAt', {row}.updated_at)"
+    )
+
+MIGRATIONS = [
+    (1, "Esquema base: users, tickets, ticket_history", '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        puesto TEXT NOT NULL,
+        area TEXT NOT NULL,
+        role TEXT NOT NULL DEFAULT 'user', -- 'user', 'staff', 'admin'
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS tickets (
+        id TEXT PRIMARY KEY, -- ej: INC-000001
+        user_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT NOT NULL,
+        type TEXT NOT NULL, -- 'incident', 'request', 'problem'
+        priority TEXT NOT NULL, -- 'critical', 'high', 'medium', 'low'
+        status TEXT NOT NULL DEFAULT 'open', -- 'open', 'in-progress', 'resolved', 'closed'
+        assigned_to_id INTEGER,
+        ai_response TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id),
+        FOREIGN KEY (assigned_to_id) REFERENCES users(id)
+    );
+    CREATE TABLE IF NOT EXISTS ticket_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id TEXT NOT NULL,
+        action TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (ticket_id) REFERENCES tickets(id),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    );
+    '''),
+    (2, "Índices del esquema oficial y de las consultas calientes", '''
+    -- Los de Tablas_Estructura_HTML/database_schema.sql
+    CREATE INDEX IF NOT EXISTS idx_status_priority ON tickets (status, priority);
+    CREATE INDEX IF NOT EXISTS idx_type_status ON tickets (type, status);
+    -- Con id al final sirve al orden (created_at DESC, id DESC) de la paginación por cursor
+    CREATE INDEX IF NOT EXISTS idx_created_date ON tickets (created_at DESC, id DESC);
+    -- Listado filtrado por estado / asignado sin ordenar en memoria
+    CREATE INDEX IF NOT EXISTS idx_status_created ON tickets (status, created_at DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS idx_assignee_created ON tickets (assigned_to_id, created_at DESC, id DESC);
+    -- Backlog de IA (status = 'open' AND ai_response IS NULL): índice parcial, solo los pendientes
+    CREATE INDEX IF NOT EXISTS idx_pending_ai ON tickets (status, created_at) WHERE ai_response IS NULL;
+    -- Historial de un ticket ya ordenado por fecha
+    CREATE INDEX IF NOT EXISTS idx_history_ticket ON ticket_history (ticket_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_users_role ON users (role, id);
+    '''),
+    (3, "Cola de enriquecimiento IA (enrichment_jobs)", '''
+    CREATE TABLE IF NOT EXISTS enrichment_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'done', 'failed'
+        attempts INTEGER NOT NULL DEFAULT 0,
+        owner TEXT, -- host:pid del worker que lo ejecuta
+        lease_expires_at TEXT,
+        last_error TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        started_at TEXT,
+        finished_at TEXT,
+        FOREIGN KEY (ticket_id) REFERENCES tickets(id)
+    );
+    -- Reclamar el siguiente job y sondear su estado
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON enrichment_jobs (status, id);
+    CREATE INDEX IF NOT EXISTS idx_jobs_ticket ON enrichment_jobs (ticket_id);
+    '''),
+    (4, "Secuencias de IDs (INC-000001) en lugar de COUNT(*) + 1", '''
+    CREATE TABLE IF NOT EXISTS id_sequences (
+        name TEXT PRIMARY KEY,
+        next_value INTEGER NOT NULL
+    );
+    -- Arranca tras el mayor número ya usado (los IDs existentes pueden tener huecos)
+    INSERT OR IGNORE INTO id_sequences (name, next_value)
+    SELECT 'tickets', COALESCE(MAX(CAST(substr(id, 5) AS INTEGER)), 0) + 1 FROM tickets WHERE id LIKE 'INC-%';
+    '''),
+    (5, "Contadores de tickets mantenidos por triggers (reemplazan v_stats_by_area / v_staff_workload)", f'''
+    -- Una fila por (dimensión, valor, estado, prioridad). dimension: 'all', 'area', 'type', 'staff'
+    CREATE TABLE IF NOT EXISTS ticket_counters (
+        dimension TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        status TEXT NOT NULL,
+        priority TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dimension, bucket, status, priority)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_ticket_counters_insert AFTER INSERT ON tickets
+    BEGIN {_counter_deltas("NEW", 1)} END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_ticket_counters_delete AFTER DELETE ON tickets
+    BEGIN {_counter_deltas("OLD", -1)} END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_ticket_counters_update
+    AFTER UPDATE OF status, priority, type, assigned_to_id, user_id ON tickets
+    WHEN OLD.status IS NOT NEW.status OR OLD.priority IS NOT NEW.priority OR OLD.type IS NOT NEW.type
+      OR OLD.assigned_to_id IS NOT NEW.assigned_to_id OR OLD.user_id IS NOT NEW.user_id
+    BEGIN {_counter_deltas("OLD", -1)} {_counter_deltas("NEW", 1)} END;
+
+    -- Carga inicial desde los tickets existentes
+    DELETE FROM ticket_counters;
+    INSERT INTO ticket_counters (dimension, bucket, status, priority, total)
+    SELECT 'all', '', status, priority, COUNT(*) FROM tickets GROUP BY status, priority
+    UNION ALL
+    SELECT 'type', type, status, priority, COUNT(*) FROM tickets GROUP BY type, status, priority
+    UNION ALL
+    SELECT 'area', u.area, t.status, t.priority, COUNT(*) FROM tickets t JOIN users u ON u.id = t.user_id
+    GROUP BY u.area, t.status, t.priority
+    UNION ALL
+    SELECT 'staff', CAST(assigned_to_id AS TEXT), status, priority, COUNT(*) FROM tickets
+    WHERE assigned_to_id IS NOT NULL GROUP BY assigned_to_id, status, priority;
+    '''),
+    (6, "Índice por updated_at (token de cambios y lectura incremental)", '''
+    CREATE INDEX IF NOT EXISTS idx_updated ON tickets (updated_at);
+    '''),
+    (7, "Sincronización delta: índice (updated_at, id) y lápidas de tickets borrados", '''
+    -- Con id sirve también al orden de la paginación del modo delta (updated_at, id)
+    DROP INDEX IF EXISTS idx_updated;
+    CREATE INDEX IF NOT EXISTS idx_updated ON tickets (updated_at, id);
+    CREATE TABLE IF NOT EXISTS ticket_tombstones (
+        ticket_id TEXT PRIMARY KEY,
+        deleted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_tombstones_deleted ON ticket_tombstones (deleted_at);
+    CREATE TRIGGER IF NOT EXISTS trg_ticket_tombstone AFTER DELETE ON tickets
+    BEGIN
+        INSERT OR REPLACE INTO ticket_tombstones (ticket_id, deleted_at) VALUES (OLD.id, CURRENT_TIMESTAMP);
+    END;
+    -- Un ID reutilizado deja de estar borrado
+    CREATE TRIGGER IF NOT EXISTS trg_ticket_untombstone AFTER INSERT ON tickets
+    BEGIN
+        DELETE FROM ticket_tombstones WHERE ticket_id = NEW.id;
+    END;
+    '''),
+    (8, "Outbox de eventos de tickets (feed en vivo de GET /api/events)", f'''
+    -- El id autoincremental es el orden del feed y el Last-Event-ID de los clientes
+    CREATE TABLE IF NOT EXISTS ticket_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id TEXT NOT NULL,
+        kind TEXT NOT NULL, -- 'created', 'enriched', 'assigned', 'status', 'updated', 'deleted'
+        payload TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_created ON ticket_events (created_at);
+
+    CREATE TRIGGER IF NOT EXISTS trg_ticket_events_insert AFTER INSERT ON tickets
+    BEGIN
+        INSERT INTO ticket_events (ticket_id, kind, payload) VALUES (NEW.id, 'created', {_event_payload("NEW")});
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_ticket_events_update AFTER UPDATE ON tickets
+    BEGIN
+        INSERT INTO ticket_events (ticket_id, kind, payload) VALUES (NEW.id, CASE
+            WHEN OLD.ai_response IS NULL AND NEW.ai_response IS NOT NULL THEN 'enriched'
+            WHEN OLD.assigned_to_id IS NOT NEW.assigned_to_id THEN 'assigned'
+            WHEN OLD.status IS NOT NEW.status THEN 'status'
+            ELSE 'updated'
+        END, {_event_payload("NEW")});
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_ticket_events_delete AFTER DELETE ON tickets
+    BEGIN
+        INSERT INTO ticket_events (ticket_id, kind, payload) VALUES (OLD.id, 'deleted', json_object('id', OLD.id));
+    END;
+    '''),
+    (9, "Métricas por nodo del pipeline de IA (ticket_ai_metrics)", '''
+    CREATE TABLE IF NOT EXISTS ticket_ai_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id TEXT NOT NULL,
+        node TEXT NOT NULL, -- clasificador, priorizador, triaje, soporte, cache, reglas...
+        wall_ms REAL NOT NULL,
+        queue_wait_ms REAL NOT NULL, -- espera desde la cola / el nodo anterior hasta empezar
+        prompt_tokens INTEGER NOT NULL DEFAULT 0,
+        completion_tokens INTEGER NOT NULL DEFAULT 0,
+        llm_calls INTEGER NOT NULL DEFAULT 0,
+        retries INTEGER NOT NULL DEFAULT 0,
+        cache_hit INTEGER NOT NULL DEFAULT 0,
+        cost_usd REAL NOT NULL DEFAULT 0,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (ticket_id) REFERENCES tickets(id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_ai_metrics_ticket ON ticket_ai_metrics (ticket_id, id);
+    -- Resúmenes por periodo (process_all_tickets.py)
+    CREATE INDEX IF NOT EXISTS idx_ai_metrics_created ON ticket_ai_metrics (created_at);
+    '''),
+    (10, "Intentos de IA por ticket y dead-letter (ticket_ai_attempts)", '''
+    -- Solo tickets cuyo enriquecimiento falló alguna vez; la fila se borra al guardar el resultado
+    CREATE TABLE IF NOT EXISTS ticket_ai_attempts (
+        ticket_id TEXT PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        dead_letter INTEGER NOT NULL DEFAULT 0, -- 1: agotó ITSM_AI_MAX_ATTEMPTS, process_all ya no lo toma
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (ticket_id) REFERENCES tickets(id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_ai_attempts_dead ON ticket_ai_attempts (updated_at) WHERE dead_letter = 1;
+    '''),
+    (11, "Leases de tickets para varios process_all en paralelo (ticket_leases)", '''
+    -- Fuera de tickets a propósito: reclamar no debe disparar trg_ticket_events_update
+    -- (feed en vivo) ni tocar updated_at (ETag / sincronización por delta)
+    CREATE TABLE IF NOT EXISTS ticket_leases (
+        ticket_id TEXT PRIMARY KEY,
+        lease_owner TEXT NOT NULL, -- host:pid del proceso que lo enriquece
+        lease_expires_at TEXT NOT NULL, -- vencido, cualquier otro proceso lo puede reclamar
+        FOREIGN KEY (ticket_id) REFERENCES tickets(id)
+    ) WITHOUT ROWID;
+    '''),
+    (12, "Búsqueda de texto completo (FTS5 sobre title, description, ai_response)", '''
+    -- Contenido externo: el índice no duplica los textos, los lee de tickets por rowid.
+    -- remove_diacritics: "impresion" encuentra "impresión". Un VACUUM puede renumerar los
+    -- rowid de tickets (su clave es TEXT): después hay que reconstruir (src/core/search.py).
+    CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+        title, description, ai_response,
+        content = 'tickets', content_rowid = 'rowid',
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_insert AFTER INSERT ON tickets
+    BEGIN
+        INSERT INTO tickets_fts (rowid, title, description, ai_response)
+        VALUES (NEW.rowid, NEW.title, NEW.description, NEW.ai_response);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_delete AFTER DELETE ON tickets
+    BEGIN
+        INSERT INTO tickets_fts (tickets_fts, rowid, title, description, ai_response)
+        VALUES ('delete', OLD.rowid, OLD.title, OLD.description, OLD.ai_response);
+    END;
+    -- Solo cuando cambia el texto: asignar o cambiar de estado no toca el índice
+    CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_update AFTER UPDATE OF title, description, ai_response ON tickets
+    BEGIN
+        INSERT INTO tickets_fts (tickets_fts, rowid, title, description, ai_response)
+        VALUES ('delete', OLD.rowid, OLD.title, OLD.description, OLD.ai_response);
+        INSERT INTO tickets_fts (rowid, title, description, ai_response)
+        VALUES (NEW.rowid, NEW.title, NEW.description, NEW.ai_response);
+    END;
+    -- Tickets ya existentes
+    INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild');
+    '''),
+    (13, "Recuperación de tickets resueltos en el agente de soporte (columnas de ticket_ai_metrics)", '''
+    -- reuse / few_shot; NULL si el nodo generó sin ayuda (o no es el de soporte)
+    ALTER TABLE ticket_ai_metrics ADD COLUMN retrieval TEXT;
+    ALTER TABLE ticket_ai_metrics ADD COLUMN retrieval_similarity REAL;
+    -- Tokens estimados de la misma respuesta generada sin ayuda (src/core/retrieval.py)
+    ALTER TABLE ticket_ai_metrics ADD COLUMN baseline_tokens INTEGER;
+    '''),
+    (14, "Clave entera estable para el índice de búsqueda (VACUUM renumera los rowid de tickets)", '''
+    -- tickets_fts se indexaba por el rowid de tickets, que VACUUM puede renumerar (la clave de
+    -- tickets es TEXT) y dejar el índice apuntando a otros tickets. Ahora cada ticket tiene un
+    -- `doc` propio con INTEGER PRIMARY KEY, que VACUUM conserva; se asigna en orden de
+    -- creación, así que el doc más alto sigue siendo el ticket más reciente.
+    DROP TRIGGER IF EXISTS trg_tickets_fts_insert;
+    DROP TRIGGER IF EXISTS trg_tickets_fts_delete;
+    DROP TRIGGER IF EXISTS trg_tickets_fts_update;
+    DROP TABLE IF EXISTS tickets_fts;
+    CREATE TABLE IF NOT EXISTS ticket_search_docs (
+        doc INTEGER PRIMARY KEY,
+        ticket_id TEXT NOT NULL UNIQUE
+    );
+    INSERT INTO ticket_search_docs (ticket_id) SELECT id FROM tickets ORDER BY created_at, id;
+    -- Contenido externo del índice: los textos siguen leyéndose de tickets, ahora por doc
+    CREATE VIEW IF NOT EXISTS tickets_fts_content AS
+        SELECT d.doc, t.title, t.description, t.ai_response
+        FROM ticket_search_docs d JOIN tickets t ON t.id = d.ticket_id;
+    CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+        title, description, ai_response,
+        content = 'tickets_fts_content', content_rowid = 'doc',
+        tokenize = 'unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_insert AFTER INSERT ON tickets
+    BEGIN
+        INSERT INTO ticket_search_docs (ticket_id) VALUES (NEW.id);
+        INSERT INTO tickets_fts (rowid, title, description, ai_response)
+        VALUES (last_insert_rowid(), NEW.title, NEW.description, NEW.ai_response);
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_delete AFTER DELETE ON tickets
+    BEGIN
+        INSERT INTO tickets_fts (tickets_fts, rowid, title, description, ai_response)
+        SELECT 'delete', doc, OLD.title, OLD.description, OLD.ai_response
+        FROM ticket_search_docs WHERE ticket_id = OLD.id;
+        DELETE FROM ticket_search_docs WHERE ticket_id = OLD.id;
+    END;
+    -- Solo cuando cambia el texto: asignar o cambiar de estado no toca el índice
+    CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_update AFTER UPDATE OF title, description, ai_response ON tickets
+    BEGIN
+        INSERT INTO tickets_fts (tickets_fts, rowid, title, description, ai_response)
+        SELECT 'delete', doc, OLD.title, OLD.description, OLD.ai_response
+        FROM ticket_search_docs WHERE ticket_id = OLD.id;
+        INSERT INTO tickets_fts (rowid, title, description, ai_response)
+        SELECT doc, NEW.title, NEW.description, NEW.ai_response
+        FROM ticket_search_docs WHERE ticket_id = NEW.id;
+    END;
+    INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild');
+    '''),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Consultas de las rutas calientes que no deben recorrer tablas completas
+HOT_QUERIES = [
+    ("get_ticket", "SELECT t.id FROM tickets t JOIN users u ON t.user_id = u.id LEFT JOIN users a ON t.assigned_to_id = a.id WHERE t.id = ?", ("INC-000001",)),
+    ("ticket_history", "SELECT h.timestamp, h.action, u.name FROM ticket_history h JOIN users u ON h.user_id = u.id WHERE h.ticket_id = ? ORDER BY h.timestamp ASC", ("INC-000001",)),
+    ("pending_ai", "SELECT t.* FROM tickets t WHERE t.status = 'open' AND t.ai_response IS NULL AND NOT EXISTS (SELECT 1 FROM ticket_ai_attempts a WHERE a.ticket_id = t.id AND a.dead_letter = 1)", ()),
+    ("dead_letter", "SELECT ticket_id FROM ticket_ai_attempts WHERE dead_letter = 1 ORDER BY updated_at", ()),
+    ("list_first_page", "SELECT t.id FROM tickets t ORDER BY t.created_at DESC, t.id DESC LIMIT 100", ()),
+    ("list_next_page", "SELECT t.id FROM tickets t WHERE (t.created_at, t.id) < (?, ?) ORDER BY t.created_at DESC, t.id DESC LIMIT 100", ("2024-01-01 00:00:00", "INC-000001")),
+    ("list_by_status", "SELECT t.id FROM tickets t WHERE t.status IN (?) ORDER BY t.created_at DESC, t.id DESC LIMIT 100", ("open",)),
+    ("list_by_assignee", "SELECT t.id FROM tickets t WHERE t.assigned_to_id = ? ORDER BY t.created_at DESC, t.id DESC LIMIT 100", (2,)),
+    ("change_token", "SELECT MAX(updated_at) FROM tickets", ()),
+    ("changed_since", "SELECT t.id FROM tickets t JOIN users u ON t.user_id = u.id WHERE t.updated_at >= ?", ("2024-01-01 00:00:00",)),
+    ("delta_page", "SELECT t.id FROM tickets t WHERE t.updated_at >= ? AND (t.updated_at, t.id) > (?, ?) ORDER BY t.updated_at ASC, t.id ASC LIMIT 100", ("2024-01-01 00:00:00", "2024-01-01 00:00:00", "INC-000001")),
+    ("deleted_since", "SELECT ticket_id, deleted_at FROM ticket_tombstones WHERE deleted_at >= ? ORDER BY deleted_at", ("2024-01-01 00:00:00",)),
+    ("events_after", "SELECT id, ticket_id, kind, payload FROM ticket_events WHERE id > ? ORDER BY id LIMIT 500", (0,)),
+    ("staff", "SELECT id, name, email, puesto, area, role FROM users WHERE role IN ('staff', 'admin')", ()),
+    ("claim_ticket_jobs", "SELECT 1 FROM enrichment_jobs j WHERE j.ticket_id = ? AND j.status IN ('queued', 'running')", ("INC-000001",)),
+    ("claim_job", "SELECT id FROM enrichment_jobs WHERE status = 'queued' ORDER BY id LIMIT 1", ()),
+]
+
+def apply_pragmas(conn):
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
+def current_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, verbose: bool = False) -> int:
+    """
+    Aplica en orden las migraciones pendientes, cada una en su propia transacción junto con
+    el salto de user_version. Retorna la versión final del esquema.
+    """
+    version = current_version(conn)
+    for target, description, sql in MIGRATIONS:
+        if target <= version:
+            continue
+        try:
+            conn.executescript(f"BEGIN IMMEDIATE;\n{sql}\nPRAGMA user_version = {target};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        version = target
+        if verbose:
+            print(f"Migración {target} aplicada: {description}")
+    return version
+
+def ensure_schema(conn):
+    """Deja la BD en la última versión del esquema (barato si ya lo está)."""
+    if current_version(conn) < LATEST_VERSION:
+        migrate(conn)
+
+# Recorrer una tabla de menos filas es lo que elige el planificador con estadísticas (ANALYZE)
+# y es más barato que ir por un índice que no cubre la consulta: no cuenta como escaneo
+SMALL_TABLE_ROWS = 1000
+
+def _is_small_table(conn, name: str) -> bool:
+    """True si `name` es una tabla (no un alias de la consulta) con menos de SMALL_TABLE_ROWS filas."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is None:
+        return False
+    return conn.execute(f'SELECT COUNT(*) FROM (SELECT 1 FROM "{name}" LIMIT {SMALL_TABLE_ROWS})').fetchone()[0] < SMALL_TABLE_ROWS
+
+def check_query_plans(conn) -> list:
+    """
+    EXPLAIN QUERY PLAN de cada consulta caliente. Retorna [(nombre, detalle)] de los pasos que
+    recorren una tabla entera ("SCAN tabla" sin índice, salvo tablas pequeñas) u ordenan en un
+    B-tree temporal.
+    """
+    offenders = []
+    for name, sql, params in HOT_QUERIES:
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall():
+            detail = row[3]
+            full_scan = detail.startswith("SCAN") and "USING" not in detail
+            if full_scan and _is_small_table(conn, detail.split()[1]):
+                continue
+            if full_scan or "TEMP B-TREE" in detail:
+                offenders.append((name, detail))
+    return offenders
+
+def main():
+    from src.core.repository import DB_PATH # Import diferido: repository depende de este módulo
+    parser = argparse.ArgumentParser(description="Migraciones del esquema SQLite del ITSM.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--check", action="store_true", help="Verificar con EXPLAIN QUERY PLAN que ninguna consulta caliente escanea")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    apply_pragmas(conn)
+    before = current_version(conn)
+    after = migrate(conn, verbose=True)
+    print(f"Esquema en versión {after} (antes {before}).")
+
+    if args.check:
+        offenders = check_query_plans(conn)
+        for name, detail in offenders:
+            print(f"  [SCAN] {name}: {detail}")
+        print("Planes OK: ninguna consulta caliente escanea tablas." if not offenders else f"{len(offenders)} pasos con escaneo.")
+        conn.close()
+        sys.exit(1 if offenders else 0)
+    conn.close()
+
+if __name__ == '__main__':
+    main()
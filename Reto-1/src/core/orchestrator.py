@@ -1,45 +1,141 @@
+import os
+import time
 from langgraph.graph import StateGraph, END
 from src.core.state import TicketState
 from src.agents.classifier import classifier_node
 from src.agents.prioritizer import prioritizer_node
 from src.agents.support import support_node
+from src.agents.triage import triage_node
+from src.core.cache import CACHE_ENABLED, make_cache_nodes
+from src.core.dedup import DEDUP_ENABLED, dedup_node
+from src.core.rules import RULES_ENABLED, rules_node
+from src.core.registry import get_graph
+from src.core.metrics import instrument_node
+from src.core import checkpoints
+from src.core.checkpoints import CHECKPOINTS_ENABLED
 
-def build_graph():
+# Modo del pipeline por despliegue:
+# - "split": clasificador -> priorizador -> soporte (dos llamadas de triaje, comportamiento original)
+# - "fused": triaje -> soporte (tipo y prioridad en una única llamada estructurada)
+PIPELINE_MODES = ("split", "fused")
+PIPELINE_MODE = os.getenv("ITSM_PIPELINE_MODE", "split")
+
+def build_graph(mode: str = None, cache: bool = None, dedup: bool = None, rules: bool = None, checkpoint: bool = None):
     """
     Construye la máquina de estados que orquesta a los agentes para el flujo del ticket.
+    Con `checkpoint` el estado se guarda tras cada nodo (src/core/checkpoints.py) y cada
+    invocación necesita su thread_id: usar process_ticket / aprocess_ticket o run_config().
     """
+    mode = mode or PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"ITSM_PIPELINE_MODE desconocido: {mode!r} (opciones: {', '.join(PIPELINE_MODES)})")
+    
     graph = StateGraph(TicketState)
+    # Cada nodo se registra envuelto por instrument_node (tiempos, tokens... en state['ai_metrics'])
+    def add_node(name, node):
+        graph.add_node(name, instrument_node(name, node))
     
     # Añadir nodos (nuestros agentes)
-    graph.add_node("clasificador", classifier_node)
-    graph.add_node("priorizador", prioritizer_node)
-    graph.add_node("soporte", support_node)
+    if mode == "fused":
+        add_node("triaje", triage_node)
+        first_agent = "triaje"
+    else:
+        add_node("clasificador", classifier_node)
+        add_node("priorizador", prioritizer_node)
+        first_agent = "clasificador"
+    add_node("soporte", support_node)
     
     # Definir el flujo (edges) secuencial
-    graph.set_entry_point("clasificador")
-    graph.add_edge("clasificador", "priorizador")
-    graph.add_edge("priorizador", "soporte")
-    graph.add_edge("soporte", END)
+    if mode == "fused":
+        graph.add_edge("triaje", "soporte")
+    else:
+        graph.add_edge("clasificador", "priorizador")
+        graph.add_edge("priorizador", "soporte")
+    
+    cache = CACHE_ENABLED if cache is None else cache
+    dedup = DEDUP_ENABLED if dedup is None else dedup
+    rules = RULES_ENABLED if rules is None else rules
+    
+    if rules:
+        # Pre-clasificador local: los agentes de triaje se saltan el LLM si es concluyente
+        add_node("reglas", rules_node)
+        graph.add_edge("reglas", first_agent)
+        first_agent = "reglas"
+    
+    # Atajos previos a los agentes: si uno resuelve el ticket, el grafo termina sin llamar al LLM
+    # - cache: mismo texto normalizado ya procesado (caché de resultados del LLM)
+    # - duplicados: reporte casi idéntico a un ticket enriquecido recientemente (MinHash/LSH)
+    shortcuts = []
+    if cache:
+        cache_lookup_node, cache_store_node = make_cache_nodes(mode, rules)
+        shortcuts.append(("cache", cache_lookup_node, "cache_hit"))
+    if dedup:
+        shortcuts.append(("duplicados", dedup_node, "parent_ticket_id"))
+    
+    entry = first_agent
+    for name, node, resolved_flag in reversed(shortcuts):
+        add_node(name, node)
+        graph.add_conditional_edges(
+            name, lambda state, flag=resolved_flag, next_node=entry: END if state.get(flag) else next_node
+        )
+        entry = name
+    graph.set_entry_point(entry)
+    
+    if cache:
+        # Un fallo de caché guarda el resultado completo al final
+        add_node("guardar_cache", cache_store_node)
+        graph.add_edge("soporte", "guardar_cache")
+        graph.add_edge("guardar_cache", END)
+    else:
+        graph.add_edge("soporte", END)
     
     # Compilar el grafo en una aplicación ejecutable
-    app = graph.compile()
+    checkpoint = CHECKPOINTS_ENABLED if checkpoint is None else checkpoint
+    app = graph.compile(checkpointer=checkpoints.get_checkpointer() if checkpoint else None)
     return app
 
-def process_ticket(ticket_data: dict) -> dict:
+def build_initial_state(ticket_data: dict) -> dict:
     """
-    Toma un diccionario con los datos base de un ticket y lo pasa por la IA.
-    Retorna el estado final enriquecido.
+    Traduce una fila/diccionario de ticket al estado inicial del grafo.
     """
-    app = build_graph()
-    
-    initial_state = {
+    return {
         "ticket_id": ticket_data.get("id"),
         "user_id": ticket_data.get("user_id", 0),
         "title": ticket_data.get("title", ""),
         "description": ticket_data.get("description", ""),
+        "queued_at": ticket_data.get("queued_at") or time.time(),
+        "ai_metrics": [],
         "messages": []
     }
+
+def run_config(ticket_id: str):
+    """Config de invocación del grafo: el hilo de checkpoints del ticket (None si están desactivados)."""
+    return checkpoints.thread_config(ticket_id) if CHECKPOINTS_ENABLED else None
+
+def process_ticket(ticket_data: dict) -> dict:
+    """
+    Toma un diccionario con los datos base de un ticket y lo pasa por la IA.
+    Si una ejecución anterior del mismo ticket se quedó a medias, continúa desde el último
+    nodo completado. Retorna el estado final enriquecido.
+    """
+    # El grafo se compila una sola vez por proceso (ver src/core/registry.py)
+    app = get_graph()
+    state = build_initial_state(ticket_data)
+    config = run_config(state["ticket_id"])
+    if config:
+        state = checkpoints.resume_input(app.get_state(config), state)
     
     # Invocamos la máquina de estados de forma síncrona
-    final_state = app.invoke(initial_state)
+    final_state = app.invoke(state, config)
     return final_state
+
+async def aprocess_ticket(ticket_data: dict) -> dict:
+    """
+    Variante asíncrona de process_ticket para procesar muchos tickets en paralelo.
+    """
+    app = get_graph()
+    state = build_initial_state(ticket_data)
+    config = run_config(state["ticket_id"])
+    if config:
+        state = checkpoints.resume_input(await app.aget_state(config), state)
+    return await app.ainvoke(state, config)
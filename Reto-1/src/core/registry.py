@@ -0,0 +1,68 @@
+import threading
+
+# Registro de proceso con los artefactos caros del pipeline de IA: el grafo compilado
+# y las cadenas (prompt | llm) de cada agente. Se construyen una sola vez y se comparten
+# entre tickets, hilos del threadpool de FastAPI y reruns de Streamlit.
+_lock = threading.RLock()
+_graphs = {}
+_chain_factories = {}
+_chains = {}
+
+def register_chain(name: str, factory):
+    """
+    Declara la función que construye la cadena de un agente. Se invoca al importar el agente.
+    """
+    with _lock:
+        _chain_factories[name] = factory
+
+def get_chain(name: str):
+    """
+    Devuelve la cadena ya construida del agente `name`, creándola la primera vez.
+    """
+    chain = _chains.get(name)
+    if chain is None:
+        with _lock:
+            chain = _chains.get(name)
+            if chain is None:
+                chain = _chain_factories[name]()
+                _chains[name] = chain
+    return chain
+
+def get_graph(mode: str = None):
+    """
+    Devuelve el grafo de LangGraph compilado una única vez por proceso (y por modo).
+    """
+    from src.core.orchestrator import PIPELINE_MODE
+    mode = mode or PIPELINE_MODE
+    graph = _graphs.get(mode)
+    if graph is None:
+        with _lock:
+            graph = _graphs.get(mode)
+            if graph is None:
+                from src.core.orchestrator import build_graph
+                graph = build_graph(mode)
+                _graphs[mode] = graph
+    return graph
+
+def warmup(strict: bool = False):
+    """
+    Compila el grafo y construye todas las cadenas registradas (y con ellas los clientes LLM).
+    Pensado para llamarse al arrancar la API o Streamlit; sin `strict` un fallo (p. ej. falta
+    GROQ_API_KEY) se informa y el proceso sigue arrancando como antes.
+    """
+    try:
+        get_graph()
+        for name in list(_chain_factories):
+            get_chain(name)
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Aviso: no se pudo precalentar el pipeline de IA: {e}")
+
+def reset():
+    """
+    Olvida el grafo y las cadenas construidas. Las fábricas registradas se conservan.
+    """
+    with _lock:
+        _graphs.clear()
+        _chains.clear()
@@ -0,0 +1,488 @@
+"""
+Capa de acceso a datos compartida por la API (threadpool de FastAPI), Streamlit, los workers
+de la cola y process_all_tickets.py.
+
+Todas las conexiones a data/tickets.db salen de un pool acotado: se abren una sola vez, con
+los pragmas ya aplicados y su caché de sentencias preparadas, y se reutilizan entre peticiones.
+Las consultas frecuentes viven aquí como constantes para que el texto SQL sea siempre el mismo
+y la caché de sentencias de cada conexión acierte.
+
+Uso:
+    with repository.connection() as conn:      # lectura
+        ticket = repository.get_ticket(conn, "INC-000001")
+    with repository.transaction() as conn:     # escritura (commit al salir, rollback si falla)
+        repository.add_history(conn, "INC-000001", "Comentario", user_id)
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Optional, TypedDict
+
+from src.core.migrations import apply_pragmas, ensure_schema
+
+# Ruta absoluta (Reto-1/data/tickets.db): no depende del directorio desde el que se lance
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+DB_PATH = os.getenv("ITSM_DB_PATH", os.path.join(BASE_DIR, 'data', 'tickets.db'))
+
+# Conexiones máximas abiertas a la vez por proceso. Si se agotan, quien pide una espera hasta
+# POOL_TIMEOUT segundos en lugar de abrir más (SQLite admite un solo escritor de todos modos).
+POOL_SIZE = int(os.getenv("ITSM_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("ITSM_DB_POOL_TIMEOUT", "10"))
+# Sentencias preparadas que conserva cada conexión (por defecto sqlite3 guarda 128)
+STATEMENT_CACHE_SIZE = 256
+# IDs de ticket que cada proceso reserva de una vez. Varios procesos (workers de la API,
+# Streamlit, importadores) toman rangos distintos sin esperarse; los números de un bloque no
+# usado antes de reiniciar se pierden (huecos en la numeración, nunca duplicados).
+TICKET_ID_BLOCK = int(os.getenv("ITSM_TICKET_ID_BLOCK", "10"))
+
+class User(TypedDict):
+    id: int
+    name: str
+    email: str
+    puesto: str
+    area: str
+    role: str
+
+class TicketDetail(TypedDict):
+    id: str
+    title: str
+    description: str
+    type: str
+    priority: str
+    status: str
+    ai_response: Optional[str]
+    createdAt: str
+    updatedAt: str
+    user_name: str
+    user_email: str
+    user_area: str
+    user_puesto: str
+    assigned_name: Optional[str]
+    assigned_email: Optional[str]
+    assigned_puesto: Optional[str]
+
+class HistoryEntry(TypedDict):
+    timestamp: str
+    action: str
+    user: str
+
+def connect(path: str = None) -> sqlite3.Connection:
+    """
+    Abre una conexión nueva con los pragmas del proyecto. El pool la usa para crear las suyas;
+    llamarla directamente solo para scripts que recrean la BD (generate_tickets.py).
+    """
+    conn = sqlite3.connect(
+        path or DB_PATH, timeout=30, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE
+    )
+    conn.row_factory = sqlite3.Row
+    apply_pragmas(conn)
+    return conn
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones SQLite, seguro entre hilos. Cada conexión la usa un solo hilo
+    a la vez (el que la tomó), por eso se abren con check_same_thread=False.
+    """
+    def __init__(self, path: str = DB_PATH, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue() # LIFO: se reutiliza la conexión con la caché más caliente
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                open_new = True
+            else:
+                open_new = False
+        if open_new:
+            try:
+                return connect(self.path)
+            except sqlite3.Error:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"Pool de conexiones agotado: {self.size} en uso durante más de {self.timeout:.0f}s"
+            )
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            # Nunca devolver al pool una transacción a medias de otro hilo
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self):
+        """Cierra las conexiones libres (las que están en uso se cierran al devolverlas al GC)."""
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+@contextmanager
+def connection():
+    """Conexión del pool para el bloque `with`; se devuelve al salir (sin commit)."""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+@contextmanager
+def transaction():
+    """Conexión del pool en una transacción: commit al salir del bloque, rollback si falla."""
+    with connection() as conn:
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+def init_db():
+    """Lleva la BD a la última versión del esquema. Llamar una vez al arrancar cada proceso."""
+    with connection() as conn:
+        ensure_schema(conn)
+
+def to_epoch(value) -> Optional[float]:
+    """
+    Epoch de un timestamp de la BD: CURRENT_TIMESTAMP de SQLite o ISO 8601 (con "T",
+    fracciones de segundo o zona; sin zona se asume UTC). None si falta o no se puede
+    interpretar: cada llamador decide qué hacer con una fecha ilegible.
+    """
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+# ==== USUARIOS ====
+
+SQL_USERS = "SELECT id, name, email, puesto, area, role FROM users"
+SQL_USERS_BY_ROLE = "SELECT id, name, email, puesto, area, role FROM users WHERE role IN ({})"
+SQL_USER_NAME = "SELECT name FROM users WHERE id = ?"
+
+def list_users(conn, roles: tuple = None) -> List[User]:
+    if not roles:
+        return [dict(row) for row in conn.execute(SQL_USERS)]
+    query = SQL_USERS_BY_ROLE.format(", ".join("?" * len(roles)))
+    return [dict(row) for row in conn.execute(query, tuple(roles))]
+
+def user_areas(conn) -> dict:
+    """{id de usuario: área}, para puntuar tickets sin un JOIN por fila."""
+    return {row['id']: row['area'] for row in conn.execute("SELECT id, area FROM users")}
+
+def get_user_name(conn, user_id: int) -> Optional[str]:
+    row = conn.execute(SQL_USER_NAME, (user_id,)).fetchone()
+    return row['name'] if row else None
+
+# ==== TICKETS ====
+
+SQL_TICKET_DETAIL = """
+    SELECT
+        t.id, t.title, t.description, t.type, t.priority, t.status,
+        t.ai_response, t.created_at as createdAt, t.updated_at as updatedAt,
+        u.name as user_name, u.email as user_email, u.area as user_area, u.puesto as user_puesto,
+        a.name as assigned_name, a.email as assigned_email, a.puesto as assigned_puesto
+    FROM tickets t
+    JOIN users u ON t.user_id = u.id
+    LEFT JOIN users a ON t.assigned_to_id = a.id
+    WHERE t.id = ?
+"""
+SQL_TICKET_ROW = "SELECT * FROM tickets WHERE id = ?"
+SQL_TICKET_EXISTS = "SELECT 1 FROM tickets WHERE id = ?"
+SQL_PENDING_AI = """
+    SELECT t.* FROM tickets t
+    WHERE t.status = 'open' AND t.ai_response IS NULL
+      AND NOT EXISTS (SELECT 1 FROM ticket_ai_attempts a WHERE a.ticket_id = t.id AND a.dead_letter = 1)
+"""
+SQL_INSERT_TICKET = """
+    INSERT INTO tickets (id, user_id, title, description, type, priority, status)
+    VALUES (?, ?, ?, ?, 'incident', 'low', 'open')
+"""
+SQL_UPDATE_STATUS = "UPDATE tickets SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+SQL_UPDATE_ASSIGNEE = "UPDATE tickets SET assigned_to_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?"
+
+SQL_LAST_UPDATE = "SELECT MAX(updated_at) FROM tickets"
+# Último id asignado en ticket_events: a diferencia de MAX(id), no retrocede al podar el outbox
+SQL_EVENT_SEQUENCE = "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'ticket_events'), 0)"
+SQL_TICKET_TOTAL = "SELECT COALESCE(SUM(total), 0) FROM ticket_counters WHERE dimension = 'all'"
+
+def change_token(conn) -> tuple:
+    """
+    Huella barata del estado de la tabla tickets: (último updated_at, versión, total de
+    tickets). La versión es el contador de ticket_events, que los triggers incrementan en cada
+    alta, cambio o baja: es monótona, a diferencia de updated_at (resolución de segundos, dos
+    cambios en el mismo segundo darían la misma huella). updated_at y el total cubren las
+    cargas masivas de generate_tickets.py, que se hacen sin triggers. Son una búsqueda en
+    idx_updated y dos lecturas de filas sueltas; no recorre la tabla. Si no cambia, nada de
+    lo listado ha cambiado.
+    """
+    last_update = conn.execute(SQL_LAST_UPDATE).fetchone()[0]
+    version = conn.execute(SQL_EVENT_SEQUENCE).fetchone()[0]
+    total = conn.execute(SQL_TICKET_TOTAL).fetchone()[0]
+    return last_update, version, total
+
+SQL_DELETED_SINCE = "SELECT ticket_id, deleted_at FROM ticket_tombstones WHERE deleted_at >= ? ORDER BY deleted_at"
+
+def deleted_since(conn, since: str) -> list:
+    """Lápidas de los tickets borrados desde `since` (para clientes que sincronizan por delta)."""
+    return [{"id": row['ticket_id'], "deletedAt": row['deleted_at']} for row in conn.execute(SQL_DELETED_SINCE, (since,))]
+
+def get_ticket(conn, ticket_id: str) -> Optional[TicketDetail]:
+    """Ticket con los datos del solicitante y del técnico asignado (None si no existe)."""
+    row = conn.execute(SQL_TICKET_DETAIL, (ticket_id,)).fetchone()
+    return dict(row) if row else None
+
+def get_ticket_row(conn, ticket_id: str) -> Optional[sqlite3.Row]:
+    """Fila cruda de la tabla tickets (la que consume el grafo de IA)."""
+    return conn.execute(SQL_TICKET_ROW, (ticket_id,)).fetchone()
+
+def ticket_exists(conn, ticket_id: str) -> bool:
+    return conn.execute(SQL_TICKET_EXISTS, (ticket_id,)).fetchone() is not None
+
+def pending_ai_tickets(conn) -> List[sqlite3.Row]:
+    """Tickets abiertos que aún no tienen enriquecimiento de IA (salvo los que están en dead-letter)."""
+    return conn.execute(SQL_PENDING_AI).fetchall()
+
+def insert_ticket(conn, user_id: int, title: str, description: str) -> str:
+    """
+    Inserta el ticket base (aún sin IA) y su primer registro de historial. No hace commit.
+    Retorna el ID asignado.
+    """
+    ticket_id = allocate_ticket_id()
+    conn.execute(SQL_INSERT_TICKET, (ticket_id, user_id, title, description))
+    add_history(conn, ticket_id, 'Ticket reportado vía Portal', user_id)
+    return ticket_id
+
+def update_status(conn, ticket_id: str, status: str):
+    conn.execute(SQL_UPDATE_STATUS, (status, ticket_id))
+
+def update_assignee(conn, ticket_id: str, assigned_to_id: int):
+    conn.execute(SQL_UPDATE_ASSIGNEE, (assigned_to_id, ticket_id))
+
+# ==== IDS DE TICKET ====
+
+SQL_RESERVE_IDS = "UPDATE id_sequences SET next_value = next_value + ? WHERE name = ? RETURNING next_value"
+
+def format_ticket_id(number: int) -> str:
+    return f"INC-{str(number).zfill(6)}"
+
+def reserve_ids(conn, count: int, sequence: str = 'tickets') -> range:
+    """
+    Reserva `count` números consecutivos de la secuencia con un único UPDATE (O(1), sin
+    COUNT(*)). No hace commit: el rango es válido dentro de la transacción del llamador, que
+    es como lo usan los importadores masivos (reservar, insertar en lote, commit).
+    """
+    rows = conn.execute(SQL_RESERVE_IDS, (count, sequence)).fetchall()
+    if not rows:
+        raise LookupError(f"Secuencia '{sequence}' no existe (¿falta aplicar migraciones?)")
+    end = rows[0][0]
+    return range(end - count, end)
+
+class TicketIdAllocator:
+    """
+    Reparte IDs INC-xxxxxx desde un bloque reservado por el proceso. Solo toca la BD al
+    agotarse el bloque, en una transacción propia y corta, así que crear tickets en paralelo
+    no serializa a los creadores sobre la secuencia. Usa su propia conexión, no una del pool:
+    quien pide un ID suele tener ya una conexión del pool tomada y no debe esperar por otra.
+    """
+    def __init__(self, block_size: int = TICKET_ID_BLOCK, path: str = None):
+        self.block_size = max(1, block_size)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._block = iter(())
+
+    def next_id(self) -> str:
+        with self._lock:
+            number = next(self._block, None)
+            if number is None:
+                if self._conn is None:
+                    self._conn = connect(self.path)
+                try:
+                    self._block = iter(reserve_ids(self._conn, self.block_size))
+                    self._conn.commit()
+                except BaseException:
+                    self._conn.rollback()
+                    raise
+                number = next(self._block)
+        return format_ticket_id(number)
+
+_allocator = TicketIdAllocator()
+
+def allocate_ticket_id() -> str:
+    """
+    Siguiente ID de ticket libre. Llamarla antes de escribir en la transacción del llamador:
+    si el bloque se agota, la reserva es otra transacción y esperaría a ese mismo escritor.
+    """
+    return _allocator.next_id()
+
+# ==== EVENTOS (outbox ticket_events, migración 8) ====
+
+SQL_EVENTS_AFTER = "SELECT id, ticket_id, kind, payload FROM ticket_events WHERE id > ? ORDER BY id LIMIT ?"
+SQL_LAST_EVENT = "SELECT COALESCE(MAX(id), 0) FROM ticket_events"
+SQL_PRUNE_EVENTS = "DELETE FROM ticket_events WHERE created_at < ?"
+
+def events_after(conn, after_id: int, limit: int) -> list:
+    return [dict(row) for row in conn.execute(SQL_EVENTS_AFTER, (after_id, limit))]
+
+def last_event_id(conn) -> int:
+    return conn.execute(SQL_LAST_EVENT).fetchone()[0]
+
+def prune_events(conn, before: str) -> int:
+    """Borra los eventos anteriores a `before` (no hace commit). Retorna cuántos."""
+    return conn.execute(SQL_PRUNE_EVENTS, (before,)).rowcount
+
+# ==== HISTORIAL ====
+
+SQL_HISTORY = """
+    SELECT h.timestamp, h.action, u.name as user
+    FROM ticket_history h
+    JOIN users u ON h.user_id = u.id
+    WHERE h.ticket_id = ?
+    ORDER BY h.timestamp ASC
+"""
+SQL_INSERT_HISTORY = "INSERT INTO ticket_history (ticket_id, action, user_id) VALUES (?, ?, ?)"
+
+def get_history(conn, ticket_id: str) -> List[HistoryEntry]:
+    return [dict(row) for row in conn.execute(SQL_HISTORY, (ticket_id,))]
+
+def add_history(conn, ticket_id: str, action: str, user_id: int):
+    conn.execute(SQL_INSERT_HISTORY, (ticket_id, action, user_id))
+
+# ==== Métricas de IA ====
+
+SQL_INSERT_AI_METRIC = '''
+    INSERT INTO ticket_ai_metrics (ticket_id, node, wall_ms, queue_wait_ms, prompt_tokens, completion_tokens,
+                                   llm_calls, retries, cache_hit, cost_usd, retrieval, retrieval_similarity, baseline_tokens)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def add_ai_metrics(conn, ticket_id: str, entries: list):
+    """Guarda las mediciones por nodo (state['ai_metrics']) de un ticket. No hace commit."""
+    conn.executemany(SQL_INSERT_AI_METRIC, [
+        (ticket_id, e["node"], e["wall_ms"], e["queue_wait_ms"], e["prompt_tokens"], e["completion_tokens"],
+         e["llm_calls"], e["retries"], int(e["cache_hit"]), e["cost_usd"],
+         e.get("retrieval"), e.get("retrieval_similarity"), e.get("baseline_tokens"))
+        for e in entries
+    ])
+
+# ==== Intentos de IA y dead-letter (migración 10) ====
+
+# Fallos del grafo de IA tras los que un ticket deja de reintentarse automáticamente
+MAX_AI_ATTEMPTS = int(os.getenv("ITSM_AI_MAX_ATTEMPTS", "3"))
+
+SQL_RECORD_AI_FAILURE = '''
+    INSERT INTO ticket_ai_attempts (ticket_id, attempts, last_error, dead_letter) VALUES (?, 1, ?, 1 >= ?)
+    ON CONFLICT (ticket_id) DO UPDATE SET
+        attempts = attempts + 1, last_error = excluded.last_error,
+        dead_letter = attempts + 1 >= ?, updated_at = CURRENT_TIMESTAMP
+    RETURNING attempts, dead_letter
+'''
+SQL_CLEAR_AI_ATTEMPTS = "DELETE FROM ticket_ai_attempts WHERE ticket_id = ?"
+SQL_DEAD_LETTER = '''
+    SELECT a.ticket_id, a.attempts, a.last_error, a.updated_at, t.title
+    FROM ticket_ai_attempts a JOIN tickets t ON t.id = a.ticket_id
+    WHERE a.dead_letter = 1 ORDER BY a.updated_at
+'''
+
+def record_ai_failure(conn, ticket_id: str, error: str, max_attempts: int = MAX_AI_ATTEMPTS) -> tuple:
+    """
+    Suma un intento fallido al ticket; al llegar a `max_attempts` pasa a dead-letter.
+    No hace commit. Retorna (intentos, en_dead_letter).
+    """
+    row = conn.execute(SQL_RECORD_AI_FAILURE, (ticket_id, error, max_attempts, max_attempts)).fetchall()[0]
+    return row[0], bool(row[1])
+
+def clear_ai_attempts(conn, ticket_ids):
+    """Olvida los fallos previos de tickets ya enriquecidos. No hace commit."""
+    conn.executemany(SQL_CLEAR_AI_ATTEMPTS, [(ticket_id,) for ticket_id in ticket_ids])
+
+def dead_letter_tickets(conn) -> list:
+    return [dict(row) for row in conn.execute(SQL_DEAD_LETTER)]
+
+def requeue_dead_letter(conn) -> int:
+    """Devuelve los tickets en dead-letter a process_all con el contador a cero. No hace commit."""
+    return conn.execute("UPDATE ticket_ai_attempts SET dead_letter = 0, attempts = 0 WHERE dead_letter = 1").rowcount
+
+# ==== Leases de tickets (migración 11) ====
+
+# Un único INSERT ... ON CONFLICT condicional: entre varios procesos, solo uno obtiene la fila
+# (RETURNING vacío para el resto). Se puede reclamar si nadie lo tiene o su lease venció, y
+# solo si el ticket sigue pendiente y no lo tiene la cola de jobs de la API.
+SQL_CLAIM_TICKET = '''
+    INSERT INTO ticket_leases (ticket_id, lease_owner, lease_expires_at)
+    SELECT ?, ?, datetime('now', ?)
+    WHERE EXISTS (SELECT 1 FROM tickets t WHERE t.id = ? AND t.status = 'open' AND t.ai_response IS NULL)
+      AND NOT EXISTS (SELECT 1 FROM enrichment_jobs j WHERE j.ticket_id = ? AND j.status IN ('queued', 'running'))
+    ON CONFLICT (ticket_id) DO UPDATE SET
+        lease_owner = excluded.lease_owner, lease_expires_at = excluded.lease_expires_at
+    WHERE ticket_leases.lease_expires_at < datetime('now')
+    RETURNING ticket_id
+'''
+SQL_RELEASE_TICKET = "DELETE FROM ticket_leases WHERE ticket_id = ? AND lease_owner = ?"
+# Solo los leases que siguen siendo de `owner`: aunque hayan vencido, mientras nadie los
+# reclame siguen siendo suyos
+SQL_RENEW_LEASES = '''
+    UPDATE ticket_leases SET lease_expires_at = datetime('now', ?)
+    WHERE lease_owner = ? AND ticket_id IN (SELECT value FROM json_each(?))
+    RETURNING ticket_id
+'''
+
+def claim_ticket(conn, ticket_id: str, owner: str, lease_seconds: int) -> bool:
+    """Intenta quedarse con el enriquecimiento del ticket durante `lease_seconds`. No hace commit."""
+    rows = conn.execute(SQL_CLAIM_TICKET, (ticket_id, owner, f"{lease_seconds:+d} seconds", ticket_id, ticket_id)).fetchall()
+    return bool(rows)
+
+def renew_leases(conn, ticket_ids, owner: str, lease_seconds: int) -> set:
+    """
+    Extiende `lease_seconds` desde ahora los leases de `owner` sobre esos tickets. Retorna los
+    que aún tenía (los demás los reclamó otro proceso). No hace commit.
+    """
+    rows = conn.execute(SQL_RENEW_LEASES, (f"{lease_seconds:+d} seconds", owner, json.dumps(list(ticket_ids)))).fetchall()
+    return {row[0] for row in rows}
+
+def release_tickets(conn, ticket_ids, owner: str):
+    """Suelta los leases propios (al guardar el resultado o el fallo). No hace commit."""
+    conn.executemany(SQL_RELEASE_TICKET, [(ticket_id, owner) for ticket_id in ticket_ids])
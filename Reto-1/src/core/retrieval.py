@@ -0,0 +1,284 @@
+"""
+Tickets resueltos parecidos para el agente de soporte (recuperación TF-IDF en memoria).
+
+Las respuestas de IA de los tickets resueltos o cerrados ya las dio alguien por buenas. Para
+un ticket nuevo, support_node busca los más parecidos por título + descripción y:
+- con ITSM_RETRIEVAL_REUSE_ENABLED=1, si el mejor supera ITSM_RETRIEVAL_REUSE (coseno) y
+  tiene el mismo tipo y prioridad, reutiliza su respuesta sin llamar al LLM (la respuesta
+  justifica tipo y prioridad);
+- si alguno supera ITSM_RETRIEVAL_MIN_SIMILARITY, los pasa recortados como ejemplos y el
+  modelo adapta una solución conocida con una respuesta más corta;
+- si no, generación normal.
+
+El índice sigue el esquema del de duplicados (src/core/dedup.py): las entradas (término,
+ticket, peso tf) viven en arrays numpy ordenados por término, con un buffer de altas que se
+fusiona cada MERGE_EVERY entradas. En cada fusión se descartan los tickets fuera de los
+ITSM_RETRIEVAL_MAX_DOCS más recientes y se recalculan df y normas; las normas de los tickets
+aún en el buffer usan el idf del momento de su alta, que apenas se mueve entre fusiones.
+
+Cada ejecución de soporte guarda en ticket_ai_metrics el modo, la similitud y los tokens que
+habría costado generar la respuesta sin ayuda (baseline_tokens); summarize() lo compara con
+las generaciones normales del periodo.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from src.core.cache import normalize_text
+from src.core import repository
+
+# Desactivada por defecto, como las reglas: cambia la respuesta que el LLM habría dado
+RETRIEVAL_ENABLED = os.getenv("ITSM_RETRIEVAL", "0") == "1"
+# Copiar la respuesta de otro ticket es un paso más que usarla de ejemplo: se activa aparte
+REUSE_ENABLED = os.getenv("ITSM_RETRIEVAL_REUSE_ENABLED", "0") == "1"
+# Similitud coseno a partir de la cual se reutiliza la respuesta tal cual
+REUSE_THRESHOLD = float(os.getenv("ITSM_RETRIEVAL_REUSE", "0.9"))
+# Por debajo, un ticket resuelto no aporta como ejemplo
+MIN_SIMILARITY = float(os.getenv("ITSM_RETRIEVAL_MIN_SIMILARITY", "0.4"))
+TOP_K = int(os.getenv("ITSM_RETRIEVAL_K", "3"))
+MAX_DOCS = int(os.getenv("ITSM_RETRIEVAL_MAX_DOCS", "100000"))
+# Caracteres de cada respuesta de ejemplo en el prompt
+EXAMPLE_CHARS = 500
+# Términos presentes en más de esta fracción de tickets no discriminan y cuestan mucho de recorrer
+MAX_DF_RATIO = 0.5
+MERGE_EVERY = 50_000
+RESOLVED_STATUSES = ("resolved", "closed")
+
+def _words(title: str, description: str) -> list:
+    text = unicodedata.normalize("NFKD", normalize_text(f"{title} {description}"))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [word for word in text.split() if len(word) > 1]
+
+def term_vector(title: str, description: str):
+    """(términos crc32 uint32, pesos tf sublineales float32) del ticket."""
+    counts = Counter(zlib.crc32(word.encode("utf-8")) for word in _words(title, description))
+    terms = np.fromiter(counts.keys(), dtype=np.uint32, count=len(counts))
+    tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return terms, 1 + np.log(tf)
+
+def _idf(df, docs: int):
+    # idf suavizado: nunca 0 y sin división por cero con términos nuevos
+    return np.log((1 + docs) / (1 + np.asarray(df, dtype=np.float32))) + 1
+
+def estimate_tokens(text: str) -> int:
+    # ~4 caracteres por token, la misma aproximación que el gobernador y el LLM simulado
+    return len(text or "") // 4
+
+class ResolvedIndex:
+    """Índice TF-IDF en memoria de los tickets resueltos más recientes (ver docstring del módulo)."""
+    def __init__(self, max_docs: int = MAX_DOCS):
+        self.max_docs = max_docs
+        self._lock = threading.RLock()
+        self._ids = []
+        self._positions = {}
+        self._terms = np.empty(0, dtype=np.uint32)
+        self._owners = np.empty(0, dtype=np.int32)
+        self._weights = np.empty(0, dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._df = {}
+        self._pending = {} # término -> [(posición, peso)]
+        self._pending_norms = []
+        self._pending_count = 0
+        # Altas recibidas mientras se reconstruye desde la BD; se reaplican al terminar
+        self._journal = None
+        self.ready = False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, ticket_id: str, title: str, description: str):
+        """Indexa un ticket recién resuelto (idempotente)."""
+        terms, weights = term_vector(title, description)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((ticket_id, title, description))
+            if ticket_id in self._positions:
+                return
+            position = len(self._ids)
+            self._ids.append(ticket_id)
+            self._positions[ticket_id] = position
+            for term, weight in zip(terms.tolist(), weights.tolist()):
+                self._df[term] = self._df.get(term, 0) + 1
+                self._pending.setdefault(term, []).append((position, weight))
+            idf = _idf([self._df[term] for term in terms.tolist()], len(self._ids))
+            self._pending_norms.append(float(np.sqrt(np.sum((weights * idf) ** 2))))
+            self._pending_count += len(terms)
+            if self._pending_count >= MERGE_EVERY:
+                self._merge()
+
+    def query(self, title: str, description: str, k: int = TOP_K, exclude: str = None) -> list:
+        """Los `k` tickets más parecidos como [(ticket_id, similitud coseno)], de mayor a menor."""
+        terms, weights = term_vector(title, description)
+        with self._lock:
+            docs = len(self._ids)
+            if not docs or not len(terms):
+                return []
+            df = np.array([self._df.get(term, 0) for term in terms.tolist()], dtype=np.float32)
+            query = weights * _idf(df, docs)
+            query_norm = float(np.sqrt(np.sum(query ** 2)))
+            scores = np.zeros(docs, dtype=np.float32)
+            useful = (df > 0) & (df <= docs * MAX_DF_RATIO)
+            left = np.searchsorted(self._terms, terms[useful], side="left")
+            right = np.searchsorted(self._terms, terms[useful], side="right")
+            idf = _idf(df[useful], docs)
+            for lo, hi, factor in zip(left.tolist(), right.tolist(), (query[useful] * idf).tolist()):
+                # Cada ticket aparece una sola vez por término: la suma con índices repetidos no hace falta
+                scores[self._owners[lo:hi]] += self._weights[lo:hi] * factor
+            for term, factor in zip(terms[useful].tolist(), (query[useful] * idf).tolist()):
+                for position, weight in self._pending.get(term, ()):
+                    scores[position] += weight * factor
+            norms = np.concatenate([self._norms, np.asarray(self._pending_norms, dtype=np.float32)])
+            similarities = scores / np.maximum(norms * query_norm, 1e-9)
+            if exclude in self._positions:
+                similarities[self._positions[exclude]] = 0
+            top = np.argpartition(-similarities, min(k, docs) - 1)[:k]
+            ranked = sorted(top.tolist(), key=lambda position: -similarities[position])
+            return [(self._ids[position], float(similarities[position])) for position in ranked if similarities[position] > 0]
+
+    def rebuild_from_db(self, conn):
+        """Reconstruye el índice con los MAX_DOCS tickets resueltos más recientes de SQLite."""
+        with self._lock:
+            self._journal = []
+        rows = conn.execute(f'''
+            SELECT id, title, description FROM tickets
+            WHERE status IN ({', '.join('?' * len(RESOLVED_STATUSES))}) AND ai_response IS NOT NULL
+            ORDER BY updated_at DESC LIMIT ?
+        ''', (*RESOLVED_STATUSES, self.max_docs)).fetchall()
+        ids, terms, owners, weights = [], [], [], []
+        for position, (ticket_id, title, description) in enumerate(reversed(rows)):
+            doc_terms, doc_weights = term_vector(title, description)
+            ids.append(ticket_id)
+            terms.append(doc_terms)
+            weights.append(doc_weights)
+            owners.append(np.full(len(doc_terms), position, dtype=np.int32))
+        with self._lock:
+            self._ids = ids
+            self._positions = {ticket_id: i for i, ticket_id in enumerate(ids)}
+            self._terms = np.concatenate(terms) if terms else np.empty(0, dtype=np.uint32)
+            self._owners = np.concatenate(owners) if owners else np.empty(0, dtype=np.int32)
+            self._weights = np.concatenate(weights) if weights else np.empty(0, dtype=np.float32)
+            self._pending, self._pending_norms, self._pending_count = {}, [], 0
+            self._merge()
+            journal, self._journal = self._journal, None
+            for ticket_id, title, description in journal:
+                self.add(ticket_id, title, description)
+            self.ready = True
+
+    def _merge(self):
+        """Fusiona el buffer, descarta los tickets más antiguos y recalcula df y normas."""
+        pending = [(term, position, weight) for term, entries in self._pending.items() for position, weight in entries]
+        terms = np.concatenate([self._terms, np.fromiter((p[0] for p in pending), dtype=np.uint32, count=len(pending))])
+        owners = np.concatenate([self._owners, np.fromiter((p[1] for p in pending), dtype=np.int32, count=len(pending))])
+        weights = np.concatenate([self._weights, np.fromiter((p[2] for p in pending), dtype=np.float32, count=len(pending))])
+        cutoff = len(self._ids) - self.max_docs
+        if cutoff > 0:
+            keep = owners >= cutoff
+            terms, owners, weights = terms[keep], owners[keep] - cutoff, weights[keep]
+            self._ids = self._ids[cutoff:]
+            self._positions = {ticket_id: i for i, ticket_id in enumerate(self._ids)}
+        order = np.argsort(terms, kind="stable")
+        self._terms, self._owners, self._weights = terms[order], owners[order], weights[order]
+        unique, df = np.unique(self._terms, return_counts=True)
+        self._df = dict(zip(unique.tolist(), df.tolist()))
+        idf = _idf(df, len(self._ids))[np.searchsorted(unique, self._terms)]
+        self._norms = np.sqrt(np.bincount(
+            self._owners, weights=(self._weights * idf) ** 2, minlength=len(self._ids)
+        )).astype(np.float32)
+        self._pending, self._pending_norms, self._pending_count = {}, [], 0
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index() -> ResolvedIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ResolvedIndex()
+    return _index
+
+def rebuild_index(background: bool = False):
+    """
+    Carga el índice desde data/tickets.db. En segundo plano no retrasa el arranque de la API:
+    mientras tanto solo conoce los tickets que se vayan resolviendo.
+    """
+    def _rebuild():
+        try:
+            start = time.perf_counter()
+            with repository.connection() as conn:
+                get_index().rebuild_from_db(conn)
+            print(f"Índice de tickets resueltos listo: {len(get_index())} tickets en {time.perf_counter() - start:.1f}s")
+        except sqlite3.Error as e:
+            print(f"Aviso: no se pudo construir el índice de tickets resueltos: {e}")
+
+    if background:
+        threading.Thread(target=_rebuild, name="retrieval-index-rebuild", daemon=True).start()
+    else:
+        _rebuild()
+
+def mark_resolved(conn, ticket_id: str):
+    """Añade al índice un ticket que acaba de pasar a resuelto/cerrado, si tiene respuesta de IA."""
+    ticket = repository.get_ticket_row(conn, ticket_id)
+    if ticket is not None and ticket['status'] in RESOLVED_STATUSES and ticket['ai_response']:
+        get_index().add(ticket_id, ticket['title'], ticket['description'])
+
+def similar_resolved(ticket_id: str, title: str, description: str, k: int = TOP_K) -> list:
+    """
+    Hasta `k` tickets resueltos con similitud >= MIN_SIMILARITY, de mayor a menor: dicts con
+    id, title, type, priority, ai_response y similarity. Se comprueba en la BD que siguen
+    resueltos y con respuesta (el índice no se entera de las reaperturas).
+    """
+    matches = [(match_id, similarity) for match_id, similarity in get_index().query(title, description, k * 2, exclude=ticket_id)
+               if similarity >= MIN_SIMILARITY]
+    if not matches:
+        return []
+    with repository.connection() as conn:
+        rows = conn.execute(f'''
+            SELECT id, title, type, priority, ai_response FROM tickets
+            WHERE id IN ({', '.join('?' * len(matches))})
+              AND status IN ({', '.join('?' * len(RESOLVED_STATUSES))}) AND ai_response IS NOT NULL
+        ''', (*(match_id for match_id, _ in matches), *RESOLVED_STATUSES)).fetchall()
+    found = {row['id']: dict(row) for row in rows}
+    examples, answers = [], set()
+    for match_id, similarity in matches:
+        # Una respuesta repetida (incidencias recurrentes) no aporta nada como segundo ejemplo
+        if match_id in found and found[match_id]['ai_response'] not in answers:
+            answers.add(found[match_id]['ai_response'])
+            examples.append({**found[match_id], "similarity": similarity})
+    return examples[:k]
+
+def format_examples(examples: list) -> str:
+    """Ejemplos compactos para el prompt: título, clasificación y respuesta recortada."""
+    blocks = []
+    for example in examples:
+        answer = example['ai_response']
+        if len(answer) > EXAMPLE_CHARS:
+            answer = answer[:EXAMPLE_CHARS].rsplit(" ", 1)[0] + "…"
+        blocks.append(f"### {example['title']} ({example['type']}, {example['priority']})\n{answer}")
+    return "\n\n".join(blocks)
+
+def baseline_tokens(plain_prompt: str, examples: list) -> int:
+    """
+    Tokens estimados de una generación sin ayuda: el prompt normal más una respuesta como
+    las de los tickets parecidos (que salieron de generaciones normales).
+    """
+    completion = sum(estimate_tokens(e['ai_response']) for e in examples) / len(examples)
+    return estimate_tokens(plain_prompt) + math.ceil(completion)
+
+def summarize(conn, since: str) -> list:
+    """Ejecuciones de soporte desde `since` por modo (generation, reuse, few_shot)."""
+    return [dict(row) for row in conn.execute('''
+        SELECT COALESCE(retrieval, 'generation') AS mode, COUNT(*) AS runs, AVG(wall_ms) AS avg_wall_ms,
+               AVG(prompt_tokens + completion_tokens) AS avg_tokens,
+               AVG(baseline_tokens - prompt_tokens - completion_tokens) AS avg_saved_tokens,
+               AVG(retrieval_similarity) AS avg_similarity
+        FROM ticket_ai_metrics WHERE node = 'soporte' AND created_at >= ?
+        GROUP BY mode ORDER BY mode
+    ''', (since,))]
@@ -0,0 +1,180 @@
+import os
+from collections import deque
+
+# Puerto a Python del motor de palabras clave del frontend
+# (itsm-nttdata/src/utils/aiClassification.js -> classifyTicket). Mantener sincronizados.
+TYPE_KEYWORDS = {
+    "incident": [
+        'error', 'caído', 'caida', 'no funciona', 'problema', 'falla', 'crash',
+        'down', 'bloqueado', 'roto', 'inaccesible', 'lento', 'colgado',
+        'no responde', 'pantalla azul', 'virus', 'malware', 'hackeado',
+        'no carga', 'interrumpido', 'desconectado', 'no disponible'
+    ],
+    "request": [
+        'necesito', 'solicito', 'requiero', 'acceso', 'permiso', 'nuevo',
+        'instalación', 'instalar', 'crear', 'configurar', 'actualizar',
+        'cambiar contraseña', 'alta de usuario', 'licencia', 'software',
+        'equipo nuevo', 'cuenta', 'habilitar', 'desbloquear'
+    ],
+    "problem": [
+        'recurrente', 'repetido', 'siempre', 'constante', 'patrón',
+        'múltiples veces', 'otra vez', 'frecuente', 'intermitente',
+        'periódicamente', 'cada vez', 'todos los días', 'semanal',
+        'persistente', 'crónico'
+    ],
+}
+
+# El orden importa: como en el frontend, gana el primer nivel con alguna coincidencia
+URGENCY_KEYWORDS = {
+    "critical": [
+        'producción', 'crítico', 'urgente', 'inmediato', 'todos',
+        'sistema completo', 'empresa', 'masivo', 'generalizado',
+        'pérdida de datos', 'seguridad', 'brecha', 'total'
+    ],
+    "high": [
+        'importante', 'prioridad', 'múltiples usuarios', 'departamento',
+        'equipo', 'afecta a varios', 'proyecto', 'deadline', 'fecha límite'
+    ],
+    "medium": [
+        'normal', 'cuando sea posible', 'algunos usuarios', 'grupo',
+        'moderado', 'parcial'
+    ],
+    "low": [
+        'bajo', 'menor', 'cosmético', 'sugerencia', 'mejora', 'opcional',
+        'no urgente', 'cuando puedas', 'sin prisa'
+    ],
+}
+
+# Desactivadas por defecto: cambian la etiqueta de los tickets que el LLM habría clasificado
+RULES_ENABLED = os.getenv("ITSM_RULES", "0") == "1"
+# Confianza mínima para que un agente de triaje acepte la etiqueta local sin llamar al LLM
+THRESHOLD = float(os.getenv("ITSM_RULES_THRESHOLD", "0.8"))
+# Con este número de palabras clave distintas (y sin competencia) la confianza es plena
+FULL_SUPPORT_HITS = 2
+# Incrementar cuando cambien las palabras clave o el cálculo de confianza: forma parte de la
+# clave de la caché de resultados, como PROMPT_VERSION
+RULES_VERSION = "2"
+
+class KeywordMatcher:
+    """
+    Autómata de Aho-Corasick: encuentra todas las palabras clave (como subcadenas, igual que
+    `String.includes` en el frontend) en una sola pasada sobre el texto.
+    """
+    def __init__(self, patterns: list):
+        # patterns: lista de (palabra_clave, etiqueta)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for keyword, label in patterns:
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append((keyword, label))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text: str) -> set:
+        """
+        Retorna el conjunto de (palabra_clave, etiqueta) presentes en el texto.
+        """
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._output[state]:
+                found.update(self._output[state])
+        return found
+
+def _build_matcher() -> KeywordMatcher:
+    patterns = []
+    for ticket_type, keywords in TYPE_KEYWORDS.items():
+        patterns += [(keyword, ("type", ticket_type)) for keyword in keywords]
+    for priority, keywords in URGENCY_KEYWORDS.items():
+        patterns += [(keyword, ("priority", priority)) for keyword in keywords]
+    return KeywordMatcher(patterns)
+
+_matcher = _build_matcher()
+
+def _confidence(winner_hits: int, total_hits: int) -> float:
+    """
+    Proporción de evidencia a favor de la etiqueta ganadora, atenuada si hay pocas coincidencias.
+    """
+    if winner_hits == 0:
+        return 0.0
+    return (winner_hits / total_hits) * min(1.0, winner_hits / FULL_SUPPORT_HITS)
+
+def classify_ticket(description: str) -> dict:
+    """
+    Clasificación local por palabras clave, igual que classifyTicket del frontend: solo mira
+    la descripción y cada palabra clave cuenta una vez. Retorna tipo y prioridad con una
+    confianza entre 0 y 1 para cada uno.
+    """
+    text = (description or "").lower()
+    type_hits = {t: 0 for t in TYPE_KEYWORDS}
+    urgency_hits = {p: 0 for p in URGENCY_KEYWORDS}
+    for _, (kind, label) in _matcher.find(text):
+        if kind == "type":
+            type_hits[label] += 1
+        else:
+            urgency_hits[label] += 1
+
+    # Tipo: el de más coincidencias. En un empate gana el último en el orden de TYPE_KEYWORDS,
+    # como el reduce((a, b) => s[a] > s[b] ? a : b) del frontend
+    ticket_type = max(type_hits, key=lambda t: (type_hits[t], list(TYPE_KEYWORDS).index(t)))
+    if type_hits[ticket_type] == 0:
+        ticket_type = "incident"
+
+    # Prioridad: el primer nivel (de critical a low) con alguna coincidencia
+    priority = next((p for p in URGENCY_KEYWORDS if urgency_hits[p] > 0), "medium")
+
+    return {
+        "ticket_type": ticket_type,
+        "type_confidence": _confidence(type_hits[ticket_type], sum(type_hits.values())),
+        "priority": priority,
+        "priority_confidence": _confidence(urgency_hits[priority], sum(urgency_hits.values())),
+    }
+
+def rules_node(state) -> dict:
+    """
+    Pre-clasificación local previa a los agentes de triaje. No decide nada por sí sola: deja
+    etiquetas y confianzas en el estado para que cada agente pueda saltarse su llamada al LLM.
+    """
+    result = classify_ticket(state.get("description", ""))
+    return {
+        "rule_type": result["ticket_type"],
+        "rule_type_confidence": result["type_confidence"],
+        "rule_priority": result["priority"],
+        "rule_priority_confidence": result["priority_confidence"],
+    }
+
+def cache_tag(enabled: bool) -> str:
+    """Ajustes de las reglas que influyen en el resultado, para la clave de la caché."""
+    return f"reglas:{RULES_VERSION}:{THRESHOLD}" if enabled else "reglas:off"
+
+def confident_type(state):
+    """Tipo de las reglas si supera el umbral de confianza, si no None."""
+    if (state.get("rule_type_confidence") or 0) >= THRESHOLD:
+        return state.get("rule_type")
+    return None
+
+def confident_priority(state):
+    """Prioridad de las reglas si supera el umbral de confianza, si no None."""
+    if (state.get("rule_priority_confidence") or 0) >= THRESHOLD:
+        return state.get("rule_priority")
+    return None
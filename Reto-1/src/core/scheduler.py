@@ -0,0 +1,78 @@
+"""
+Orden de procesamiento del backlog de IA por urgencia estimada, sin LLM.
+
+Cada ticket pendiente recibe una puntuación barata:
+- nivel de urgencia de las reglas locales (src/core/rules.py, las del frontend),
+- un extra si menciona un incidente de seguridad (robo de equipo, phishing, malware...),
+- el peso del área del solicitante (ITSM_SCHEDULER_AREA_WEIGHTS, JSON área -> puntos).
+
+y espera en una cola de prioridad con envejecimiento: cada hora en cola suma
+ITSM_SCHEDULER_AGING puntos, así un ticket de impresora acaba pasando por delante de los
+urgentes que lleguen después y nada se queda esperando indefinidamente.
+
+Como el envejecimiento crece igual para todos, la prioridad efectiva en el instante t es
+puntuación + AGING * (t - creado) y el orden entre dos tickets no cambia con t: basta un
+heap con clave puntuación - AGING * creado, sin reordenar nunca.
+"""
+import heapq
+import itertools
+import json
+import os
+import time
+
+from src.core import repository
+from src.core.rules import KeywordMatcher, classify_ticket
+
+LEVEL_SCORES = {"critical": 100.0, "high": 60.0, "medium": 30.0, "low": 10.0}
+SECURITY_BONUS = 80.0
+SECURITY_KEYWORDS = [
+    'robado', 'robada', 'robaron', 'robo', 'extravi', 'perdí el', 'phishing', 'suplantación',
+    'correo sospechoso', 'enlace sospechoso', 'fraude', 'ransomware', 'malware', 'virus',
+    'hackeado', 'brecha', 'credenciales', 'contraseña comprometida', 'cifrado', 'secuestro',
+]
+# Áreas cuyo bloqueo para a toda la empresa (dinero, operación, infraestructura)
+DEFAULT_AREA_WEIGHTS = {"Tecnología": 15.0, "Finanzas": 15.0, "Operaciones": 10.0, "Logística": 10.0, "Ventas": 5.0}
+AREA_WEIGHTS = {**DEFAULT_AREA_WEIGHTS, **json.loads(os.getenv("ITSM_SCHEDULER_AREA_WEIGHTS", "{}"))}
+# Puntos por hora de espera: un ticket "low" (10) supera a un "critical" (100) recién llegado tras 9 h
+AGING_PER_HOUR = float(os.getenv("ITSM_SCHEDULER_AGING", "10"))
+
+_security = KeywordMatcher([(keyword, "security") for keyword in SECURITY_KEYWORDS])
+
+def _created_ts(ticket: dict) -> float:
+    """Epoch de creación; sin fecha legible cuenta como recién llegado, no frena la corrida."""
+    created = repository.to_epoch(ticket.get("created_at"))
+    return created if created is not None else time.time()
+
+def urgency_score(ticket: dict, area: str = None) -> float:
+    """Puntuación de urgencia de un ticket (sin envejecimiento): más alta, antes se procesa."""
+    title, description = ticket.get("title", ""), ticket.get("description", "")
+    score = LEVEL_SCORES[classify_ticket(description)["priority"]]
+    if _security.find(f"{title or ''}\n{description or ''}".lower()):
+        score += SECURITY_BONUS
+    return score + AREA_WEIGHTS.get(area, 0.0)
+
+class UrgencyQueue:
+    """Cola de prioridad de tickets pendientes con envejecimiento (ver docstring del módulo)."""
+    def __init__(self, areas: dict = None, aging_per_hour: float = AGING_PER_HOUR):
+        self.areas = areas or {}
+        self.aging = aging_per_hour / 3600
+        self._heap = []
+        self._order = itertools.count() # desempate estable: a igual clave, el primero en llegar
+
+    def push(self, ticket: dict):
+        score = urgency_score(ticket, self.areas.get(ticket.get("user_id")))
+        key = score - self.aging * _created_ts(ticket)
+        heapq.heappush(self._heap, (-key, next(self._order), ticket))
+
+    def pop(self) -> dict:
+        return heapq.heappop(self._heap)[2]
+
+    def __len__(self):
+        return len(self._heap)
+
+def urgency_order(tickets, areas: dict = None) -> UrgencyQueue:
+    """Cola con todos los `tickets` (dicts con title, description, user_id y created_at)."""
+    queue = UrgencyQueue(areas)
+    for ticket in tickets:
+        queue.push(ticket)
+    return queue
@@ -0,0 +1,140 @@
+"""
+Búsqueda de texto completo de tickets sobre el índice FTS5 tickets_fts (migración 12).
+
+El índice lo mantienen los triggers de tickets; generate_tickets.py los suspende en las
+cargas masivas y lo reconstruye al final con rebuild(). Sus filas se identifican por el doc
+de ticket_search_docs (migración 14), un entero estable: el rowid de tickets no lo es, VACUUM
+lo puede renumerar.
+
+La consulta del usuario no se pasa tal cual a MATCH (los operadores de FTS5 darían errores
+de sintaxis con texto libre): cada palabra va entre comillas, todas deben aparecer y la
+última se busca como prefijo, para que funcione mientras se escribe.
+
+El orden es bm25 con más peso para el título que para la descripción y la respuesta de la
+IA, pero solo entre las ITSM_SEARCH_CANDIDATES coincidencias más recientes: FTS5 las
+recorre por doc (orden de alta) descendente sin coste, mientras que puntuar todas las coincidencias de
+una palabra común ("correo", "impresora") en millones de tickets cuesta cientos de ms.
+
+Los fragmentos resaltados se arman aquí y no con highlight()/snippet() de FTS5: estas
+vuelven a evaluar la consulta por cada fila y, con el prefijo de la última palabra, eso
+supone combinar en cada fila las listas de todos los términos que empiezan igual.
+"""
+import html
+import os
+import re
+import unicodedata
+
+# Peso de cada columna en bm25: title, description, ai_response
+COLUMN_WEIGHTS = (10.0, 3.0, 1.0)
+SNIPPET_TOKENS = 16
+# Coincidencias (las más recientes) que se ordenan por relevancia; también acota la paginación
+MAX_CANDIDATES = int(os.getenv("ITSM_SEARCH_CANDIDATES", "2000"))
+
+# Mismo criterio que el tokenizer unicode61: letras y números; el resto separa palabras
+_TOKEN = re.compile(r"[^\W_]+")
+
+def _fold(word: str) -> str:
+    """Minúsculas y sin tildes, como unicode61 con remove_diacritics."""
+    return "".join(c for c in unicodedata.normalize("NFD", word.lower()) if not unicodedata.combining(c))
+
+def fts_query(text: str) -> str:
+    """Texto libre -> expresión MATCH segura ("" si no hay palabras)."""
+    terms = _TOKEN.findall((text or "").lower())
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _fragment(text: str, terms: set, prefix: str, window: int = None, required: bool = False):
+    """
+    `text` escapado para HTML con las palabras buscadas en <mark>. Con `window`, solo el
+    tramo de esa cantidad de palabras con más coincidencias (o el inicio si no hay ninguna;
+    None si además `required`).
+    """
+    if not text:
+        return None
+    tokens = list(_TOKEN.finditer(text))
+    hits = [i for i, token in enumerate(tokens)
+            if (word := _fold(token.group())) in terms or word.startswith(prefix)]
+    start, end = 0, len(tokens)
+    if window is not None:
+        if not hits and required:
+            return None
+        # El tramo que empieza un par de palabras antes de la coincidencia que más reúne
+        start = max((max(0, h - 2) for h in hits), key=lambda s: sum(s <= h < s + window for h in hits), default=0)
+        end = min(len(tokens), start + window)
+    from_char = tokens[start].start() if start else 0
+    to_char = tokens[end - 1].end() if end < len(tokens) else len(text)
+    parts, cursor = [], from_char
+    for i in hits:
+        if start <= i < end:
+            token = tokens[i]
+            parts += [html.escape(text[cursor:token.start()]), "<mark>", html.escape(token.group()), "</mark>"]
+            cursor = token.end()
+    parts.append(html.escape(text[cursor:to_char]))
+    return ("…" if from_char else "") + "".join(parts) + ("…" if to_char < len(text) else "")
+
+def search(conn, text: str, statuses: list = None, priorities: list = None, limit: int = 20, offset: int = 0) -> list:
+    """
+    Tickets que contienen todas las palabras de `text`, del más al menos relevante entre los
+    MAX_CANDIDATES más recientes. Retorna hasta `limit` resultados desde `offset`, cada uno
+    con sus fragmentos resaltados.
+    """
+    match = fts_query(text)
+    if not match:
+        return []
+    where, params = ["tickets_fts MATCH ?"], [match]
+    for column, values in (("t.status", statuses), ("t.priority", priorities)):
+        if values:
+            where.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params += values
+    weights = ", ".join(str(w) for w in COLUMN_WEIGHTS)
+    rows = conn.execute(f'''
+        WITH candidates AS (
+            SELECT t.id AS ticket_id, bm25(tickets_fts, {weights}) AS score
+            FROM tickets_fts
+            JOIN ticket_search_docs d ON d.doc = tickets_fts.rowid
+            JOIN tickets t ON t.id = d.ticket_id
+            WHERE {" AND ".join(where)}
+            ORDER BY tickets_fts.rowid DESC
+            LIMIT ?
+        ), page AS (
+            SELECT ticket_id, score FROM candidates ORDER BY score LIMIT ? OFFSET ?
+        )
+        SELECT t.id, t.title, t.description, t.ai_response, t.type, t.priority, t.status, t.created_at, page.score
+        FROM page JOIN tickets t ON t.id = page.ticket_id
+        ORDER BY page.score
+    ''', params + [MAX_CANDIDATES, limit, offset]).fetchall()
+
+    words = [_fold(word) for word in _TOKEN.findall(text)]
+    terms, prefix = set(words[:-1]), words[-1]
+    return [{
+        "id": row['id'],
+        "title": row['title'],
+        "type": row['type'],
+        "priority": row['priority'],
+        "status": row['status'],
+        "createdAt": row['created_at'],
+        # bm25 de SQLite es negativo (más negativo = más relevante); se expone positivo
+        "score": round(-row['score'], 4),
+        "highlights": {
+            "title": _fragment(row['title'], terms, prefix),
+            "description": _fragment(row['description'], terms, prefix, SNIPPET_TOKENS),
+            # Solo si la coincidencia está en la respuesta de la IA
+            "aiResponse": _fragment(row['ai_response'], terms, prefix, SNIPPET_TOKENS, required=True),
+        },
+    } for row in rows]
+
+def rebuild(conn):
+    """
+    Recalcula el índice desde tickets tras una carga sin triggers: da doc a los tickets nuevos
+    (en orden de creación), quita los de tickets borrados y reindexa. No hace commit.
+    """
+    conn.execute("DELETE FROM ticket_search_docs WHERE ticket_id NOT IN (SELECT id FROM tickets)")
+    conn.execute('''
+        INSERT INTO ticket_search_docs (ticket_id)
+        SELECT id FROM tickets WHERE id NOT IN (SELECT ticket_id FROM ticket_search_docs)
+        ORDER BY created_at, id
+    ''')
+    conn.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
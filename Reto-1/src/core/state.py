@@ -1,4 +1,5 @@
-from typing import TypedDict, Optional, List
+import operator
+from typing import Annotated, TypedDict, Optional, List
 from langchain_core.messages import BaseMessage
 
 class TicketState(TypedDict):
@@ -10,6 +11,12 @@ class TicketState(TypedDict):
     title: str
     description: str
     
+    # Pre-clasificación local por palabras clave (confianza 0-1), ver src/core/rules.py
+    rule_type: Optional[str]
+    rule_type_confidence: Optional[float]
+    rule_priority: Optional[str]
+    rule_priority_confidence: Optional[float]
+    
     # Datos enriquecidos por el Agente Clasificador
     ticket_type: Optional[str] # incident, request, problem
     
@@ -19,5 +26,22 @@ class TicketState(TypedDict):
     # Datos enriquecidos por el Agente de Soporte (Englobando justificación y ayuda)
     ai_response: Optional[str]
     
+    # True si el resultado completo salió de la caché de resultados del LLM
+    cache_hit: Optional[bool]
+    
+    # Ticket casi idéntico (ya enriquecido) del que se reutilizó la clasificación
+    parent_ticket_id: Optional[str]
+    
+    # Tickets resueltos parecidos que usó el agente de soporte (src/core/retrieval.py):
+    # mode (reuse / few_shot), source, similarity, baseline_tokens. None si generó sin ayuda.
+    retrieval: Optional[dict]
+    
+    # Momento (epoch) desde el que el ticket espera a la IA: mide la cola antes del primer nodo
+    queued_at: Optional[float]
+    
+    # Una medición por nodo ejecutado (tiempo, espera, tokens...), ver src/core/metrics.py.
+    # Cada nodo aporta la suya y el reductor las concatena.
+    ai_metrics: Annotated[List[dict], operator.add]
+    
     # Historial de mensajes 
     messages: List[BaseMessage]
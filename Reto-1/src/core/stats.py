@@ -0,0 +1,130 @@
+"""
+Estadísticas de tickets servidas desde ticket_counters (migración 5).
+
+Los triggers de la tabla tickets mantienen los contadores en cada INSERT / UPDATE / DELETE,
+así que leer las estadísticas cuesta lo mismo con cien tickets que con un millón: solo se
+recorren unas pocas filas por área, tipo y técnico, nunca la tabla de tickets.
+
+Uso (desde Reto-1/):
+    python -m src.core.stats              # compara los contadores con un recálculo completo
+    python -m src.core.stats --rebuild    # los vuelve a calcular desde cero
+"""
+import argparse
+import sys
+
+from src.core import repository
+
+STATUSES = ('open', 'in-progress', 'resolved', 'closed')
+PRIORITIES = ('critical', 'high', 'medium', 'low')
+TYPES = ('incident', 'request', 'problem')
+ACTIVE_STATUSES = ('open', 'in-progress')
+
+# Mismo agregado que cargan los triggers, calculado desde cero sobre tickets
+RECOMPUTE_SQL = '''
+    SELECT 'all' AS dimension, '' AS bucket, status, priority, COUNT(*) AS total
+    FROM tickets GROUP BY status, priority
+    UNION ALL
+    SELECT 'type', type, status, priority, COUNT(*) FROM tickets GROUP BY type, status, priority
+    UNION ALL
+    SELECT 'area', u.area, t.status, t.priority, COUNT(*) FROM tickets t JOIN users u ON u.id = t.user_id
+    GROUP BY u.area, t.status, t.priority
+    UNION ALL
+    SELECT 'staff', CAST(assigned_to_id AS TEXT), status, priority, COUNT(*) FROM tickets
+    WHERE assigned_to_id IS NOT NULL GROUP BY assigned_to_id, status, priority
+'''
+SQL_COUNTERS = "SELECT dimension, bucket, status, priority, total FROM ticket_counters WHERE total != 0"
+SQL_STAFF = "SELECT id, name, puesto, area FROM users WHERE role IN ('staff', 'admin') ORDER BY id"
+
+def _empty_area() -> dict:
+    return {"total": 0, "open": 0, "in_progress": 0, "resolved": 0, "closed": 0, "critical": 0}
+
+def get_stats(conn) -> dict:
+    """
+    Totales por estado, prioridad y tipo, desglose por área del solicitante (v_stats_by_area)
+    y carga de trabajo del staff (v_staff_workload).
+    """
+    by_status = {s: 0 for s in STATUSES}
+    by_priority = {p: 0 for p in PRIORITIES}
+    by_type = {t: 0 for t in TYPES}
+    areas, staff = {}, {}
+    total = critical_active = 0
+
+    for dimension, bucket, status, priority, count in conn.execute(SQL_COUNTERS):
+        if dimension == 'all':
+            total += count
+            by_status[status] = by_status.get(status, 0) + count
+            by_priority[priority] = by_priority.get(priority, 0) + count
+            if priority == 'critical' and status in ACTIVE_STATUSES:
+                critical_active += count
+        elif dimension == 'type':
+            by_type[bucket] = by_type.get(bucket, 0) + count
+        elif dimension == 'area':
+            area = areas.setdefault(bucket, _empty_area())
+            column = status.replace('-', '_')
+            area["total"] += count
+            area[column] = area.get(column, 0) + count
+            if priority == 'critical':
+                area["critical"] += count
+        elif dimension == 'staff':
+            workload = staff.setdefault(int(bucket), {"total_assigned": 0, "in_progress": 0, "resolved": 0, "critical": 0})
+            workload["total_assigned"] += count
+            if status == 'in-progress':
+                workload["in_progress"] += count
+            elif status == 'resolved':
+                workload["resolved"] += count
+            if priority == 'critical':
+                workload["critical"] += count
+
+    staff_workload = []
+    for user in conn.execute(SQL_STAFF):
+        workload = staff.get(user['id'], {"total_assigned": 0, "in_progress": 0, "resolved": 0, "critical": 0})
+        staff_workload.append({**dict(user), **workload})
+
+    return {
+        "total": total,
+        "by_status": by_status,
+        "by_priority": by_priority,
+        "by_type": by_type,
+        "critical_active": critical_active,
+        "by_area": sorted(({"area": a, **c} for a, c in areas.items()), key=lambda a: -a["total"]),
+        "staff_workload": sorted(staff_workload, key=lambda s: -s["total_assigned"]),
+    }
+
+def verify(conn) -> list:
+    """
+    Compara los contadores con un recálculo completo. Retorna [(clave, contador, real)] de
+    las diferencias (lista vacía si todo cuadra).
+    """
+    expected = {tuple(row[:4]): row[4] for row in conn.execute(RECOMPUTE_SQL)}
+    actual = {tuple(row[:4]): row[4] for row in conn.execute(SQL_COUNTERS)}
+    return [
+        (key, actual.get(key, 0), expected.get(key, 0))
+        for key in sorted(set(expected) | set(actual))
+        if actual.get(key, 0) != expected.get(key, 0)
+    ]
+
+def rebuild(conn):
+    """Recalcula todos los contadores desde tickets. No hace commit."""
+    conn.execute("DELETE FROM ticket_counters")
+    conn.execute(f"INSERT INTO ticket_counters (dimension, bucket, status, priority, total) {RECOMPUTE_SQL}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica o reconstruye los contadores de estadísticas.")
+    parser.add_argument("--rebuild", action="store_true", help="Recalcular los contadores desde la tabla tickets")
+    args = parser.parse_args()
+
+    repository.init_db()
+    if args.rebuild:
+        with repository.transaction() as conn:
+            rebuild(conn)
+        print("Contadores reconstruidos.")
+
+    with repository.connection() as conn:
+        mismatches = verify(conn)
+    for (dimension, bucket, status, priority), counter, real in mismatches:
+        print(f"  [DIF] {dimension}={bucket} {status}/{priority}: contador {counter}, real {real}")
+    print("Contadores OK." if not mismatches else f"{len(mismatches)} contadores no cuadran (usar --rebuild).")
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,50 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import sys
 import os
 
 # Asegurar que se puede importar 'src' desde el root del proyecto
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-from src.core.orchestrator import process_ticket
+from src.core import registry, jobs, repository, stats
+from src.core.dedup import DEDUP_ENABLED, get_index, rebuild_index
+from src.core import retrieval
+from src.ui.inbox import InboxCache
 
 st.set_page_config(page_title="AI ITSM Assistant", layout="wide", page_icon="🤖")
 
-def get_db_connection():
-    conn = sqlite3.connect('data/tickets.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+@st.cache_resource
+def start_pipeline():
+    # Se ejecuta una vez por proceso de Streamlit, no en cada rerun
+    repository.init_db()
+    registry.warmup()
+    if DEDUP_ENABLED:
+        rebuild_index(background=True)
+    if retrieval.RETRIEVAL_ENABLED:
+        retrieval.rebuild_index(background=True)
+    workers = jobs.JobWorkerPool()
+    workers.start()
+    return workers
+
+job_workers = start_pipeline()
+
+INBOX_PAGE_SIZE = 50
+
+@st.cache_resource
+def get_inbox_cache():
+    # Una sola copia del Inbox por proceso; cada rerun solo lee lo que cambió
+    return InboxCache()
+
+@st.cache_data(max_entries=512)
+def load_ticket_detail(ticket_id, updated_at):
+    # updated_at forma parte de la clave: si el ticket cambia se vuelve a leer
+    with repository.connection() as conn:
+        ticket = dict(repository.get_ticket_row(conn, ticket_id))
+        history = repository.get_history(conn, ticket_id)
+    return ticket, history
 
 def get_users_by_role(role):
-    conn = get_db_connection()
-    users = conn.execute("SELECT id, name FROM users WHERE role = ?", (role,)).fetchall()
-    conn.close()
+    with repository.connection() as conn:
+        users = repository.list_users(conn, roles=(role,))
     return [(u['id'], u['name']) for u in users]
 
 st.title("🤖 Asistente Inteligente ITSM (NTT Data)")
@@ -40,58 +66,30 @@ with tab1:
         
         if submitted and description and ticket_title:
             with st.spinner("La GenIA de Groq está analizando, clasificando y priorizando tu ticket..."):
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                # Generar ID falso estilo INC-XXXXXX
-                cursor.execute("SELECT COUNT(*) as count FROM tickets")
-                count = cursor.fetchone()['count'] + 1
-                new_id = f"INC-{str(count).zfill(6)}"
                 user_id = selected_user[0]
                 
-                # 1. Insertar ticket inicial
-                cursor.execute(
-                    "INSERT INTO tickets (id, user_id, title, description, type, priority, status) VALUES (?, ?, ?, ?, 'incident', 'low', 'open')",
-                    (new_id, user_id, ticket_title, description)
-                )
+                # 1. Insertar ticket inicial y su historial
+                # 2. Encolar IA (LangGraph) para los workers en segundo plano, en la misma transacción
+                with repository.transaction() as conn:
+                    new_id = repository.insert_ticket(conn, user_id, ticket_title, description)
+                    job_id = jobs.enqueue(conn, new_id)
+                if DEDUP_ENABLED:
+                    get_index().add(new_id, ticket_title, description)
+                job_workers.notify()
                 
-                # 2. Insertar historial
-                cursor.execute(
-                    "INSERT INTO ticket_history (ticket_id, action, user_id) VALUES (?, 'Ticket reportado vía Portal', ?)",
-                    (new_id, user_id)
-                )
-                conn.commit()
+                # 3. Esperar un tiempo prudencial a la IA; si tarda más el ticket ya quedó registrado
+                job = jobs.wait_for_job(job_id, timeout=30)
                 
-                # 3. Procesar IA (LangGraph)
-                ticket_data = {"id": new_id, "user_id": user_id, "title": ticket_title, "description": description}
-                try:
-                    state = process_ticket(ticket_data)
-                    
-                    # 4. Actualizar con IA
-                    cursor.execute('''
-                        UPDATE tickets 
-                        SET type = ?, priority = ?, ai_response = ?, status = 'in-progress', updated_at = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                    ''', (
-                        state.get("ticket_type"),
-                        state.get("priority"), 
-                        state.get("ai_response"), 
-                        new_id
-                    ))
-                    
-                    # 5. Historial de IA
-                    action_desc = f"IA Clasifica Automáticamente: {str(state.get('ticket_type')).upper()} - {str(state.get('priority')).upper()}."
-                    cursor.execute("INSERT INTO ticket_history (ticket_id, action, user_id) VALUES (?, ?, ?)", (new_id, action_desc, 1))
-                    conn.commit()
-                    
+                if job['status'] == 'done':
+                    with repository.connection() as conn:
+                        ticket = repository.get_ticket_row(conn, new_id)
                     st.success(f"✅ Ticket {new_id} enviado y clasificado en milisegundos por la IA.")
                     st.write("**🤖 Respuesta Rápida de la IA para ti:**")
-                    st.info(state.get("ai_response"))
-                    
-                except Exception as e:
-                    st.error(f"Error procesando con IA: {e}")
-                finally:
-                    conn.close()
+                    st.info(ticket['ai_response'])
+                elif job['status'] == 'failed':
+                    st.error(f"Ticket {new_id} registrado, pero la IA no pudo procesarlo: {job['last_error']}")
+                else:
+                    st.success(f"✅ Ticket {new_id} registrado. La IA lo está clasificando; verás el resultado en el Dashboard Técnico.")
 
 # --- TAB 2: DASHBOARD TÉCNICO ---
 with tab2:
@@ -104,17 +102,7 @@ with tab2:
         if st.button("🔄 Actualizar Tabla", use_container_width=True):
             pass
         
-    conn = get_db_connection()
-    # Consulta JOIN emulando v_tickets_complete del schema oficial
-    query = """
-    SELECT 
-        t.id, t.title as Asunto, t.type as Tipo, t.priority as Prioridad, 
-        t.status as Estado, u.name as Solicitante, u.area as Área, t.created_at as Fecha
-    FROM tickets t
-    JOIN users u ON t.user_id = u.id
-    ORDER BY t.created_at DESC
-    """
-    df = pd.read_sql_query(query, conn)
+    df = get_inbox_cache().get()
     
     if not df.empty:
         # Colorear prioridades
@@ -124,17 +112,21 @@ with tab2:
             elif val == 'high': color = 'orange'
             elif val == 'medium': color = 'blue'
             return f'color: {color}; font-weight: bold'
+        
+        total_pages = (len(df) - 1) // INBOX_PAGE_SIZE + 1
+        page = st.number_input(f"Página (de {total_pages}, {len(df)} tickets):", min_value=1, max_value=total_pages, value=1)
+        page_df = df.iloc[(page - 1) * INBOX_PAGE_SIZE:page * INBOX_PAGE_SIZE]
             
-        st.dataframe(df.style.applymap(color_priority, subset=['Prioridad']), use_container_width=True, hide_index=True)
+        st.dataframe(page_df.drop(columns=['updated_at']).style.applymap(color_priority, subset=['Prioridad']), use_container_width=True, hide_index=True)
         
         st.divider()
         st.subheader("🕵️‍♂️ Inspeccionar Ticket (Explainable AI)")
         
-        selected_ticket_id = st.selectbox("Selecciona un ID:", df['id'].tolist())
+        selected_ticket_id = st.selectbox("Selecciona un ID:", page_df['id'].tolist())
         
         if selected_ticket_id:
-            ticket = conn.execute("SELECT * FROM tickets WHERE id = ?", (selected_ticket_id,)).fetchone()
-            history = conn.execute("SELECT h.timestamp, h.action, u.name FROM ticket_history h JOIN users u ON h.user_id = u.id WHERE h.ticket_id = ? ORDER BY h.timestamp ASC", (selected_ticket_id,)).fetchall()
+            updated_at = page_df.at[selected_ticket_id, 'updated_at']
+            ticket, history = load_ticket_detail(selected_ticket_id, updated_at)
             
             st.write(f"### Detalles del Ticket `{ticket['id']}` - {ticket['title']}")
             st.error(f"📜 **Descripción Cruda del Usuario:**\n> {ticket['description']}")
@@ -150,30 +142,36 @@ with tab2:
                 
             with st.expander("⏳ Historial Log del Ticket", expanded=False):
                 for h in history:
-                    st.write(f"**[{h['timestamp']}] {h['name']}:** {h['action']}")
+                    st.write(f"**[{h['timestamp']}] {h['user']}:** {h['action']}")
 
 # --- TAB 3: ANALÍTICA ---
 with tab3:
     st.header("Métricas Generadas (Agente Analítico)")
     st.write("El agente procesa todos los incidentes categorizados para detectar patrones.")
     
-    if not df.empty:
+    # Contadores mantenidos por triggers: no depende del tamaño de la tabla ni del listado del Inbox
+    with repository.connection() as conn:
+        ticket_stats = stats.get_stats(conn)
+    
+    if ticket_stats["total"]:
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Tickets por Prioridad")
-            priority_counts = df['Prioridad'].value_counts()
+            priority_counts = pd.Series(ticket_stats["by_priority"])
             st.bar_chart(priority_counts, color="#ff4b4b")
             
         with col2:
             st.subheader("Tickets por Tipo (Clasificación AI)")
-            type_counts = df['Tipo'].value_counts()
+            type_counts = pd.Series(ticket_stats["by_type"])
             st.bar_chart(type_counts, color="#1e88e5")
+        
+        st.subheader("Tickets por Área")
+        st.dataframe(pd.DataFrame(ticket_stats["by_area"]), use_container_width=True, hide_index=True)
             
         st.subheader("Detectando Incidentes Recurrentes")
-        top_type = type_counts.idxmax() if not type_counts.empty else "N/A"
+        top_type = type_counts.idxmax() if type_counts.any() else "N/A"
         st.info(
             f"🤖 **Insight:**\n\n"
             f"He detectado que la mayor volumetría de tickets está en la clasificación **'{str(top_type).upper()}'**. "
             f"Para este rubro sugiero implementar un flujo de Auto-Servicio en el Service Desk para reducir la carga de analistas manuales."
         )
-    conn.close()
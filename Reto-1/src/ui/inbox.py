@@ -0,0 +1,100 @@
+import json
+import threading
+
+import pandas as pd
+
+from src.core import repository
+
+# Consulta JOIN emulando v_tickets_complete del schema oficial
+INBOX_QUERY = """
+SELECT
+    t.id, t.title as Asunto, t.type as Tipo, t.priority as Prioridad,
+    t.status as Estado, u.name as Solicitante, u.area as Área, t.created_at as Fecha,
+    t.updated_at
+FROM tickets t
+JOIN users u ON t.user_id = u.id
+"""
+INBOX_CHANGED_QUERY = INBOX_QUERY + "WHERE t.id IN (SELECT value FROM json_each(?))"
+# Eventos a partir de los cuales sale más barato releer la tabla entera que aplicarlos
+MAX_DELTA_EVENTS = 5000
+
+class InboxCache:
+    """
+    Copia en memoria del Inbox compartida por todas las sesiones de Streamlit.
+
+    En cada rerun solo se consulta repository.change_token(); si cambió, se aplican los
+    eventos de ticket_events entre la versión anterior y la actual: se releen las filas de
+    los tickets creados o modificados y se quitan los borrados. La tabla completa se vuelve a
+    leer al arrancar y cuando el delta no basta: la huella cambió sin eventos (carga masiva
+    sin triggers), faltan eventos (podados), son demasiados, o el número de filas resultante
+    no coincide con el total de tickets.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._df = None
+        self._token = None
+        self.full_loads = 0
+        self.delta_loads = 0
+
+    def get(self) -> pd.DataFrame:
+        """DataFrame del Inbox ordenado por fecha de creación (más reciente primero)."""
+        with repository.connection() as conn:
+            token = repository.change_token(conn)
+            with self._lock:
+                if token == self._token:
+                    return self._df
+                df = self._apply_events(conn, token) if self._df is not None else None
+                if df is None or len(df) != token[2]:
+                    df = self._sort(pd.read_sql_query(INBOX_QUERY, conn))
+                    self.full_loads += 1
+                else:
+                    self.delta_loads += 1
+                self._df, self._token = df, token
+                return self._df
+
+    def _apply_events(self, conn, token: tuple):
+        """
+        El DataFrame actual con los eventos de (versión anterior, versión de `token`]
+        aplicados, o None si no están todos (hay que releer la tabla).
+        """
+        since, version = self._token[1], token[1]
+        if version <= since or version - since > MAX_DELTA_EVENTS:
+            return None
+        events = [e for e in repository.events_after(conn, since, version - since) if e['id'] <= version]
+        # Los ids del outbox son consecutivos: si falta alguno se podó antes de leerlo
+        if len(events) != version - since:
+            return None
+        last_kind = {}
+        for event in events:
+            last_kind[event['ticket_id']] = event['kind']
+        deleted = [ticket_id for ticket_id, kind in last_kind.items() if kind == 'deleted']
+        changed_ids = [ticket_id for ticket_id, kind in last_kind.items() if kind != 'deleted']
+        df = self._df.drop(index=deleted, errors='ignore') if deleted else self._df
+        if not changed_ids:
+            return df
+        changed = pd.read_sql_query(INBOX_CHANGED_QUERY, conn, params=(json.dumps(changed_ids),))
+        return self._merge(df, changed)
+
+    @staticmethod
+    def _sort(df: pd.DataFrame) -> pd.DataFrame:
+        df = df.sort_values(['Fecha', 'id'], ascending=False)
+        return df.set_index(df['id'].rename(None))
+
+    @classmethod
+    def _merge(cls, df: pd.DataFrame, changed: pd.DataFrame) -> pd.DataFrame:
+        """
+        Aplica las filas cambiadas. Las existentes se actualizan en su sitio (su fecha de
+        creación no cambia, así que tampoco su posición); las nuevas suelen ser las más
+        recientes y van arriba sin reordenar todo el DataFrame.
+        """
+        changed = cls._sort(changed)
+        existing = df.index.get_indexer(changed.index) >= 0
+        if existing.any():
+            df = df.copy()
+            df.loc[changed.index[existing]] = changed[existing]
+        new = changed[~existing]
+        if new.empty:
+            return df
+        if df.empty or new['Fecha'].min() >= df['Fecha'].iloc[0]:
+            return pd.concat([new, df])
+        return cls._sort(pd.concat([df, new]))